@@ -11,37 +11,87 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import logging
+import threading
+
 from google.adk.agents import LlmAgent
 from google.adk.apps import App
 from google.adk.models import Gemini
 from google.adk.plugins.bigquery_agent_analytics_plugin import \
     BigQueryAgentAnalyticsPlugin
 
+from incident_detector.bigquery_util import query_runner, bigquery_client
 from incident_detector.settings import settings
-from incident_detector.tools import get_potential_incidents, create_new_incident
-
-incident_detector_agent = LlmAgent(
-    model=Gemini(
-        model=settings.incident_detector_model
-    ),
-    name="incident_detector",
-    static_instruction="""
+from incident_detector.storage import storage
+from incident_detector.tools import get_potential_incidents, \
+    create_new_incident, create_new_incidents, dismiss_incidents, \
+    get_kpi_history
+from telco_common.lazy import Lazy
+from telco_common.query_metrics_plugin import QueryMetricsPlugin
+
+logger = logging.getLogger(__name__)
+
+
+def build_app() -> App:
+    incident_detector_agent = LlmAgent(
+        model=Gemini(
+            model=settings.incident_detector_model
+        ),
+        name="incident_detector",
+        static_instruction="""
 Get and analyze potential incidents, prioritize based on severity and ask the user to confirm before creating the new incident.
+If the user confirms several incidents, create them with a single create_new_incidents call.
+If the user decides not to create some of the incidents, dismiss them with dismiss_incidents, otherwise they are reported again by the next check.
+To judge the severity of a potential incident, you can compare it with the KPI history of the cell.
 """,
-    description="Checks to see if there are new incidents in the networks and prompts to create a new instance.",
-    tools=[get_potential_incidents, create_new_incident]
-)
-
-root_agent = incident_detector_agent
-
-bq_logging_plugin = BigQueryAgentAnalyticsPlugin(
-    project_id=settings.agent_data_log_project_id,
-    dataset_id=settings.agent_data_log_dataset,
-    table_id=settings.agent_data_log_table
-)
-
-app = App(
-    name="incident_detector",
-    root_agent=root_agent,
-    plugins=[bq_logging_plugin]
-)
+        description="Checks to see if there are new incidents in the networks and prompts to create a new instance.",
+        tools=[get_potential_incidents, create_new_incident,
+               create_new_incidents, dismiss_incidents, get_kpi_history]
+    )
+
+    bq_logging_plugin = BigQueryAgentAnalyticsPlugin(
+        project_id=settings.agent_data_log_project_id,
+        dataset_id=settings.agent_data_log_dataset,
+        table_id=settings.agent_data_log_table
+    )
+
+    return App(
+        name="incident_detector",
+        root_agent=incident_detector_agent,
+        plugins=[bq_logging_plugin, QueryMetricsPlugin(query_runner.metrics)]
+    )
+
+
+_app: Lazy[App] = Lazy(build_app, 'incident_detector_app')
+
+
+def __getattr__(name: str):
+    # The ADK looks up the app when the agent is first used, not at import.
+    if name == 'app':
+        return _app.get()
+    if name == 'root_agent':
+        return _app.get().root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm_up() -> None:
+    """
+    Constructs the agent, the storage and the clients it uses now instead of
+    on first use.
+    """
+    _app.get()
+    storage.get()
+    if settings.storage_backend == 'bigquery':
+        bigquery_client.get()
+
+
+def _warm_up_in_background() -> None:
+    try:
+        warm_up()
+    except Exception as ex:
+        logger.error("Failed to warm up the agent: %s", str(ex))
+
+
+if settings.warm_up_on_start:
+    threading.Thread(target=_warm_up_in_background,
+                     name='incident_detector_warm_up', daemon=True).start()
@@ -0,0 +1,252 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Incident detection benchmark over synthetic performance data.
+
+Nothing is sent to BigQuery. The "query" engine replaces the detection query
+with a local stand-in that returns rows of the same shape, and runs them
+through the same build_incidents as get_potential_incidents. The "local" and
+"sharded" engines run the in-process detection.
+
+From the agents directory:
+
+    python -m incident_detector.benchmark --cells 100 1000 --days 1 7 \
+        --shards 4
+
+Every case runs in a fresh process, so that the peak RSS is the case's own.
+The same seed always generates the same data.
+"""
+import argparse
+import json
+import logging
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, UTC, timedelta
+from multiprocessing import get_context
+from typing import Optional
+
+import numpy as np
+
+from incident_detector.detection import build_incidents
+from incident_detector.detection_settings import detection_settings
+from incident_detector.local_engine import PerformanceCounters, \
+    detect_incidents, index_cells, thresholds_of_cells
+from incident_detector.segmentation import MEASUREMENT_INTERVAL
+from incident_detector.sharded_detection import detect_incidents_sharded
+from telco_common.kpi_registry import KPIS, KPIDefinition, \
+    ERAB_ATTEMPTS, ERAB_SUCCESSES, ERAB_RELEASES, SESSION_TIME
+from telco_common.storage.breaches import KPIBreaches
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ['query', 'local', 'sharded']
+
+_INTERVALS_PER_DAY = int(timedelta(days=1) / MEASUREMENT_INTERVAL)
+_CELLS_PER_ENODEB = 3
+_START = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def generate_counters(cells: int, days: int, seed: int,
+    degradations_per_cell_day: float = 0.2) -> PerformanceCounters:
+    """
+    Counters of `cells` cells over `days` days. Healthy intervals are well
+    within the KPI thresholds. Degradations of 1 to 8 intervals, placed at
+    random, breach either the ERAB success rate or the retainability.
+    """
+    rng = np.random.default_rng(seed)
+    intervals = days * _INTERVALS_PER_DAY
+    rows = cells * intervals
+
+    cell = np.repeat(np.arange(cells), intervals)
+    enodeb_id = np.char.add('ENB', (cell // _CELLS_PER_ENODEB).astype(str))
+    cell_id = (cell % _CELLS_PER_ENODEB + 1).astype(str)
+    start = np.datetime64(_START.replace(tzinfo=None), 's')
+    step = np.timedelta64(int(MEASUREMENT_INTERVAL.total_seconds()), 's')
+    measurement_end = start + step * np.tile(np.arange(1, intervals + 1),
+                                             cells)
+
+    # 0 - healthy, 1 - low ERAB success rate, 2 - high retainability
+    degraded = np.zeros(rows, dtype=np.int8)
+    degradations = rng.poisson(degradations_per_cell_day * cells * days)
+    starts = rng.integers(0, rows, degradations)
+    lengths = rng.integers(1, 9, degradations)
+    kinds = rng.integers(1, 3, degradations).astype(np.int8)
+    for first, length, kind in zip(starts, lengths, kinds):
+        # Degradations don't cross into the next cell.
+        last = min(first + length, (first // intervals + 1) * intervals)
+        degraded[first:last] = kind
+
+    counters: dict[str, np.ndarray] = {}
+    success_rate = np.where(degraded == 1, 0.9, 0.995)
+    for attempts_column, successes_column in zip(ERAB_ATTEMPTS,
+                                                 ERAB_SUCCESSES):
+        attempts = rng.poisson(50, rows).astype(np.float64)
+        counters[attempts_column] = attempts
+        counters[successes_column] = rng.binomial(
+            attempts.astype(np.int64), success_rate).astype(np.float64)
+    release_rate = np.where(degraded == 2, 2., .1)
+    for releases_column in ERAB_RELEASES:
+        counters[releases_column] = rng.poisson(release_rate).astype(
+            np.float64)
+    counters[SESSION_TIME] = rng.uniform(3000, 6000, rows)
+
+    return PerformanceCounters(enodeb_id=enodeb_id, cell_id=cell_id,
+                               measurement_end=measurement_end,
+                               counters=counters)
+
+
+def local_breach_scan(counters: PerformanceCounters,
+    kpis: list[KPIDefinition]) -> KPIBreaches:
+    """
+    Stand-in for the breach scan without any checkpoints: the latest
+    measurement and the breaches of every KPI of every cell.
+    """
+    cells, cell_index = index_cells(counters.enodeb_id, counters.cell_id)
+    timestamps = counters.measurement_end.astype(np.int64)
+    order = np.lexsort((timestamps, cell_index))
+    cell_index = cell_index[order]
+    timestamps = timestamps[order]
+    scanned = np.ones(len(timestamps), dtype=bool)
+
+    parts = []
+    for kpi in kpis:
+        values = kpi.compute(counters.counters)[order]
+        with np.errstate(invalid='ignore'):
+            missed = kpi.comparator.evaluate(
+                values, thresholds_of_cells(kpi, cells)[cell_index])
+        parts.append(KPIBreaches.from_intervals(
+            kpi.name, cells.astype(str), cell_index, timestamps, values,
+            scanned, missed))
+    return KPIBreaches.concatenate(parts)
+
+
+def _detect(engine: str, counters: PerformanceCounters, shards: int,
+    executor: str) -> int:
+    gap_tolerance = detection_settings.episode_gap_tolerance
+    min_duration = detection_settings.episode_min_duration
+    if engine == 'query':
+        incidents, _ = build_incidents(
+            local_breach_scan(counters, KPIS), {}, KPIS, gap_tolerance,
+            min_duration, lambda incident_id, ended: True)
+    elif engine == 'local':
+        incidents = detect_incidents(counters, KPIS, gap_tolerance,
+                                     min_duration)
+    elif engine == 'sharded':
+        incidents = detect_incidents_sharded(counters, shards, KPIS,
+                                             gap_tolerance, min_duration,
+                                             executor)
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+    return len(incidents)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def run_case(engine: str, cells: int, days: int, seed: int, repeat: int,
+    shards: int, executor: str) -> dict:
+    counters = generate_counters(cells, days, seed)
+    latencies = []
+    incidents = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        incidents = _detect(engine, counters, shards, executor)
+        latencies.append(time.perf_counter() - started)
+
+    best = min(latencies)
+    return {
+        'engine': engine,
+        'cells': cells,
+        'days': days,
+        'rows': len(counters),
+        'seed': seed,
+        'shards': shards if engine == 'sharded' else 1,
+        'executor': executor if engine == 'sharded' else None,
+        'latency_seconds': latencies,
+        'best_latency_seconds': best,
+        'rows_per_second': len(counters) / best if best else None,
+        'peak_rss_mb': _peak_rss_mb(),
+        'incidents': incidents,
+    }
+
+
+def run_benchmark(engines: list[str], cells: list[int], days: list[int],
+    seed: int, repeat: int, shards: int, executor: str,
+    isolate: bool = True) -> dict:
+    cases = []
+    for engine in engines:
+        for cell_count in cells:
+            for day_count in days:
+                arguments = (engine, cell_count, day_count, seed, repeat,
+                             shards, executor)
+                if isolate:
+                    with ProcessPoolExecutor(
+                        max_workers=1,
+                        mp_context=get_context('spawn')) as pool:
+                        case = pool.submit(run_case, *arguments).result()
+                else:
+                    case = run_case(*arguments)
+                logger.info("%s", case)
+                cases.append(case)
+
+    return {
+        'created': datetime.now(UTC).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cases': cases,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--engines', nargs='+', choices=ENGINES,
+                        default=ENGINES)
+    parser.add_argument('--cells', nargs='+', type=int, default=[100, 1000])
+    parser.add_argument('--days', nargs='+', type=int, default=[1, 7])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--shards', type=int,
+                        default=detection_settings.detection_shards)
+    parser.add_argument('--executor', choices=['process', 'thread'],
+                        default=detection_settings.detection_shard_executor)
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false',
+                        help="run all the cases in this process")
+    parser.add_argument('--output', help="JSON file with the full results")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    results = run_benchmark(args.engines, args.cells, args.days, args.seed,
+                            args.repeat, args.shards, args.executor,
+                            args.isolate)
+    if args.output:
+        with open(args.output, mode='w', encoding='utf-8') as outfile:
+            json.dump(results, outfile, indent=2)
+
+    for case in results['cases']:
+        print(f"{case['engine']:>8} {case['cells']:>6} cells "
+              f"{case['days']:>3} days: {case['rows_per_second']:>12,.0f} rows/s "
+              f"{case['best_latency_seconds']:8.3f} s "
+              f"{case['peak_rss_mb']:8.1f} MB "
+              f"{case['incidents']:>6} incidents")
+
+
+if __name__ == '__main__':
+    main()
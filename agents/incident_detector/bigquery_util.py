@@ -0,0 +1,96 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import functools
+from datetime import timedelta
+from typing import Optional
+
+from google.api_core.client_info import ClientInfo
+from google.cloud import bigquery
+from google.cloud.bigquery import QueryJobConfig, QueryJob
+from google.cloud.bigquery.enums import JobCreationMode
+from google.cloud.bigquery.query import ScalarQueryParameter, \
+    ArrayQueryParameter
+from google.cloud.bigquery.table import RowIterator, Row
+
+from incident_detector.settings import settings
+from telco_common.async_query import AsyncQueryRunner
+from telco_common.lazy import Lazy
+from telco_common.query_budget import QueryBudget, dry_run
+from telco_common.query_metrics import create_recorder
+from telco_common.rollups import kpi_tiers
+
+performance_kpi_table = f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_performance_kpi}"
+incidents_table = f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_incidents}"
+detection_checkpoints_table = f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_detection_checkpoints}"
+performance_kpi_tiers = kpi_tiers(
+    performance_kpi_table,
+    f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_performance_kpi_hourly}",
+    f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_performance_kpi_daily}")
+
+
+def _create_bigquery_client() -> bigquery.Client:
+    return bigquery.Client(client_info=ClientInfo(
+        user_agent=settings.user_agent),
+        default_job_creation_mode=JobCreationMode.JOB_CREATION_OPTIONAL
+    )
+
+
+bigquery_client: Lazy[bigquery.Client] = Lazy(_create_bigquery_client,
+                                              'bigquery_client')
+
+
+def execute_query(query: str, query_parameters: Optional[
+    list[ScalarQueryParameter | ArrayQueryParameter]] = None,
+    timeout: timedelta = settings.bigquery_query_timeout,
+    maximum_bytes_billed: Optional[int] = None) -> RowIterator:
+    return bigquery_client.query_and_wait(
+        project=settings.bigquery_run_project_id,
+        location=settings.bigquery_data_location,
+        job_config=QueryJobConfig(
+            job_timeout_ms=int(timeout.total_seconds() * 1000),
+            query_parameters=query_parameters or [],
+            maximum_bytes_billed=maximum_bytes_billed
+        ),
+        wait_timeout=timeout.total_seconds(),
+        query=query
+    )
+
+
+def get_job(result: RowIterator) -> QueryJob:
+    return bigquery_client.get_job(result.job_id, project=result.project,
+                                   location=result.location)
+
+
+query_runner = AsyncQueryRunner(
+    execute_query, settings.bigquery_max_concurrent_queries,
+    settings.bigquery_query_timeout,
+    metrics=create_recorder(settings.query_metrics_sinks,
+                            settings.query_metrics_prometheus_file),
+    get_job=get_job if settings.query_metrics_job_statistics else None,
+    budget=QueryBudget(settings.query_default_byte_budget,
+                       settings.query_byte_budgets,
+                       settings.query_budget_action),
+    dry_run=functools.partial(dry_run, bigquery_client,
+                              settings.bigquery_run_project_id,
+                              settings.bigquery_data_location)
+    if settings.query_dry_run else None)
+
+
+async def execute_query_async(query: str, query_parameters: Optional[
+    list[ScalarQueryParameter | ArrayQueryParameter]] = None,
+    timeout: Optional[timedelta] = None) -> list[Row]:
+    """
+    Runs the query without blocking the event loop. Use it in async tools.
+    """
+    return await query_runner.execute(query, query_parameters, timeout)
@@ -0,0 +1,157 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import logging
+from dataclasses import dataclass
+from datetime import datetime, UTC, timedelta
+from typing import Optional
+
+from incident_detector.segmentation import Episode
+from incident_detector.storage import storage
+from telco_common.kpi_registry import KPIDefinition
+from telco_common.timestamps import format_timestamp, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Scanning starts here if the detector has never run before.
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+CheckpointKey = tuple[str, str, str]
+
+
+@dataclass(slots=True)
+class Checkpoint:
+    enodeb_id: str
+    cell_id: str
+    kpi: str
+    # Latest measurement_end processed for this cell and KPI.
+    watermark: datetime
+    # Episode which can still be continued by the next detection run.
+    open_episode: Optional[Episode] = None
+
+    def key(self) -> CheckpointKey:
+        return self.enodeb_id, self.cell_id, self.kpi
+
+    def as_compact_record(self) -> list:
+        """
+        Positional representation used to keep the checkpoints waiting for
+        the user's decision in the session state.
+        """
+        episode = self.open_episode
+        return [self.enodeb_id, self.cell_id, self.kpi,
+                format_timestamp(self.watermark),
+                [episode.incident_id, format_timestamp(episode.started),
+                 format_timestamp(episode.ended), episode.kpi_sum,
+                 episode.kpi_count] if episode else None]
+
+    @classmethod
+    def from_compact_record(cls, record: list) -> 'Checkpoint':
+        enodeb_id, cell_id, kpi, watermark, episode = record
+        return cls(
+            enodeb_id=enodeb_id,
+            cell_id=cell_id,
+            kpi=kpi,
+            watermark=parse_timestamp(watermark),
+            open_episode=Episode(
+                incident_id=episode[0],
+                started=parse_timestamp(episode[1]),
+                ended=parse_timestamp(episode[2]),
+                kpi_sum=episode[3],
+                kpi_count=episode[4]
+            ) if episode else None)
+
+
+async def load_checkpoints() -> dict[CheckpointKey, Checkpoint]:
+    rows = await storage.load_detection_checkpoints()
+
+    checkpoints: dict[CheckpointKey, Checkpoint] = {}
+    for row in rows:
+        checkpoint = Checkpoint(
+            enodeb_id=row.enodeb_id,
+            cell_id=row.cell_id,
+            kpi=row.kpi,
+            watermark=row.watermark_ts,
+            open_episode=Episode(
+                incident_id=row.open_incident_id,
+                started=row.open_start_ts,
+                ended=row.open_end_ts,
+                kpi_sum=row.open_kpi_sum,
+                kpi_count=row.open_kpi_count
+            ) if row.open_incident_id else None
+        )
+        checkpoints[checkpoint.key()] = checkpoint
+
+    logger.info("Loaded %d detection checkpoints", len(checkpoints))
+    return checkpoints
+
+
+def scan_start(checkpoints: dict[CheckpointKey, Checkpoint],
+    kpis: list[KPIDefinition], max_lookback: Optional[timedelta] = None,
+    warning_window: Optional[timedelta] = None) -> datetime:
+    """
+    The earliest watermark across all the keys. Filtering on this constant
+    (rather than on the per-key watermarks only) is what allows BigQuery to
+    prune the measurement_end partitions.
+
+    A KPI which has never been checked before has to be checked over all the
+    data, within max_lookback.
+
+    The cells which stop reporting, and the checkpoints held back by a
+    session which is never finished, would keep the earliest watermark where
+    it is, and the scan would grow to the full history. With max_lookback,
+    the scan starts at most that long before the latest watermark, and the
+    data of such keys before that is never checked. A warning is logged when
+    the scan starts more than warning_window before the latest watermark.
+    """
+    kpi_names = {kpi.name for kpi in kpis}
+    checked = [checkpoint for checkpoint in checkpoints.values()
+               if checkpoint.kpi in kpi_names]
+    if not checked:
+        return EPOCH
+    latest = max(checkpoint.watermark for checkpoint in checked)
+    if not kpi_names <= {checkpoint.kpi for checkpoint in checked}:
+        start = EPOCH
+    else:
+        start = min(checkpoint.watermark for checkpoint in checked)
+    if max_lookback is not None and start < latest - max_lookback:
+        logger.warning("Detection would scan from %s, limited to %s before "
+                       "the latest checkpoint", start, max_lookback)
+        start = latest - max_lookback
+    elif warning_window is not None and start < latest - warning_window:
+        logger.warning("Detection scans from %s, %s before the latest "
+                       "checkpoint", start, latest - start)
+    return start
+
+
+def _as_row(checkpoint: Checkpoint) -> dict:
+    episode = checkpoint.open_episode
+    return {
+        'enodeb_id': checkpoint.enodeb_id,
+        'cell_id': checkpoint.cell_id,
+        'kpi': checkpoint.kpi,
+        'watermark_ts': checkpoint.watermark,
+        'open_incident_id': episode.incident_id if episode else None,
+        'open_start_ts': episode.started if episode else None,
+        'open_end_ts': episode.ended if episode else None,
+        'open_kpi_sum': episode.kpi_sum if episode else None,
+        'open_kpi_count': episode.kpi_count if episode else None,
+    }
+
+
+async def save_checkpoints(checkpoints: list[Checkpoint]) -> None:
+    if not checkpoints:
+        return
+
+    logger.info("About to save %d detection checkpoints", len(checkpoints))
+    await storage.save_detection_checkpoints(
+        [_as_row(checkpoint) for checkpoint in checkpoints])
@@ -0,0 +1,104 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Turns the result of the breach scan into incidents and new checkpoints.
+"""
+from datetime import datetime, timedelta
+from typing import Callable
+
+from incident_detector.checkpoints import Checkpoint, CheckpointKey
+from incident_detector.models import Incident, MissedKPI, episode_incident_id
+from incident_detector.segmentation import Episode, MEASUREMENT_INTERVAL, \
+    segment
+from telco_common.kpi_registry import KPIDefinition
+from telco_common.storage.breaches import KPIBreaches
+from telco_common.timestamps import datetimes_from_seconds
+
+
+def build_incidents(breaches: KPIBreaches,
+    checkpoints: dict[CheckpointKey, Checkpoint], kpis: list[KPIDefinition],
+    gap_tolerance: timedelta, min_duration: timedelta,
+    is_new_or_changed: Callable[[str, datetime], bool]) -> tuple[
+    list[Incident], list[Checkpoint]]:
+    """
+    The breaches are split into episodes, and an episode which continues the
+    open episode of the previous run extends it. Objects are only created per
+    episode and per cell and KPI, not per breach.
+    """
+    kpis_by_name = {kpi.name: kpi for kpi in kpis}
+    keys: list[CheckpointKey] = list(
+        zip(breaches.enodeb_id.tolist(), breaches.cell_id.tolist(),
+            breaches.kpi.tolist()))
+    watermarks = datetimes_from_seconds(breaches.last_seen)
+
+    segments = segment(breaches.breach_key, breaches.breach_timestamp,
+                       breaches.breach_value, gap_tolerance)
+    episodes: list[list[Episode]] = [[] for _ in keys]
+    for key, started, ended, kpi_sum, kpi_count in zip(
+        segments.key.tolist(), datetimes_from_seconds(segments.started),
+        datetimes_from_seconds(segments.ended), segments.kpi_sum.tolist(),
+        segments.kpi_count.tolist()):
+        episodes[key].append(Episode(
+            started=started,
+            ended=ended,
+            kpi_sum=kpi_sum,
+            kpi_count=kpi_count))
+
+    incidents: list[Incident] = []
+    new_checkpoints: list[Checkpoint] = []
+    for key_index, (enodeb_id, cell_id, kpi) in enumerate(keys):
+        key_episodes = episodes[key_index]
+        previous = checkpoints.get((enodeb_id, cell_id, kpi))
+        if previous and previous.open_episode and key_episodes and \
+            previous.open_episode.is_continued_by(key_episodes[0].started,
+                                                  gap_tolerance):
+            # The breach continues right after the previous watermark -
+            # extend the incident instead of creating a new one.
+            key_episodes[0] = previous.open_episode.extend(key_episodes[0])
+
+        for episode in key_episodes:
+            if not episode.incident_id:
+                episode.incident_id = episode_incident_id(
+                    enodeb_id, cell_id, kpi, episode.started)
+            if episode.duration() < min_duration:
+                continue
+            # Skip the incidents which already exist and haven't changed.
+            if not is_new_or_changed(episode.incident_id, episode.ended):
+                continue
+            incidents.append(Incident(
+                id=episode.incident_id,
+                status='NEW',
+                description=kpis_by_name[kpi].description,
+                kpi_missed=[MissedKPI(kpi=kpi, value=episode.mean())],
+                enodeb_id=enodeb_id,
+                cell_id=cell_id,
+                start_time=episode.started,
+                end_time=episode.ended
+            ))
+
+        # Only an episode which can be continued by the next interval after
+        # the watermark is carried over to the next run.
+        open_episode = key_episodes[-1] if key_episodes else None
+        if open_episode and not open_episode.is_continued_by(
+            watermarks[key_index] + MEASUREMENT_INTERVAL, gap_tolerance):
+            open_episode = None
+        new_checkpoints.append(Checkpoint(
+            enodeb_id=enodeb_id,
+            cell_id=cell_id,
+            kpi=kpi,
+            watermark=watermarks[key_index],
+            open_episode=open_episode
+        ))
+
+    return incidents, new_checkpoints
@@ -0,0 +1,38 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from datetime import timedelta
+from typing import Literal
+
+from pydantic_settings import BaseSettings
+
+
+class DetectionSettings(BaseSettings):
+    """
+    Settings of the detection itself. Unlike the agent's settings, they don't
+    require the BigQuery configuration, so the local detection and the
+    benchmark can use them on their own.
+    """
+    # Breaches of the same cell and KPI separated by no more than this gap are
+    # reported as a single incident.
+    episode_gap_tolerance: timedelta = timedelta(minutes=30)
+    # Shorter breaches are not reported as incidents.
+    episode_min_duration: timedelta = timedelta(minutes=30)
+
+    # Local detection splits the cells into this many shards, processed in
+    # parallel. Use "thread" if processes can't be started in the environment.
+    detection_shards: int = 1
+    detection_shard_executor: Literal['process', 'thread'] = 'process'
+
+
+detection_settings = DetectionSettings()
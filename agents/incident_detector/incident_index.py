@@ -0,0 +1,79 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from incident_detector.models import Incident
+from incident_detector.settings import settings
+from incident_detector.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+class OpenIncidentIndex:
+    """
+    End times of the open incidents, by incident id.
+
+    The incidents table is the persisted backing of the index. refresh()
+    loads it on first use and reloads it after the TTL, to pick up the changes
+    made by other processes. Only the incidents which a detection run can
+    report again are loaded: the ones which end in its scan window. The index
+    is kept up to date with the incidents saved by this process.
+    """
+
+    def __init__(self, ttl: timedelta):
+        self._ttl_seconds = ttl.total_seconds()
+        self._end_times: dict[str, Optional[datetime]] = {}
+        self._loaded_at: Optional[float] = None
+        self._ended_after: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self, ended_after: datetime) -> bool:
+        return self._loaded_at is None or \
+            time.monotonic() - self._loaded_at > self._ttl_seconds or \
+            ended_after < self._ended_after
+
+    async def refresh(self, ended_after: datetime) -> None:
+        """
+        Loads the incidents which are ongoing or ended after `ended_after`,
+        unless the loaded ones cover them and are within the TTL.
+        """
+        if not self._is_stale(ended_after):
+            return
+        end_times = await storage.get_open_incident_end_times(ended_after)
+        with self._lock:
+            self._end_times = end_times
+            self._loaded_at = time.monotonic()
+            self._ended_after = ended_after
+        logger.info("Loaded %d open incidents ended after %s",
+                    len(self._end_times), ended_after)
+
+    def is_new_or_changed(self, incident_id: str, ended: datetime) -> bool:
+        """
+        Call refresh() first.
+        """
+        if incident_id not in self._end_times:
+            return True
+        return self._end_times[incident_id] != ended
+
+    def add(self, incidents: list[Incident]) -> None:
+        with self._lock:
+            for incident in incidents:
+                self._end_times[incident.id] = incident.end_time
+
+
+open_incident_index = OpenIncidentIndex(ttl=settings.open_incident_index_ttl)
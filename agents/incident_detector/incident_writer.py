@@ -0,0 +1,50 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import logging
+
+from incident_detector.incident_index import open_incident_index
+from incident_detector.models import Incident
+from incident_detector.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+def _as_row(incident: Incident) -> dict:
+    return {
+        'incident_id': incident.id,
+        'enodeb_id': incident.enodeb_id,
+        'cell_id': incident.cell_id,
+        'start_ts': incident.start_time,
+        'end_ts': incident.end_time,
+        'status': incident.status,
+        'description': incident.description,
+        'kpi_missed': [{'kpi': missed_kpi.kpi, 'value': missed_kpi.value} for
+                       missed_kpi in incident.kpi_missed],
+    }
+
+
+async def save_incidents(incidents: list[Incident]) -> None:
+    """
+    Saves all the incidents in a single write.
+
+    Incidents which continue past the previous detection run keep their id,
+    so an existing incident is extended rather than duplicated.
+    """
+    if not incidents:
+        return
+
+    logger.info("About to save %d incidents: %s", len(incidents),
+                [incident.id for incident in incidents])
+    await storage.save_incidents([_as_row(incident) for incident in incidents])
+    open_incident_index.add(incidents)
@@ -0,0 +1,211 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+In-process KPI threshold detection over the raw performance counters.
+
+This is the NumPy counterpart of the `performance_kpi` materialized view and
+of the detection query, both driven by `telco_common.kpi_registry`. It is used to detect
+incidents without a BigQuery round-trip and to cross-check the SQL.
+"""
+import csv
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+
+from incident_detector.models import Incident, MissedKPI, episode_incident_id
+from incident_detector.segmentation import segment
+from telco_common.kpi_registry import KPIS, KPIDefinition, \
+    counter_columns
+from telco_common.timestamps import datetimes_from_seconds
+
+logger = logging.getLogger(__name__)
+
+COUNTER_COLUMNS = counter_columns(KPIS)
+
+
+@dataclass(frozen=True)
+class PerformanceCounters:
+    """
+    Column oriented performance data. Every array has one element per
+    measurement interval.
+    """
+    enodeb_id: np.ndarray
+    cell_id: np.ndarray
+    # datetime64[s], UTC
+    measurement_end: np.ndarray
+    # float64, missing counters are NaN
+    counters: dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.measurement_end)
+
+
+def _to_float(values: list[str]) -> np.ndarray:
+    return np.array([value if value else 'nan' for value in values],
+                    dtype=np.float64)
+
+
+def _parse_measurement_end(values: list[str]) -> np.ndarray:
+    # The CSV uses the "MM/DD/YYYY HH24:MI:SS" format. Rearranging the strings
+    # to ISO 8601 lets NumPy convert the whole column at once.
+    return np.array(
+        [f"{value[6:10]}-{value[0:2]}-{value[3:5]}T{value[11:19]}" for value
+         in values], dtype='datetime64[s]')
+
+
+def load_performance_csv(path: str) -> PerformanceCounters:
+    with open(path, mode='r', newline='', encoding='utf-8') as infile:
+        reader = csv.reader(infile)
+        header = next(reader)
+        # The header is case-insensitive in BigQuery, e.g. "EnodeB_id".
+        index = {name.lower(): position for position, name in
+                 enumerate(header)}
+        wanted = ['enodeb_id', 'cell_id', 'measurement_end'] + [
+            column.lower() for column in COUNTER_COLUMNS]
+        missing = [column for column in wanted if column not in index]
+        if missing:
+            raise ValueError(f"Missing columns in {path}: {missing}")
+
+        columns: list[list[str]] = [[] for _ in wanted]
+        positions = [index[column] for column in wanted]
+        for row in reader:
+            for values, position in zip(columns, positions):
+                values.append(row[position])
+
+    return PerformanceCounters(
+        enodeb_id=np.array(columns[0]),
+        cell_id=np.array(columns[1]),
+        measurement_end=_parse_measurement_end(columns[2]),
+        counters={column: _to_float(values) for column, values in
+                  zip(COUNTER_COLUMNS, columns[3:])}
+    )
+
+
+def load_performance_parquet(path: str) -> PerformanceCounters:
+    """
+    Loads the counters from a Parquet file, e.g. an export of the performance
+    table. Requires pyarrow.
+    """
+    try:
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError as ex:
+        raise ImportError(
+            "pyarrow is required to read Parquet files") from ex
+
+    table = pq.read_table(path)
+    table = table.rename_columns(
+        [name.lower() for name in table.column_names])
+
+    def column(name: str) -> np.ndarray:
+        return table.column(name.lower()).to_numpy(zero_copy_only=False)
+
+    measurement_end = pc.cast(table.column('measurement_end'),
+                              'timestamp[s, tz=UTC]')
+    return PerformanceCounters(
+        enodeb_id=column('enodeb_id').astype(str),
+        cell_id=column('cell_id').astype(str),
+        measurement_end=measurement_end.to_numpy().astype('datetime64[s]'),
+        counters={name: column(name).astype(np.float64) for name in
+                  COUNTER_COLUMNS}
+    )
+
+
+def compute_kpis(counters: PerformanceCounters,
+    kpis: list[KPIDefinition] = KPIS) -> dict[str, np.ndarray]:
+    return {kpi.name: kpi.compute(counters.counters) for kpi in kpis}
+
+
+def thresholds_of_cells(kpi: KPIDefinition, cells: np.ndarray) -> np.ndarray:
+    """
+    Threshold of every cell, taking the per-cell overrides into account.
+    """
+    thresholds = np.full(len(cells), float(kpi.threshold))
+    if kpi.cell_thresholds:
+        for i, (enodeb_id, cell_id) in enumerate(cells):
+            thresholds[i] = kpi.threshold_for(str(enodeb_id), str(cell_id))
+    return thresholds
+
+
+def index_cells(enodeb_id: np.ndarray, cell_id: np.ndarray) -> tuple[
+    np.ndarray, np.ndarray]:
+    """
+    Distinct (enodeb_id, cell_id) pairs, sorted, and the position of every
+    interval's cell in them. Sorting integer codes is much faster than sorting
+    pairs of strings.
+    """
+    enodebs, enodeb_index = np.unique(enodeb_id, return_inverse=True)
+    cell_ids, cell_id_index = np.unique(cell_id, return_inverse=True)
+    codes, cell_index = np.unique(
+        enodeb_index.astype(np.int64) * len(cell_ids) + cell_id_index,
+        return_inverse=True)
+    cells = np.stack([enodebs[codes // len(cell_ids)],
+                      cell_ids[codes % len(cell_ids)]], axis=1)
+    return cells, cell_index.reshape(-1)
+
+
+def detect_incidents(counters: PerformanceCounters,
+    kpis: list[KPIDefinition] = KPIS,
+    gap_tolerance: timedelta = timedelta(minutes=30),
+    min_duration: timedelta = timedelta(minutes=30)) -> list[Incident]:
+    """
+    Evaluates all the KPI thresholds for all the cells and splits the breaches
+    of every cell and KPI into episodes, same as the detection query.
+    """
+    if not len(counters):
+        return []
+
+    cells, cell_index = index_cells(counters.enodeb_id, counters.cell_id)
+    timestamps = counters.measurement_end.astype(np.int64)
+    # Segmentation requires the intervals of every cell in time order.
+    order = np.lexsort((timestamps, cell_index))
+    cell_index = cell_index[order]
+    timestamps = timestamps[order]
+    min_duration_seconds = min_duration.total_seconds()
+
+    incidents: list[Incident] = []
+    for kpi in kpis:
+        values = kpi.compute(counters.counters)[order]
+        thresholds = thresholds_of_cells(kpi, cells)[cell_index]
+        with np.errstate(invalid='ignore'):
+            missed = kpi.comparator.evaluate(values, thresholds)
+
+        segments = segment(cell_index[missed], timestamps[missed],
+                           values[missed], gap_tolerance)
+        reported = np.flatnonzero(
+            segments.duration_seconds() >= min_duration_seconds)
+        for i, started, ended in zip(
+            reported.tolist(),
+            datetimes_from_seconds(segments.started[reported]),
+            datetimes_from_seconds(segments.ended[reported])):
+            enodeb_id, cell_id = (str(value) for value in
+                                  cells[segments.key[i]])
+            incidents.append(Incident(
+                id=episode_incident_id(enodeb_id, cell_id, kpi.name, started),
+                status='NEW',
+                description=kpi.description,
+                kpi_missed=[MissedKPI(
+                    kpi=kpi.name,
+                    value=float(segments.kpi_sum[i] / segments.kpi_count[i]))],
+                enodeb_id=enodeb_id,
+                cell_id=cell_id,
+                start_time=started,
+                end_time=ended
+            ))
+
+    logger.info("Detected %d incidents in %d intervals of %d cells",
+                len(incidents), len(counters), len(cells))
+    return incidents
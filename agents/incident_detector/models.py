@@ -11,18 +11,33 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import uuid
+from datetime import datetime, UTC
 from typing import Optional
 
 from pydantic import BaseModel, Field
 
+from telco_common.timestamps import UtcDatetime, format_timestamp
+
+_INCIDENT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS,
+                                    'incidents.telco-autonomous-networks')
+
+
+def episode_incident_id(enodeb_id: str, cell_id: str, kpi: str,
+    started: datetime) -> str:
+    """
+    Stable incident id, so that re-running the detection over the same data
+    produces the same incidents.
+    """
+    return str(uuid.uuid5(_INCIDENT_ID_NAMESPACE,
+                          f"{enodeb_id}/{cell_id}/{kpi}/"
+                          f"{started.astimezone(UTC).isoformat()}"))
+
 
 class MissedKPI(BaseModel):
     kpi: str = Field('KPI ID')
     value: float = Field("Value of the KPI")
 
-    def as_bigquery_struct(self) -> str:
-        return f"STRUCT( '{self.kpi}' as kpi, {self.value} as value)"
-
 
 class Incident(BaseModel):
     id: str = Field("Unique incident id")
@@ -31,5 +46,31 @@ class Incident(BaseModel):
     enodeb_id: Optional[str] = Field("EnodeB where the KPI failed")
     cell_id: Optional[str] = Field("Cell id where the KPI failed")
     status: str = Field("Status of the incident")
-    start_time: str = Field("Start time of the incident")
-    end_time: Optional[str] = Field("End time of the incident")
+    start_time: UtcDatetime = Field("Start time of the incident")
+    end_time: Optional[UtcDatetime] = Field("End time of the incident")
+
+    def as_compact_record(self) -> list:
+        """
+        Positional representation used to keep the incidents in the session
+        state. The incident id is the key of the record.
+        """
+        return [self.description,
+                [[missed_kpi.kpi, missed_kpi.value] for missed_kpi in
+                 self.kpi_missed],
+                self.enodeb_id, self.cell_id, self.status,
+                format_timestamp(self.start_time),
+                format_timestamp(self.end_time) if self.end_time else None]
+
+    @classmethod
+    def from_compact_record(cls, incident_id: str, record: list) -> 'Incident':
+        description, kpi_missed, enodeb_id, cell_id, status, start_time, end_time = record
+        return cls(
+            id=incident_id,
+            description=description,
+            kpi_missed=[MissedKPI(kpi=kpi, value=value) for kpi, value in
+                        kpi_missed],
+            enodeb_id=enodeb_id,
+            cell_id=cell_id,
+            status=status,
+            start_time=start_time,
+            end_time=end_time)
@@ -0,0 +1,106 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Splits the KPI breaches of a cell into separate episodes.
+
+A cell which breaches a KPI on Monday and again on Friday has two incidents,
+not a single week-long one.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+# Performance counters are collected at 15 minute intervals.
+MEASUREMENT_INTERVAL = timedelta(minutes=15)
+
+
+@dataclass(slots=True)
+class Episode:
+    """
+    Contiguous (within the gap tolerance) breach of a KPI by a single cell.
+    """
+    started: datetime
+    ended: datetime
+    kpi_sum: float
+    kpi_count: int
+    incident_id: Optional[str] = None
+
+    def mean(self) -> float:
+        return self.kpi_sum / self.kpi_count
+
+    def duration(self) -> timedelta:
+        # Both ends are interval end timestamps, the first interval counts too.
+        return self.ended - self.started + MEASUREMENT_INTERVAL
+
+    def is_continued_by(self, next_breach: datetime,
+        gap_tolerance: timedelta) -> bool:
+        return next_breach - self.ended <= MEASUREMENT_INTERVAL + gap_tolerance
+
+    def extend(self, other: 'Episode') -> 'Episode':
+        return Episode(
+            incident_id=self.incident_id,
+            started=self.started,
+            ended=other.ended,
+            kpi_sum=self.kpi_sum + other.kpi_sum,
+            kpi_count=self.kpi_count + other.kpi_count)
+
+
+@dataclass(frozen=True)
+class Segments:
+    """
+    Episodes as parallel arrays, ordered by key and start time.
+    """
+    key: np.ndarray
+    # Seconds since epoch
+    started: np.ndarray
+    ended: np.ndarray
+    kpi_sum: np.ndarray
+    kpi_count: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.key)
+
+    def duration_seconds(self) -> np.ndarray:
+        return self.ended - self.started + int(
+            MEASUREMENT_INTERVAL.total_seconds())
+
+
+def segment(keys: np.ndarray, timestamps: np.ndarray, values: np.ndarray,
+    gap_tolerance: timedelta) -> Segments:
+    """
+    Single linear pass over the breaches, which must be sorted by key (e.g. the
+    cell index) and then by timestamp (seconds since epoch). A new episode
+    starts whenever the key changes or the time since the previous breach
+    exceeds one measurement interval plus the gap tolerance.
+    """
+    if not len(keys):
+        empty = np.empty(0, dtype=np.int64)
+        return Segments(key=empty, started=empty, ended=empty,
+                        kpi_sum=np.empty(0), kpi_count=empty)
+
+    max_step = int((MEASUREMENT_INTERVAL + gap_tolerance).total_seconds())
+    new_episode = np.ones(len(keys), dtype=bool)
+    new_episode[1:] = (keys[1:] != keys[:-1]) | (
+        np.diff(timestamps) > max_step)
+
+    starts = np.flatnonzero(new_episode)
+    ends = np.append(starts[1:], len(keys)) - 1
+    return Segments(
+        key=keys[starts],
+        started=timestamps[starts],
+        ended=timestamps[ends],
+        kpi_sum=np.add.reduceat(values, starts),
+        kpi_count=ends - starts + 1)
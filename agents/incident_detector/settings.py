@@ -11,12 +11,25 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from pydantic_settings import BaseSettings
+from datetime import timedelta
+from typing import Literal, Optional
 
+from incident_detector.detection_settings import DetectionSettings
 
-class AgentSettings(BaseSettings):
+
+class AgentSettings(DetectionSettings):
     incident_detector_model: str = 'gemini-3-pro-preview'
 
+    # How often the index of open incidents is reloaded from the incidents table.
+    open_incident_index_ttl: timedelta = timedelta(minutes=10)
+
+    # The detection scans from the earliest checkpoint, but at most this long
+    # before the latest one; None scans from the earliest checkpoint however
+    # old it is. Scans which start more than detection_scan_warning_window
+    # before the latest checkpoint are logged.
+    detection_max_lookback: Optional[timedelta] = timedelta(days=30)
+    detection_scan_warning_window: Optional[timedelta] = timedelta(days=2)
+
     bigquery_run_project_id: str
     bigquery_data_project_id: str
     bigquery_data_location: str
@@ -24,6 +37,9 @@ class AgentSettings(BaseSettings):
     bigquery_table_performance: str
     bigquery_table_incidents: str
     bigquery_table_performance_kpi: str
+    bigquery_table_performance_kpi_hourly: str
+    bigquery_table_performance_kpi_daily: str
+    bigquery_table_detection_checkpoints: str
 
     agent_data_log_project_id: str
     agent_data_log_dataset: str
@@ -31,5 +47,45 @@ class AgentSettings(BaseSettings):
 
     user_agent: str = "cloud-solutions/telco-rca-usage-v1"
 
+    # Queries run on a bounded pool of threads, so that they don't block the
+    # event loop.
+    bigquery_max_concurrent_queries: int = 8
+    bigquery_query_timeout: timedelta = timedelta(seconds=60)
+
+    # Sinks of the cost and latency metrics of every query: "log", "memory"
+    # and/or "prometheus" (written to query_metrics_prometheus_file).
+    query_metrics_sinks: list[Literal['log', 'memory', 'prometheus']] = [
+        'log']
+    query_metrics_prometheus_file: str = 'query-metrics.prom'
+    # Looks up the job of every query for the billed bytes and the BigQuery
+    # cache hit, at the cost of an extra API call per query.
+    query_metrics_job_statistics: bool = False
+
+    # Per-tool limit of the bytes a query may scan, enforced by BigQuery as
+    # the maximum bytes billed (at least 10 MB). Tools without an entry in
+    # query_byte_budgets get query_default_byte_budget; None is unlimited.
+    # "log" only reports the queries over the budget.
+    query_byte_budgets: dict[str, int] = {}
+    query_default_byte_budget: Optional[int] = None
+    query_budget_action: Literal['reject', 'log'] = 'reject'
+    # Estimates every query with a dry run first: logs how much of the tables
+    # it reads, and rejects it before it runs if it's over the budget.
+    query_dry_run: bool = False
+
+    # Where the agent's data is kept. "sqlite" runs the agents on a local
+    # database file, loaded from the files in the data directory on first use.
+    storage_backend: Literal['bigquery', 'sqlite'] = 'bigquery'
+    sqlite_database: str = '../data/telco-agents.sqlite'
+    sqlite_performance_csv: str = '../data/performance.csv'
+    sqlite_cell_traces_csv: str = '../data/cell-traces.csv'
+    # JSONL export of the incidents table, e.g. with prior incidents.
+    sqlite_incidents_jsonl: Optional[str] = None
+    sqlite_schema_directory: str = '../infrastructure/terraform/bigquery-schema'
+
+    # The agent, the storage and the clients are constructed on first use.
+    # With warm_up_on_start, they are constructed in the background as soon
+    # as the agent is imported.
+    warm_up_on_start: bool = False
+
 
 settings = AgentSettings()
@@ -0,0 +1,159 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Parallel local detection. The cells are partitioned into shards by a stable
+hash of (enodeb_id, cell_id), so all the intervals of a cell are processed by
+the same worker.
+
+Worker processes don't receive the data through pickling - the columns are
+saved once as .npy files and every worker memory-maps them.
+"""
+import logging
+import os
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+    Executor
+from datetime import timedelta
+from typing import Literal, Optional
+
+import numpy as np
+
+from incident_detector.detection_settings import detection_settings
+from incident_detector.local_engine import PerformanceCounters, \
+    detect_incidents, index_cells
+from incident_detector.models import Incident
+from telco_common.kpi_registry import KPIS, KPIDefinition
+
+logger = logging.getLogger(__name__)
+
+_ENODEB_ID = 'enodeb_id'
+_CELL_ID = 'cell_id'
+_MEASUREMENT_END = 'measurement_end'
+_SHARD = 'shard'
+
+
+def shard_of_cells(enodeb_id: np.ndarray, cell_id: np.ndarray,
+    shards: int) -> np.ndarray:
+    """
+    Shard of every interval. CRC32 (unlike hash()) is the same in every
+    process and every run.
+    """
+    cells, cell_index = index_cells(enodeb_id, cell_id)
+    cell_shards = np.array(
+        [zlib.crc32(f"{enodeb}/{cell}".encode()) % shards for enodeb, cell in
+         cells], dtype=np.int32)
+    return cell_shards[cell_index]
+
+
+def _select(counters: PerformanceCounters, shard_column: np.ndarray,
+    shard: int) -> PerformanceCounters:
+    rows = np.flatnonzero(shard_column == shard)
+    return PerformanceCounters(
+        enodeb_id=counters.enodeb_id[rows],
+        cell_id=counters.cell_id[rows],
+        measurement_end=counters.measurement_end[rows],
+        counters={name: values[rows] for name, values in
+                  counters.counters.items()})
+
+
+def _save_columns(counters: PerformanceCounters, shard_column: np.ndarray,
+    directory: str) -> list[str]:
+    columns = {_ENODEB_ID: counters.enodeb_id, _CELL_ID: counters.cell_id,
+               _MEASUREMENT_END: counters.measurement_end,
+               _SHARD: shard_column} | counters.counters
+    for name, values in columns.items():
+        np.save(os.path.join(directory, f"{name}.npy"), values)
+    return list(counters.counters)
+
+
+def _load_columns(directory: str, counter_names: list[str]) -> tuple[
+    PerformanceCounters, np.ndarray]:
+    def load(name: str) -> np.ndarray:
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+
+    return PerformanceCounters(
+        enodeb_id=load(_ENODEB_ID),
+        cell_id=load(_CELL_ID),
+        measurement_end=load(_MEASUREMENT_END),
+        counters={name: load(name) for name in counter_names}
+    ), load(_SHARD)
+
+
+def _detect_memory_mapped_shard(directory: str, counter_names: list[str],
+    shard: int, kpis: list[KPIDefinition], gap_tolerance: timedelta,
+    min_duration: timedelta) -> list[Incident]:
+    counters, shard_column = _load_columns(directory, counter_names)
+    return detect_incidents(_select(counters, shard_column, shard), kpis,
+                            gap_tolerance, min_duration)
+
+
+def _detect_shard(counters: PerformanceCounters, shard_column: np.ndarray,
+    shard: int, kpis: list[KPIDefinition], gap_tolerance: timedelta,
+    min_duration: timedelta) -> list[Incident]:
+    return detect_incidents(_select(counters, shard_column, shard), kpis,
+                            gap_tolerance, min_duration)
+
+
+def detect_incidents_sharded(counters: PerformanceCounters,
+    shards: Optional[int] = None, kpis: list[KPIDefinition] = KPIS,
+    gap_tolerance: Optional[timedelta] = None,
+    min_duration: Optional[timedelta] = None,
+    executor: Optional[Literal['process', 'thread']] = None) -> list[Incident]:
+    """
+    Same result, in the same order, as detect_incidents, computed by up to
+    `shards` parallel workers. The arguments which aren't given are taken
+    from the detection settings.
+    """
+    if shards is None:
+        shards = detection_settings.detection_shards
+    if gap_tolerance is None:
+        gap_tolerance = detection_settings.episode_gap_tolerance
+    if min_duration is None:
+        min_duration = detection_settings.episode_min_duration
+    if executor is None:
+        executor = detection_settings.detection_shard_executor
+    if shards <= 1 or not len(counters):
+        return detect_incidents(counters, kpis, gap_tolerance, min_duration)
+
+    shard_column = shard_of_cells(counters.enodeb_id, counters.cell_id, shards)
+
+    pool: Executor
+    with tempfile.TemporaryDirectory(prefix='detection-') as directory:
+        if executor == 'process':
+            counter_names = _save_columns(counters, shard_column, directory)
+            pool = ProcessPoolExecutor(max_workers=shards)
+            futures = [pool.submit(_detect_memory_mapped_shard, directory,
+                                   counter_names, shard, kpis, gap_tolerance,
+                                   min_duration) for shard in range(shards)]
+        else:
+            # NumPy releases the GIL in the heavy operations, threads can
+            # share the arrays directly.
+            pool = ThreadPoolExecutor(max_workers=shards)
+            futures = [pool.submit(_detect_shard, counters, shard_column, shard,
+                                   kpis, gap_tolerance, min_duration) for shard
+                       in range(shards)]
+        with pool:
+            shard_incidents = [future.result() for future in futures]
+
+    # Every cell belongs to exactly one shard, so a stable sort by KPI and cell
+    # keeps the time order of the incidents of a cell.
+    kpi_order = {kpi.name: position for position, kpi in enumerate(kpis)}
+    incidents = sorted(
+        (incident for incidents in shard_incidents for incident in incidents),
+        key=lambda incident: (kpi_order[incident.kpi_missed[0].kpi],
+                              incident.enodeb_id, incident.cell_id))
+    logger.info("Detected %d incidents using %d shards", len(incidents),
+                shards)
+    return incidents
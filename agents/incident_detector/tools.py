@@ -12,43 +12,86 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import logging
-import uuid
-from datetime import datetime, UTC
+from datetime import datetime, UTC, timedelta
 from typing import Optional
 
 from google.adk.tools import ToolContext
-from google.api_core.client_info import ClientInfo
-from google.cloud import bigquery
-from google.cloud.bigquery import QueryJobConfig
-from google.cloud.bigquery.enums import JobCreationMode
 
-from incident_detector.models import Incident, MissedKPI
+from incident_detector.checkpoints import Checkpoint, CheckpointKey, \
+    load_checkpoints, save_checkpoints, scan_start
+from incident_detector.detection import build_incidents
+from incident_detector.incident_index import open_incident_index
+from incident_detector.incident_writer import save_incidents
+from incident_detector.models import Incident
+from incident_detector.segmentation import MEASUREMENT_INTERVAL
 from incident_detector.settings import settings
+from incident_detector.storage import storage
+from telco_common.kpi_registry import KPIS
 
 logger = logging.getLogger(__name__)
 
 INCIDENTS_ATTR = 'incidents'
+PENDING_CHECKPOINTS_ATTR = 'pending_checkpoints'
 
-bigquery_client = bigquery.Client(client_info=ClientInfo(
-    user_agent=settings.user_agent),
-    default_job_creation_mode=JobCreationMode.JOB_CREATION_OPTIONAL
-)
 
-DATE_FORMAT = "%c"
+def _defer_checkpoints(tool_context: ToolContext, incidents: list[Incident],
+    checkpoints: dict[CheckpointKey, Checkpoint],
+    new_checkpoints: list[Checkpoint]) -> list[Checkpoint]:
+    """
+    Keeps the new checkpoints of the cells and KPIs with potential incidents
+    in the session state until the user creates or dismisses those incidents.
+    Otherwise the next run would start past the incidents and never report
+    them again. Returns the checkpoints to save right away.
+    """
+    pending_incidents: dict[CheckpointKey, list[Incident]] = {}
+    for incident in incidents:
+        key = incident.enodeb_id, incident.cell_id, incident.kpi_missed[0].kpi
+        pending_incidents.setdefault(key, []).append(incident)
 
-# TODO: share these conversion utilities across agents.
-_RFC3339_MICROS = "%Y-%m-%dT%H:%M:%S.%fZ"
+    ready: list[Checkpoint] = []
+    pending: list[list] = []
+    for checkpoint in new_checkpoints:
+        key_incidents = pending_incidents.get(checkpoint.key())
+        if not key_incidents:
+            ready.append(checkpoint)
+            continue
+        pending.append([checkpoint.as_compact_record(),
+                        [incident.id for incident in key_incidents]])
+        if checkpoint.key() not in checkpoints:
+            # A cell and KPI without a checkpoint is only scanned from the
+            # earliest watermark of the others - keep a watermark just before
+            # the incidents instead.
+            ready.append(Checkpoint(
+                enodeb_id=checkpoint.enodeb_id,
+                cell_id=checkpoint.cell_id,
+                kpi=checkpoint.kpi,
+                watermark=min(incident.start_time for incident in
+                              key_incidents) - MEASUREMENT_INTERVAL))
 
+    tool_context.state[PENDING_CHECKPOINTS_ATTR] = pending
+    return ready
 
-def _timestamp_to_bigquery_format(value: str):
-    """Coerce 'value' to an JSON-compatible representation."""
-    timestamp = datetime.strptime(value, DATE_FORMAT)
-    # For naive datetime objects UTC timezone is assumed, thus we format
-    # those to string directly without conversion.
-    if timestamp.tzinfo is not None:
-        timestamp = timestamp.astimezone(UTC)
-    result = timestamp.strftime(_RFC3339_MICROS)
-    return result
+
+async def _settle_incidents(tool_context: ToolContext,
+    incident_ids: list[str]) -> None:
+    """
+    Saves the checkpoints which no longer wait for any of the potential
+    incidents, once those are created or dismissed.
+    """
+    settled = set(incident_ids)
+    ready: list[Checkpoint] = []
+    pending: list[list] = []
+    for record, pending_ids in tool_context.state.get(PENDING_CHECKPOINTS_ATTR,
+                                                      []):
+        pending_ids = [incident_id for incident_id in pending_ids
+                       if incident_id not in settled]
+        if pending_ids:
+            pending.append([record, pending_ids])
+        else:
+            ready.append(Checkpoint.from_compact_record(record))
+
+    await save_checkpoints(ready)
+    tool_context.state[PENDING_CHECKPOINTS_ATTR] = pending
 
 
 async def get_potential_incidents(tool_context: ToolContext) -> dict:
@@ -57,79 +100,27 @@ async def get_potential_incidents(tool_context: ToolContext) -> dict:
     :param tool_context:
     :return: dictionary, with "status" attribute denoting the tool call success and "incidents" with the list of potential incidents
     """
-    incidents = []
     try:
-        performance_kpi_table = f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_performance_kpi}"
-        # This query is a bit simplistic. But for the purpose of this demo it's sufficient.
-        # There is no check pointing - it scans all the data.
-        # It assumes that the data points of KPIs dropping below the threshold are contiguous in time.
-        # It's possible that there are multiple drop/back-to-normal jumps, etc.
-        query = f"""
-WITH kpi_metadata as (
-  SELECT kpi, description FROM UNNEST([
-    STRUCT('erab_success_rate' as kpi, 'ERAB success rate is below 97%' as description),
-    STRUCT('retainability' as kpi, 'Retainability is above 3' as description)
-  ])
-),
-missed_kpis AS (
-SELECT 
-    enodeb_id, 
-    cell_id,
-    measurement_end,
-    kpi_metadata.kpi as kpi,
-    CASE
-      WHEN kpi_metadata.kpi = 'erab_success_rate' THEN 
-        erab_success_rate
-      WHEN kpi_metadata.kpi = 'retainability' THEN 
-        retainability
-    END AS kpi_value, 
-  FROM `{performance_kpi_table}`, kpi_metadata 
-  WHERE CASE 
-    WHEN kpi_metadata.kpi = 'erab_success_rate' THEN erab_success_rate < 97
-    WHEN kpi_metadata.kpi = 'retainability' THEN retainability > 3
-    END
-),
-aggregated_kpis AS (
-  SELECT
-   enodeb_id, 
-   cell_id, 
-   kpi,
-   MIN(measurement_end) as started,
-   MAX(measurement_end) as ended,
-   AVG(kpi_value) as kpi_value,
-  FROM missed_kpis
-  GROUP BY enodeb_id, cell_id, kpi
-)
-SELECT 
-    enodeb_id, cell_id, 
-    kpi_metadata.description,
-    aggregated_kpis.kpi,  
-    kpi_value,
-    started, ended 
-    FROM aggregated_kpis, kpi_metadata
-    WHERE aggregated_kpis.kpi = kpi_metadata.kpi
-"""
-        logger.info("About to check for incidents: %s", query)
-        rows = bigquery_client.query_and_wait(
-            project=settings.bigquery_run_project_id,
-            location=settings.bigquery_data_location,
-            job_config=QueryJobConfig(
-                job_timeout_ms=60 * 1000
-            ),
-            query=query
-        )
-        for row in rows:
-            incidents.append(Incident(
-                id=str(uuid.uuid4()),
-                status='NEW',
-                description=row.description,
-                kpi_missed=[MissedKPI(kpi=row.kpi, value=row.kpi_value)],
-                enodeb_id=row.enodeb_id,
-                cell_id=row.cell_id,
-                start_time=row.started.strftime(DATE_FORMAT),
-                end_time=row.ended.strftime(DATE_FORMAT)
-            )
-            )
+        checkpoints = await load_checkpoints()
+        # Only the data after the per cell and KPI watermark is scanned. The constant
+        # @scan_from filter is there to prune the measurement_end partitions.
+        # The breaches are returned in time order and split into episodes by
+        # build_incidents.
+        scan_from = scan_start(checkpoints, KPIS,
+                               settings.detection_max_lookback,
+                               settings.detection_scan_warning_window)
+        rows = await storage.scan_kpi_breaches(KPIS, scan_from)
+
+        # An incident which ended before the scan window can't be reported
+        # again, unless it's extended - and then it has changed anyway.
+        await open_incident_index.refresh(
+            scan_from - settings.episode_gap_tolerance)
+        incidents, new_checkpoints = build_incidents(
+            rows, checkpoints, KPIS, settings.episode_gap_tolerance,
+            settings.episode_min_duration,
+            open_incident_index.is_new_or_changed)
+        await save_checkpoints(_defer_checkpoints(
+            tool_context, incidents, checkpoints, new_checkpoints))
     except Exception as ex:
         logger.error("Call to retrieve incidents failed: %s", str(ex))
         return {
@@ -137,26 +128,28 @@ SELECT
         }
 
     logger.info("Potential incidents: %s", incidents)
-    tool_context.state[INCIDENTS_ATTR] = [incident.model_dump_json() for
-                                          incident in incidents]
+    # Keyed by id, so that creating an incident only needs to parse that one.
+    tool_context.state[INCIDENTS_ATTR] = {
+        incident.id: incident.as_compact_record() for incident in incidents}
     return {
         "status": "success",
         "incidents": incidents
     }
 
 
+def _find_incidents(tool_context: ToolContext,
+    incident_ids: list[str]) -> dict[str, Incident]:
+    records: dict[str, list] = tool_context.state.get(INCIDENTS_ATTR, {})
+    return {incident_id: Incident.from_compact_record(incident_id,
+                                                      records[incident_id])
+            for incident_id in incident_ids if incident_id in records}
+
+
 async def create_new_incident(tool_context: ToolContext,
     incident_id: str) -> dict:
-    incident: Optional[Incident] = None
-
-    incidents: list[Incident] = [Incident.model_validate_json(incident_dict) for
-                                 incident_dict in
-                                 tool_context.state[INCIDENTS_ATTR]]
-    for next_incident in incidents:
-        next_incident: Incident
-        if next_incident.id == incident_id:
-            incident = next_incident
-            break
+    incident: Optional[Incident] = _find_incidents(tool_context,
+                                                   [incident_id]).get(
+        incident_id)
 
     if not incident:
         logger.error("Unable to find incident by id %s ", incident_id)
@@ -164,42 +157,7 @@ async def create_new_incident(tool_context: ToolContext,
                 'reason': 'Unable to find incident by provided id'}
 
     try:
-        incidents_table = f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_incidents}"
-
-        missed_kpi_data = '[' + ','.join(
-            [missed_kpi.as_bigquery_struct() for missed_kpi in
-             incident.kpi_missed]) + ']'
-
-        query = f"""
-       INSERT INTO `{incidents_table}` (
-        incident_id,
-        EnodeB_id,
-        cell_id,
-        start_ts,
-        end_ts,
-        status,
-        description,
-        kpi_missed
-        )
-        VALUES (
-            '{incident.id}',
-            '{incident.enodeb_id}',
-            '{incident.cell_id}',
-            '{_timestamp_to_bigquery_format(incident.start_time)}',
-            '{_timestamp_to_bigquery_format(incident.end_time)}',
-            '{incident.status}',
-            '{incident.description}',
-            {missed_kpi_data}
-        )"""
-        logger.info("About to insert an incident: %s", query)
-        bigquery_client.query_and_wait(
-            project=settings.bigquery_run_project_id,
-            location=settings.bigquery_data_location,
-            job_config=QueryJobConfig(
-                job_timeout_ms=60 * 1000
-            ),
-            query=query
-        )
+        await save_incidents([incident])
     except Exception as ex:
         logger.error("Call to save an incident failed: %s", str(ex))
         return {
@@ -208,4 +166,101 @@ async def create_new_incident(tool_context: ToolContext,
 
     logger.info("Incident %s successfully created", incident_id)
 
+    try:
+        await _settle_incidents(tool_context, [incident_id])
+    except Exception as ex:
+        # The incident exists, so the next run does not report it again.
+        logger.error("Call to save detection checkpoints failed: %s", str(ex))
+
     return {'status': 'Success'}
+
+
+async def create_new_incidents(tool_context: ToolContext,
+    incident_ids: list[str]) -> dict:
+    """
+    Create several incidents at once.
+
+    :param tool_context:
+    :param incident_ids: IDs of the potential incidents to create
+    :return: dictionary, with "status" attribute denoting the tool call success and "incidents" with the status of every requested incident
+    """
+    incidents = _find_incidents(tool_context, incident_ids)
+
+    statuses: dict[str, str] = {}
+    for incident_id in incident_ids:
+        if incident_id not in incidents:
+            logger.error("Unable to find incident by id %s ", incident_id)
+            statuses[incident_id] = 'Unable to find incident by provided id'
+
+    if incidents:
+        try:
+            await save_incidents(list(incidents.values()))
+        except Exception as ex:
+            logger.error("Call to save incidents failed: %s", str(ex))
+            for incident_id in incidents:
+                statuses[incident_id] = 'SQL call failed'
+            return {"status": "error", "incidents": statuses}
+
+        for incident_id in incidents:
+            statuses[incident_id] = 'Success'
+
+        try:
+            await _settle_incidents(tool_context, list(incidents))
+        except Exception as ex:
+            # The incidents exist, so the next run does not report them again.
+            logger.error("Call to save detection checkpoints failed: %s",
+                         str(ex))
+
+    logger.info("%d of %d incidents successfully created", len(incidents),
+                len(incident_ids))
+
+    return {'status': 'Success' if len(incidents) == len(
+        incident_ids) else 'Partial success', 'incidents': statuses}
+
+
+async def dismiss_incidents(tool_context: ToolContext,
+    incident_ids: list[str]) -> dict:
+    """
+    Dismiss potential incidents which the user decided not to create, so that
+    they are not reported again.
+
+    :param tool_context:
+    :param incident_ids: IDs of the potential incidents to dismiss
+    :return: dictionary, with "status" attribute denoting the tool call success
+    """
+    try:
+        await _settle_incidents(tool_context, incident_ids)
+    except Exception as ex:
+        logger.error("Call to dismiss incidents failed: %s", str(ex))
+        return {
+            "status": "error", 'description': 'SQL call failed'
+        }
+
+    logger.info("%d incidents dismissed", len(incident_ids))
+
+    return {'status': 'Success'}
+
+
+async def get_kpi_history(tool_context: ToolContext, enodeb_id: str,
+    cell_id: str, lookback_days: int = 7) -> dict:
+    """
+    Get the KPI history of a cell, to compare a potential incident with the
+    usual levels of the cell.
+
+    :param tool_context:
+    :param enodeb_id: eNodeB of the cell
+    :param cell_id: ID of the cell
+    :param lookback_days: number of days of the history, up to now
+    :return: dictionary, with "status" attribute denoting the tool call success, "resolution" of the periods and "periods" with min, max and average of every KPI
+    """
+    end = datetime.now(UTC)
+    try:
+        history = await storage.get_kpi_history(
+            enodeb_id, cell_id, end - timedelta(days=lookback_days), end)
+    except Exception as ex:
+        logger.error("Call to get the KPI history failed: %s", str(ex))
+        return {
+            "status": "error", 'description': 'SQL call failed'
+        }
+
+    return {'status': 'Success' if history['periods'] else 'No KPI data found'} | history
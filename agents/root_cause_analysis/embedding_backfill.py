@@ -0,0 +1,259 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Backfill of the embeddings of the incidents' events.
+
+Only the incidents analyzed by the agent get embeddings, so the prior
+incident search never finds the incidents imported from other systems. This
+command embeds the events of every incident without embeddings of the
+current EMBEDDINGS_MODEL - missing, or computed by another model - several
+incidents per request and several requests at a time, and writes them in
+bulk.
+
+From the agents directory:
+
+    python -m root_cause_analysis.embedding_backfill --concurrency 16 \
+        --checkpoint embedding-backfill.json
+
+The incidents are processed in incident_id order. After every write, the
+last written incident is saved in the checkpoint file, and a run with the
+same file continues after it. The file is removed when the backfill
+completes. Incidents which still fail after the retries are skipped and
+counted; the next run picks them up again.
+
+With BigQuery, the embeddings are loaded into a staging table and merged
+into the incidents table once, at the end - a DML statement bills the whole
+table. They are only visible to the prior incident search after the merge.
+
+gemini-embedding-001 on Vertex AI embeds a single text per request, hence
+the default --batch-size of 1; use larger batches with the models which
+accept several.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from google.genai import errors
+
+from root_cause_analysis.settings import settings
+from root_cause_analysis.tools.embeddings import embed_events_batch, \
+    embeddings_model_version
+from root_cause_analysis.tools.storage import storage
+from telco_common.query_metrics import QueryTags, set_query_tags
+from telco_common.storage.backend import StorageBackend, Record
+
+logger = logging.getLogger(__name__)
+
+EmbedFunction = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+_MAX_BACKOFF_SECONDS = 60.
+
+
+@dataclass
+class BackfillCheckpoint:
+    model: str
+    # Every incident up to this one has been written or skipped.
+    after_incident_id: Optional[str] = None
+    embedded: int = 0
+    failed: int = 0
+    # Written to the staging table, but not merged yet.
+    staged: int = 0
+
+    @classmethod
+    def load(cls, path: str, model: str) -> 'BackfillCheckpoint':
+        if not os.path.exists(path):
+            return cls(model)
+        with open(path, mode='r', encoding='utf-8') as infile:
+            checkpoint = cls(**json.load(infile))
+        if checkpoint.model != model:
+            # The staged embeddings of the other model are merged anyway,
+            # the next run replaces them.
+            logger.warning("The checkpoint %s is of the model %s, starting "
+                           "over with %s", path, checkpoint.model, model)
+            return cls(model, staged=checkpoint.staged)
+        return checkpoint
+
+    def save(self, path: str) -> None:
+        # Replaced atomically, a stopped run never leaves a partial file.
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(mode='w', dir=directory,
+                                         delete=False,
+                                         encoding='utf-8') as outfile:
+            json.dump(asdict(self), outfile)
+        os.replace(outfile.name, path)
+
+
+def _is_retryable(ex: Exception) -> bool:
+    if isinstance(ex, errors.APIError):
+        return ex.code in (408, 429) or ex.code >= 500
+    return isinstance(ex, (httpx.TransportError, TimeoutError))
+
+
+async def embed_with_retry(embed: EmbedFunction, events: list[str],
+    attempts: int, initial_backoff_seconds: float) -> list[list[float]]:
+    """
+    Retries the rate limited and the failed requests with an exponential
+    backoff and jitter.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await embed(events)
+        except Exception as ex:
+            if attempt == attempts or not _is_retryable(ex):
+                raise
+            backoff = min(initial_backoff_seconds * 2 ** (attempt - 1),
+                          _MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.)
+            logger.warning("Embedding request failed (attempt %d of %d), "
+                           "retrying in %.1f s: %s", attempt, attempts,
+                           backoff, str(ex))
+            await asyncio.sleep(backoff)
+    raise AssertionError("Unreachable")
+
+
+async def backfill_embeddings(backend: StorageBackend, embed: EmbedFunction,
+    model: str, checkpoint_path: str, batch_size: int = 1,
+    concurrency: int = 8, page_size: int = 5000,
+    write_batch_size: int = 2000, attempts: int = 5,
+    initial_backoff_seconds: float = 1.,
+    limit: Optional[int] = None) -> BackfillCheckpoint:
+    """
+    Embeds the events of the incidents without embeddings of the model. At
+    most `concurrency` requests of `batch_size` incidents run at a time,
+    while the next page of incidents is read. The embeddings are written
+    every `write_batch_size` incidents, in incident_id order, so that the
+    checkpoint is always a prefix of the processed incidents.
+    """
+    checkpoint = BackfillCheckpoint.load(checkpoint_path, model)
+    logger.info("Embedding the incidents after %s with %s",
+                checkpoint.after_incident_id or 'the first one', model)
+    started = time.monotonic()
+    embedded_before = checkpoint.embedded
+
+    semaphore = asyncio.Semaphore(concurrency)
+    # Batches being embedded, in incident_id order.
+    pending: deque[tuple[list[Record], asyncio.Task]] = deque()
+    written: list[dict] = []
+    done_through = checkpoint.after_incident_id
+
+    async def embed_batch(batch: list[Record]) -> list[list[float]]:
+        async with semaphore:
+            return await embed_with_retry(
+                embed, [row.events for row in batch], attempts,
+                initial_backoff_seconds)
+
+    async def write() -> None:
+        await backend.stage_incident_embeddings(written)
+        checkpoint.embedded += len(written)
+        checkpoint.staged += len(written)
+        checkpoint.after_incident_id = done_through
+        checkpoint.save(checkpoint_path)
+        logger.info("Embedded %d incidents, %d failed, up to %s",
+                    checkpoint.embedded, checkpoint.failed, done_through)
+        written.clear()
+
+    async def complete_oldest() -> None:
+        nonlocal done_through
+        batch, task = pending.popleft()
+        try:
+            embeddings = await task
+            written.extend({
+                'incident_id': row.incident_id,
+                'events_embeddings': embedding,
+                'events_embeddings_model': model,
+            } for row, embedding in zip(batch, embeddings))
+        except Exception as ex:
+            checkpoint.failed += len(batch)
+            logger.error("Failed to embed the incidents %s to %s: %s",
+                         batch[0].incident_id, batch[-1].incident_id, str(ex))
+        done_through = batch[-1].incident_id
+        if len(written) >= write_batch_size:
+            await write()
+
+    queued = 0
+    try:
+        async for page in backend.stream_incidents_to_embed(
+            model, checkpoint.after_incident_id, page_size):
+            if limit is not None:
+                page = page[:limit - queued]
+            for offset in range(0, len(page), batch_size):
+                batch = page[offset:offset + batch_size]
+                pending.append(
+                    (batch, asyncio.create_task(embed_batch(batch))))
+                queued += len(batch)
+                # Enough batches to keep every request slot busy.
+                while len(pending) > 2 * concurrency:
+                    await complete_oldest()
+            if limit is not None and queued >= limit:
+                break
+        while pending:
+            await complete_oldest()
+        await write()
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+    if checkpoint.staged:
+        await backend.apply_staged_incident_embeddings(
+            settings.bigquery_load_timeout)
+        checkpoint.staged = 0
+    if limit is not None and queued >= limit:
+        checkpoint.save(checkpoint_path)
+    elif os.path.exists(checkpoint_path):
+        # Complete - the next run starts from the first incident again.
+        os.remove(checkpoint_path)
+    elapsed = time.monotonic() - started
+    embedded = checkpoint.embedded - embedded_before
+    logger.info("Embedded %d incidents in %.1f s (%.1f incidents/s)",
+                embedded, elapsed, embedded / elapsed if elapsed else 0.)
+    return checkpoint
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--checkpoint', default='embedding-backfill.json')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="incidents embedded per request")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="embedding requests at a time")
+    parser.add_argument('--page-size', type=int, default=5000,
+                        help="incidents read per query")
+    parser.add_argument('--write-batch-size', type=int, default=2000,
+                        help="incidents written at a time")
+    parser.add_argument('--attempts', type=int, default=5,
+                        help="attempts of every request")
+    parser.add_argument('--limit', type=int,
+                        help="stop after this many incidents")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    set_query_tags(QueryTags(tool='embedding_backfill'))
+    checkpoint = asyncio.run(backfill_embeddings(
+        storage.get(), embed_events_batch, embeddings_model_version,
+        args.checkpoint, args.batch_size, args.concurrency, args.page_size,
+        args.write_batch_size, args.attempts, limit=args.limit))
+    print(f"Embedded {checkpoint.embedded} incidents, "
+          f"{checkpoint.failed} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Recall, size and latency of the prior incident search with reduced and
+quantized embeddings.
+
+From the agents directory:
+
+    python -m root_cause_analysis.embedding_benchmark --dimensions 3072 1536 768 \
+        --quantization none int8 binary
+
+Every case is compared with the exact search of the full embeddings: recall@k
+is the share of its top k incidents the case finds. The embeddings are
+synthetic, with the leading dimensions carrying most of the signal like the
+embeddings of gemini-embedding-001, unless --from-storage reads the
+incidents' embeddings of EMBEDDINGS_MODEL. Some of them are the queries, the
+rest are indexed. The embeddings are reduced like the model reduces them, by
+truncating and normalizing them.
+
+The latency includes the exact re-ranking of the candidates of a quantized
+index, but not reading their embeddings from the incidents table.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import time
+from datetime import datetime, UTC
+from typing import Optional
+
+import numpy as np
+
+from telco_common.vector_index import VectorIndex, rerank, Quantization
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS: list[Quantization] = ['none', 'int8', 'binary']
+
+# BigQuery stores every component of an ARRAY<FLOAT64> in 8 bytes.
+_TABLE_BYTES_PER_COMPONENT = 8
+
+
+def generate_embeddings(count: int, dimensions: int, clusters: int,
+    seed: int) -> np.ndarray:
+    """
+    Unit vectors around `clusters` centers - incidents with the same cause
+    have similar events. The spread of the components decreases with their
+    index.
+    """
+    rng = np.random.default_rng(seed)
+    spread = 1 / np.sqrt(1 + np.arange(dimensions) / 64)
+    centers = rng.normal(size=(clusters, dimensions)) * spread
+    members = rng.integers(0, clusters, count)
+    vectors = centers[members] + rng.normal(
+        scale=.6, size=(count, dimensions)) * spread
+    return normalize(vectors.astype(np.float32))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.
+    return vectors / norms
+
+
+def reduce_dimensions(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    return normalize(vectors[:, :dimensions])
+
+
+def exact_top_k(indexed: np.ndarray, queries: np.ndarray,
+    top_k: int) -> list[set[str]]:
+    """
+    Ids of the indexed vectors closest to every query, by the exact search of
+    the full embeddings.
+    """
+    indexed = indexed.astype(np.float64)
+    queries = queries.astype(np.float64)
+    squared_distances = (np.einsum('ij,ij->i', indexed, indexed)[None, :]
+                         - 2 * queries @ indexed.T)
+    closest = np.argsort(squared_distances, axis=1, kind='stable')[:, :top_k]
+    return [{str(row) for row in rows} for rows in closest]
+
+
+async def _load_from_storage() -> np.ndarray:
+    from root_cause_analysis.settings import settings
+    from root_cause_analysis.tools.storage import storage
+
+    embeddings = await storage.get_incident_embeddings(
+        settings.embeddings_model, None)
+    return embeddings.vectors
+
+
+def run_case(indexed: np.ndarray, queries: np.ndarray,
+    baseline: list[set[str]], dimensions: int, quantization: Quantization,
+    top_k: int, rerank_candidates: int) -> dict:
+    vectors = reduce_dimensions(indexed, dimensions)
+    reduced_queries = reduce_dimensions(queries, dimensions)
+    ids = [str(row) for row in range(len(vectors))]
+
+    started = time.perf_counter()
+    index = VectorIndex(dimensions, quantization)
+    index.upsert(ids, vectors)
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    found = 0
+    for query, expected in zip(reduced_queries, baseline):
+        started = time.perf_counter()
+        if quantization == 'none':
+            matches = index.search(query, top_k)
+        else:
+            candidates = index.candidates(query, max(top_k,
+                                                     rerank_candidates))
+            matches = rerank(query, candidates, vectors[
+                [int(candidate) for candidate in candidates]], top_k)
+        latencies.append(time.perf_counter() - started)
+        found += len(expected.intersection(
+            incident_id for incident_id, _ in matches))
+
+    return {
+        'dimensions': dimensions,
+        'quantization': quantization,
+        'recall_at_k': found / (top_k * len(queries)),
+        'index_bytes': index.nbytes,
+        'index_bytes_per_vector': index.nbytes / len(index),
+        'table_bytes_per_vector': dimensions * _TABLE_BYTES_PER_COMPONENT,
+        'build_seconds': build_seconds,
+        'median_latency_ms': float(np.median(latencies)) * 1000,
+        'p95_latency_ms': float(np.percentile(latencies, 95)) * 1000,
+    }
+
+
+def run_benchmark(embeddings: np.ndarray, dimensions: list[int],
+    quantizations: list[Quantization], queries: int, top_k: int,
+    rerank_candidates: int, seed: int) -> dict:
+    full_dimensions = embeddings.shape[1]
+    order = np.random.default_rng(seed).permutation(len(embeddings))
+    query_vectors = embeddings[order[:queries]]
+    indexed = embeddings[order[queries:]]
+
+    baseline = exact_top_k(indexed, query_vectors, top_k)
+
+    cases = []
+    for dimension_count in dimensions:
+        if dimension_count > full_dimensions:
+            logger.warning("Skipping %d dimensions, the embeddings have %d",
+                           dimension_count, full_dimensions)
+            continue
+        for quantization in quantizations:
+            case = run_case(indexed, query_vectors, baseline,
+                            dimension_count, quantization, top_k,
+                            rerank_candidates)
+            logger.info("%s", case)
+            cases.append(case)
+
+    return {
+        'created': datetime.now(UTC).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'incidents': len(indexed),
+        'queries': len(query_vectors),
+        'full_dimensions': full_dimensions,
+        'top_k': top_k,
+        'rerank_candidates': rerank_candidates,
+        'cases': cases,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dimensions', nargs='+', type=int,
+                        default=[3072, 1536, 768])
+    parser.add_argument('--quantization', nargs='+', choices=QUANTIZATIONS,
+                        default=QUANTIZATIONS)
+    parser.add_argument('--incidents', type=int, default=20000,
+                        help="synthetic incidents, with the queries")
+    parser.add_argument('--clusters', type=int, default=500,
+                        help="groups of similar synthetic incidents")
+    parser.add_argument('--from-storage', action='store_true',
+                        help="use the embeddings of the incidents table")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--rerank-candidates', type=int, default=50,
+                        help="candidates of a quantized index re-ranked")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="JSON file with the full results")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.from_storage:
+        embeddings = asyncio.run(_load_from_storage())
+    else:
+        embeddings = generate_embeddings(args.incidents,
+                                         max(args.dimensions), args.clusters,
+                                         args.seed)
+    if len(embeddings) <= args.queries:
+        parser.error(f"Only {len(embeddings)} embeddings for "
+                     f"{args.queries} queries")
+    results = run_benchmark(embeddings, args.dimensions, args.quantization,
+                            args.queries, args.top_k, args.rerank_candidates,
+                            args.seed)
+    if args.output:
+        with open(args.output, mode='w', encoding='utf-8') as outfile:
+            json.dump(results, outfile, indent=2)
+
+    for case in results['cases']:
+        print(f"{case['dimensions']:>5} dims {case['quantization']:>6}: "
+              f"recall@{results['top_k']} {case['recall_at_k']:6.3f} "
+              f"{case['index_bytes_per_vector']:8,.0f} B/vector in memory "
+              f"{case['table_bytes_per_vector']:8,} B/vector in the table "
+              f"{case['median_latency_ms']:8.2f} ms "
+              f"(p95 {case['p95_latency_ms']:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,8 @@ from typing import Optional, Set, Self
 
 from pydantic import BaseModel, Field, model_validator
 
+from telco_common.timestamps import UtcDatetime
+
 
 class CellTracesStats(BaseModel):
     connection_outcome: Optional[str]
@@ -44,8 +46,8 @@ class Incident(BaseModel):
     enodeb_id: Optional[str] = Field("EnodeB where the KPI failed")
     cell_id: Optional[str] = Field("Cell id where the KPI failed")
     status: str = Field("Status of the incident")
-    start_time: str = Field("Start time of the incident")
-    end_time: Optional[str] = Field("End time of the incident")
+    start_time: UtcDatetime = Field("Start time of the incident")
+    end_time: Optional[UtcDatetime] = Field("End time of the incident")
 
 
 class Document(BaseModel):
@@ -11,7 +11,8 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from typing import Self, Optional
+from datetime import timedelta
+from typing import Self, Optional, Literal
 
 from google.adk.planners import BuiltInPlanner
 from google.api_core.client_info import ClientInfo
@@ -47,19 +48,108 @@ class AgentSettings(BaseSettings):
     bigquery_dataset: str
 
     bigquery_table_cell_traces: str
+    # Rollup of the cell trace outcomes per 15 minute bucket. Without it, the
+    # statistics are counted from the cell traces.
+    bigquery_table_cell_trace_outcomes: Optional[str] = None
     bigquery_table_performance: str
     bigquery_table_incidents: str
+    bigquery_table_performance_kpi: str
+    bigquery_table_performance_kpi_hourly: str
+    bigquery_table_performance_kpi_daily: str
 
     project_id: str
     vertex_ai_search_engine_rca_rules: str
     vertex_ai_search_engine_rca_rules_location: str
 
+    # Queries run on a bounded pool of threads, so that they don't block the
+    # event loop.
+    bigquery_max_concurrent_queries: int = 8
+    bigquery_query_timeout: timedelta = timedelta(seconds=60)
+    # Load jobs and the merge of the embedding backfill.
+    bigquery_load_timeout: timedelta = timedelta(minutes=10)
+    # Results of the read-only tool queries are cached in memory.
+    query_cache_max_entries: int = 1024
+    query_cache_ttl: timedelta = timedelta(minutes=5)
+    # Incidents are cached in memory, see root_cause_analysis.tools.incidents.
+    incident_cache_max_entries: int = 1024
+    incident_cache_ttl: timedelta = timedelta(minutes=5)
+
+    # Sinks of the cost and latency metrics of every query: "log", "memory"
+    # and/or "prometheus" (written to query_metrics_prometheus_file).
+    query_metrics_sinks: list[Literal['log', 'memory', 'prometheus']] = [
+        'log']
+    query_metrics_prometheus_file: str = 'query-metrics.prom'
+    # Looks up the job of every query for the billed bytes and the BigQuery
+    # cache hit, at the cost of an extra API call per query.
+    query_metrics_job_statistics: bool = False
+
+    # Per-tool limit of the bytes a query may scan, enforced by BigQuery as
+    # the maximum bytes billed (at least 10 MB). Tools without an entry in
+    # query_byte_budgets get query_default_byte_budget; None is unlimited.
+    # "log" only reports the queries over the budget.
+    query_byte_budgets: dict[str, int] = {}
+    query_default_byte_budget: Optional[int] = None
+    query_budget_action: Literal['reject', 'log'] = 'reject'
+    # Estimates every query with a dry run first: logs how much of the tables
+    # it reads, and rejects it before it runs if it's over the budget.
+    query_dry_run: bool = False
+
+    # Where the agent's data is kept. "sqlite" runs the agents on a local
+    # database file, loaded from the files in the data directory on first use.
+    storage_backend: Literal['bigquery', 'sqlite'] = 'bigquery'
+    sqlite_database: str = '../data/telco-agents.sqlite'
+    sqlite_performance_csv: str = '../data/performance.csv'
+    sqlite_cell_traces_csv: str = '../data/cell-traces.csv'
+    # JSONL export of the incidents table, e.g. with prior incidents.
+    sqlite_incidents_jsonl: Optional[str] = None
+    sqlite_schema_directory: str = '../infrastructure/terraform/bigquery-schema'
+
+    # The agent, the storage and the clients are constructed on first use.
+    # With warm_up_on_start, they are constructed in the background as soon
+    # as the agent is imported.
+    warm_up_on_start: bool = False
+
     embeddings_model: str = "gemini-embedding-001"
+    # Fewer dimensions than the model's default (3072 for gemini-embedding-001,
+    # which recommends 768 or 1536), normalized to a unit length. The
+    # embeddings of another dimensionality are recorded as another model.
+    embeddings_dimensions: Optional[int] = Field(default=None, gt=0)
+    # The embeddings of the same events are computed once: they are kept in
+    # memory and, unless embedding_cache_database is None, in a SQLite file.
+    embedding_cache_max_entries: int = 256
+    embedding_cache_database: Optional[str] = '../data/embedding-cache.sqlite'
+    # Prometheus text file with the cache's hit and miss counters.
+    embedding_cache_prometheus_file: Optional[str] = None
 
     # TODO: these need to be tested and adjusted as needed
     similarity_search_cutoff_distance: float = .5
     similarity_search_likely_match_distance: float = .9
     similarity_search_max_number_of_incidents: int = 5
+    # Prior incidents are searched in memory, in an index of the embeddings
+    # loaded from the incidents table and synced with the embeddings written
+    # since, at most every sync interval. Without the index, every search is
+    # a VECTOR_SEARCH query.
+    similarity_search_index: bool = True
+    similarity_search_index_sync_interval: timedelta = timedelta(minutes=1)
+    # Embeddings written this long before the previous sync are read again,
+    # in case they were committed after it.
+    similarity_search_index_sync_overlap: timedelta = timedelta(minutes=5)
+    # The index can keep the embeddings as int8 (4 times smaller) or as the
+    # signs of their components (32 times smaller). The closest candidates are
+    # then read with their full embeddings from the incidents table and
+    # re-ranked exactly.
+    similarity_search_index_quantization: Literal['none', 'int8', 'binary'] = 'none'
+    similarity_search_index_rerank_candidates: int = 50
+    # Only the prior incidents similar to the analyzed one are compared with
+    # it: the ones which missed one of its KPIs, have one of the statuses,
+    # are on its eNodeB or a neighbour, or started at most the window before
+    # it. None of them is applied by default.
+    similarity_search_filter_kpis: bool = False
+    similarity_search_filter_statuses: Optional[list[str]] = None
+    similarity_search_filter_neighbourhood: bool = False
+    similarity_search_filter_recency_window: Optional[timedelta] = None
+    # The neighbours of the eNodeBs, e.g. {"1": ["2", "3"]}, either way round.
+    enodeb_neighbours: dict[str, list[str]] = {}
 
     api_client_info: ClientInfo = ClientInfo(
         user_agent="cloud-solutions/telco-rca-usage-v1")
@@ -11,16 +11,19 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import asyncio
 import logging
 
 from google.adk import Agent
 from google.adk.tools import ToolContext
 
-from root_cause_analysis.constants import KEY_INCIDENT_DATA, KEY_PRIOR_INCIDENTS
+from root_cause_analysis.constants import KEY_INCIDENT_DATA, \
+    KEY_INCIDENT_INFO, KEY_PRIOR_INCIDENTS
+from root_cause_analysis.models import Incident
 from root_cause_analysis.settings import settings
-from root_cause_analysis.tools.bigquery_util import execute_query, \
-    incidents_table
 from root_cause_analysis.tools.embeddings import generate_embeddings_for_events
+from root_cause_analysis.tools.prior_incidents import find_prior_incidents, \
+    incident_filter_for
 
 logger = logging.getLogger(__name__)
 
@@ -41,30 +44,27 @@ def build_prior_incidents_searcher():
 async def prior_incident_search(tool_context: ToolContext) -> dict:
     events = tool_context.state[KEY_INCIDENT_DATA]
 
-    events_embeddings = generate_embeddings_for_events(events)
+    # A blocking request (and a cache lookup) - run it off the event loop.
+    events_embeddings = await asyncio.to_thread(generate_embeddings_for_events,
+                                                events)
     if not events_embeddings:
         return {
             "status": "error",
             'description': 'Failed to generate embeddings for the event.'
         }
 
-    # TODO: it might be a good idea to filter out based on the status also
-    query = f"""
-    SELECT distance, base.incident_id, base.start_ts, base.end_ts, base.status, base.description,
-        base.events, base.kpi_missed, base.enodeb_id, base.cell_id, base.cause, base.severity, 
-        base.final_analysis, base.preliminary_analysis, base.resolution 
-        FROM VECTOR_SEARCH( 
-        (SELECT * FROM `{incidents_table}` WHERE ARRAY_LENGTH(events_embeddings) > 0), 'events_embeddings', 
-        (SELECT {events_embeddings} as embeddings), 'embeddings',
-        top_k => {settings.similarity_search_max_number_of_incidents})
-        WHERE distance <= {settings.similarity_search_cutoff_distance}
-    """
-
-    logger.info("About to do vector search: %s", query)
+    incident_filter = None
+    if KEY_INCIDENT_INFO in tool_context.state:
+        incident_filter = incident_filter_for(Incident.model_validate_json(
+            tool_context.state[KEY_INCIDENT_INFO]))
 
     result = []
     try:
-        rows = execute_query(query)
+        rows = await find_prior_incidents(
+            events_embeddings,
+            settings.similarity_search_max_number_of_incidents,
+            settings.similarity_search_cutoff_distance,
+            incident_filter)
         # TODO: this formatting is better be done by the LLM or in the model and raw data should be reported by the tool
         for row in rows:
             result.append(
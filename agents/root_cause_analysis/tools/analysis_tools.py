@@ -12,6 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import logging
+from datetime import timedelta
 from typing import override, Optional
 
 from google.adk.agents.readonly_context import ReadonlyContext
@@ -21,10 +22,10 @@ from google.adk.tools.base_toolset import BaseToolset
 from root_cause_analysis.constants import KEY_INCIDENT_INFO, \
     KEY_ACTIONS
 from root_cause_analysis.models import CellTracesStats, Incident, Action
-from root_cause_analysis.tools.bigquery_util import \
-    timestamp_to_bigquery_format, execute_query, cell_traces_table
 from root_cause_analysis.tools.incident_data import \
     add_new_incident_data_section
+from root_cause_analysis.tools.incidents import incident_window
+from root_cause_analysis.tools.storage import storage
 
 logger = logging.getLogger(__name__)
 
@@ -42,19 +43,11 @@ async def get_cell_trace_statistics(tool_context: ToolContext) -> list[
     incident: Incident = Incident.model_validate_json(
         tool_context.state[KEY_INCIDENT_INFO])
 
-    incident_start: str = timestamp_to_bigquery_format(incident.start_time)
-    incident_end: str = timestamp_to_bigquery_format(incident.end_time)
+    incident_start, incident_end = incident_window(incident)
 
     try:
-        query = f"""
-        SELECT s1_sig_conn_setup_sig_conn_result connection_outcome, COUNT(*) number_of_outcomes 
-            FROM `{cell_traces_table}`   
-            WHERE start_enodeb_id = '{incident.enodeb_id}' AND start_cell_id = '{incident.cell_id}' AND
-                starttime >= '{incident_start}' AND endtime <= '{incident_end}'
-            GROUP BY s1_sig_conn_setup_sig_conn_result
-        """
-
-        rows = execute_query(query)
+        rows = await storage.get_cell_trace_outcomes(
+            incident.enodeb_id, incident.cell_id, incident_start, incident_end)
 
         result: list[CellTracesStats] = []
         text_results: list[str] = []
@@ -82,6 +75,45 @@ async def get_cell_trace_statistics(tool_context: ToolContext) -> list[
     return {'status': 'Success' if result else 'No cell traces found', 'cell_trace_statistics': result}
 
 
+async def get_kpi_history(tool_context: ToolContext,
+    lookback_days: int = 30) -> dict:
+    """
+    Get the KPI history of the cell of the current incident, from the given
+    number of days before the incident until its end.
+
+    This tool doesn't need the details of the incident to passed as parameter.
+
+    :param tool_context:
+    :param lookback_days: number of days of the history before the incident
+    :return:
+    """
+    incident: Incident = Incident.model_validate_json(
+        tool_context.state[KEY_INCIDENT_INFO])
+
+    incident_start, incident_end = incident_window(incident)
+
+    try:
+        history = await storage.get_kpi_history(
+            incident.enodeb_id, incident.cell_id,
+            incident_start - timedelta(days=lookback_days), incident_end)
+
+        await add_new_incident_data_section(
+            tool_context, f"KPI history ({history['resolution']} periods)",
+            '\n'.join(str(period) for period in history['periods'])
+        )
+
+    except Exception as ex:
+        logger.error("Call to get the KPI history failed: %s", str(ex))
+        return {
+            "status": "error", 'description': 'SQL call failed'
+        }
+
+    logger.info("KPI history successfully retrieved: %d periods",
+                len(history['periods']))
+
+    return {'status': 'Success' if history['periods'] else 'No KPI data found'} | history
+
+
 async def get_uplink_rssi_level(tool_context: ToolContext, enodeb_id: str,
     cell_id: str) -> dict:
     """
@@ -113,6 +145,7 @@ async def initiate_uplink_configuration_adjustment(tool_context: ToolContext,
 
 available_tools: list[FunctionTool] = [
     FunctionTool(func=get_cell_trace_statistics),
+    FunctionTool(func=get_kpi_history),
     FunctionTool(func=get_uplink_configuration),
     FunctionTool(func=get_uplink_rssi_level),
     FunctionTool(func=initiate_uplink_configuration_adjustment),
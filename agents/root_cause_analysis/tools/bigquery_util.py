@@ -35,50 +35,115 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from datetime import datetime, UTC
+import functools
+from datetime import timedelta
+from typing import Optional, Iterable
 
 from google.cloud import bigquery
-from google.cloud.bigquery import QueryJobConfig
+from google.cloud.bigquery import QueryJobConfig, QueryJob, LoadJobConfig, \
+    SchemaField, WriteDisposition
 from google.cloud.bigquery.enums import JobCreationMode
-from google.cloud.bigquery.table import RowIterator
+from google.cloud.bigquery.query import ScalarQueryParameter, \
+    ArrayQueryParameter
+from google.cloud.bigquery.table import RowIterator, Row
 
 from root_cause_analysis.settings import settings
-
-DATE_FORMAT = "%c"
-
-_RFC3339_MICROS = "%Y-%m-%dT%H:%M:%S.%fZ"
+from telco_common.async_query import AsyncQueryRunner
+from telco_common.lazy import Lazy
+from telco_common.query_budget import QueryBudget, dry_run
+from telco_common.query_cache import QueryResultCache
+from telco_common.query_metrics import create_recorder
+from telco_common.rollups import kpi_tiers
 
 
 def escape_single_quote(literal: str) -> str:
     return literal.replace("'", "\\'")
 
 
-def timestamp_to_bigquery_format(value: str):
-    """Coerce 'value' to an JSON-compatible representation."""
-    timestamp = datetime.strptime(value, DATE_FORMAT)
-    # For naive datetime objects UTC timezone is assumed, thus we format
-    # those to string directly without conversion.
-    if timestamp.tzinfo is not None:
-        timestamp = timestamp.astimezone(UTC)
-    result = timestamp.strftime(_RFC3339_MICROS)
-    return result
-
-
 incidents_table = f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_incidents}"
 cell_traces_table = f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_cell_traces}"
+cell_trace_outcomes_table = f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_cell_trace_outcomes}" \
+    if settings.bigquery_table_cell_trace_outcomes else None
+incident_embeddings_staging_table = f"{incidents_table}_embeddings_backfill"
+performance_kpi_tiers = kpi_tiers(
+    f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_performance_kpi}",
+    f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_performance_kpi_hourly}",
+    f"{settings.bigquery_data_project_id}.{settings.bigquery_dataset}.{settings.bigquery_table_performance_kpi_daily}")
+
 
-bigquery_client = bigquery.Client(
-    client_info=settings.api_client_info,
-    default_job_creation_mode=JobCreationMode.JOB_CREATION_OPTIONAL
-)
+def _create_bigquery_client() -> bigquery.Client:
+    return bigquery.Client(
+        client_info=settings.api_client_info,
+        default_job_creation_mode=JobCreationMode.JOB_CREATION_OPTIONAL
+    )
+
+
+bigquery_client: Lazy[bigquery.Client] = Lazy(_create_bigquery_client,
+                                              'bigquery_client')
 
 
-def execute_query(query: str) -> RowIterator:
+def execute_query(query: str, query_parameters: Optional[
+    list[ScalarQueryParameter | ArrayQueryParameter]] = None,
+    timeout: timedelta = settings.bigquery_query_timeout,
+    maximum_bytes_billed: Optional[int] = None) -> RowIterator:
     return bigquery_client.query_and_wait(
         project=settings.bigquery_run_project_id,
         location=settings.bigquery_data_location,
         job_config=QueryJobConfig(
-            job_timeout_ms=60 * 1000
+            job_timeout_ms=int(timeout.total_seconds() * 1000),
+            query_parameters=query_parameters or [],
+            maximum_bytes_billed=maximum_bytes_billed
         ),
+        wait_timeout=timeout.total_seconds(),
         query=query
     )
+
+
+def get_job(result: RowIterator) -> QueryJob:
+    return bigquery_client.get_job(result.job_id, project=result.project,
+                                   location=result.location)
+
+
+def load_rows(table: str, rows: list[dict], schema: list[SchemaField]) -> None:
+    job = bigquery_client.load_table_from_json(
+        rows, table,
+        project=settings.bigquery_run_project_id,
+        location=settings.bigquery_data_location,
+        job_config=LoadJobConfig(
+            schema=schema,
+            write_disposition=WriteDisposition.WRITE_APPEND))
+    job.result(timeout=settings.bigquery_load_timeout.total_seconds())
+
+
+query_cache = QueryResultCache(settings.query_cache_max_entries,
+                               settings.query_cache_ttl)
+
+query_runner = AsyncQueryRunner(
+    execute_query, settings.bigquery_max_concurrent_queries,
+    settings.bigquery_query_timeout,
+    cache=query_cache,
+    metrics=create_recorder(settings.query_metrics_sinks,
+                            settings.query_metrics_prometheus_file,
+                            query_cache.prometheus_lines),
+    get_job=get_job if settings.query_metrics_job_statistics else None,
+    budget=QueryBudget(settings.query_default_byte_budget,
+                       settings.query_byte_budgets,
+                       settings.query_budget_action),
+    dry_run=functools.partial(dry_run, bigquery_client,
+                              settings.bigquery_run_project_id,
+                              settings.bigquery_data_location)
+    if settings.query_dry_run else None)
+
+
+async def execute_query_async(query: str, query_parameters: Optional[
+    list[ScalarQueryParameter | ArrayQueryParameter]] = None,
+    timeout: Optional[timedelta] = None, cached: bool = False,
+    cache_tags: Iterable[str] = ()) -> list[Row]:
+    """
+    Runs the query without blocking the event loop. Use it in async tools.
+
+    The result of a cached query is reused until it expires or one of its
+    tags is invalidated. Never cache the queries which modify data.
+    """
+    return await query_runner.execute(query, query_parameters, timeout,
+                                      cached, cache_tags)
@@ -15,34 +15,92 @@
 import logging
 from typing import Optional
 
+import numpy as np
 from google import genai
 from google.genai.types import EmbedContentConfig, EmbedContentResponse, \
     HttpOptions
 
 from root_cause_analysis.settings import settings
+from telco_common.embedding_cache import EmbeddingCache
+from telco_common.lazy import Lazy
 
 logger = logging.getLogger(__name__)
 
-client = genai.Client(
+client: Lazy[genai.Client] = Lazy(lambda: genai.Client(
     location="global",
     project=settings.project_id
-)
+), 'genai_client')
 
 
-def generate_embeddings_for_events(events: str) -> Optional[list[float]]:
+# The similarity of the incidents' events, see prior_incident_search.
+_TASK_TYPE = "SEMANTIC_SIMILARITY"
+
+# Recorded with the incidents' embeddings and searched by the prior incident
+# search. The embeddings of another dimensionality can't be compared.
+embeddings_model_version = settings.embeddings_model \
+    if settings.embeddings_dimensions is None else \
+    f"{settings.embeddings_model}@{settings.embeddings_dimensions}"
+
+embedding_cache = EmbeddingCache(settings.embedding_cache_max_entries,
+                                 settings.embedding_cache_database,
+                                 settings.embedding_cache_prometheus_file)
+
+
+def _embed_content_config() -> EmbedContentConfig:
+    return EmbedContentConfig(
+        http_options=HttpOptions(
+            # 60 seconds
+            timeout=60 * 1000
+        ),
+        task_type=_TASK_TYPE,
+        output_dimensionality=settings.embeddings_dimensions
+    )
+
+
+def _embedding_values(values: list[float]) -> list[float]:
+    # Only the full size embeddings come normalized.
+    if settings.embeddings_dimensions is None:
+        return values
+    norm = float(np.linalg.norm(values))
+    return [value / norm for value in values] if norm else values
+
+
+def _embed_content(events: str) -> Optional[list[float]]:
     try:
         response: EmbedContentResponse = client.models.embed_content(
             model=settings.embeddings_model,
             contents=[events],
-            config=EmbedContentConfig(
-                http_options=HttpOptions(
-                    # 60 seconds
-                    timeout=60 * 1000
-                ),
-                task_type="SEMANTIC_SIMILARITY"
-            ),
+            config=_embed_content_config(),
         )
-        return response.embeddings[0].values
+        return _embedding_values(response.embeddings[0].values)
     except Exception as e:
         logger.error("Failed to generate embeddings: " + str(e))
         return None
+
+
+def generate_embeddings_for_events(events: str) -> Optional[list[float]]:
+    """
+    The embeddings of the events, computed once for the same text - the
+    prior incident search and the incident update embed the same events.
+    """
+    return embedding_cache.get_or_compute(
+        embeddings_model_version, _TASK_TYPE, events,
+        lambda: _embed_content(events))
+
+
+async def embed_events_batch(events: list[str]) -> list[list[float]]:
+    """
+    The embeddings of several incidents' events in a single request, in the
+    same order. Not cached, and the errors are raised - see the embedding
+    backfill.
+    """
+    response: EmbedContentResponse = await client.aio.models.embed_content(
+        model=settings.embeddings_model,
+        contents=events,
+        config=_embed_content_config(),
+    )
+    if len(response.embeddings) != len(events):
+        raise ValueError(f"Expected {len(events)} embeddings, "
+                         f"got {len(response.embeddings)}")
+    return [_embedding_values(embedding.values)
+            for embedding in response.embeddings]
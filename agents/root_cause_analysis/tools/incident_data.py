@@ -12,16 +12,20 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import asyncio
 import logging
 
 from google.adk.tools import ToolContext
 
-from incident_detector.models import Incident
 from root_cause_analysis.constants import KEY_INCIDENT_DATA, KEY_INCIDENT_INFO, \
     KEY_SEVERITY_LEVEL
-from root_cause_analysis.tools.bigquery_util import incidents_table, \
-    execute_query
-from root_cause_analysis.tools.embeddings import generate_embeddings_for_events
+from root_cause_analysis.models import Incident
+from root_cause_analysis.tools.embeddings import generate_embeddings_for_events, \
+    embeddings_model_version
+from root_cause_analysis.tools.incidents import incident_cache
+from root_cause_analysis.tools.prior_incidents import prior_incident_index
+from root_cause_analysis.tools.storage import storage
+from telco_common.storage.incident_filter import IncidentAttributes
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +49,9 @@ async def update_incident(
     severity: str = tool_context.state[KEY_SEVERITY_LEVEL]
 
     events: str = tool_context.state[KEY_INCIDENT_DATA]
-    event_embeddings: list[float] = generate_embeddings_for_events(events)
+    # A blocking request (and a cache lookup) - run it off the event loop.
+    event_embeddings: list[float] = await asyncio.to_thread(
+        generate_embeddings_for_events, events)
     if not event_embeddings:
         return {
             "status": "error",
@@ -53,18 +59,15 @@ async def update_incident(
         }
 
     try:
-        # TODO: need to escape triple quotes
-        query = f"""
-        UPDATE `{incidents_table}` SET 
-            status = 'ANALYZED',
-            preliminary_analysis = r'''{report}''',
-            severity = r'''{severity}''',
-            events = r'''{events}''',
-            events_embeddings = {event_embeddings}
-        WHERE incident_id = '{incident.id}'
-        """
-        logger.debug("About to update an incident: %s", query)
-        execute_query(query)
+        await storage.update_incident_analysis(
+            incident.id, 'ANALYZED', report, severity, events,
+            event_embeddings, embeddings_model_version)
+        incident_cache.invalidate([incident.id])
+        kpis = tuple(missed_kpi.kpi for missed_kpi in incident.kpi_missed)
+        prior_incident_index.upsert(incident.id, event_embeddings,
+                                    IncidentAttributes(kpis, 'ANALYZED',
+                                                       incident.enodeb_id,
+                                                       incident.start_time))
     except Exception as ex:
         logger.error("Call to update an incident failed: %s", str(ex))
         return {
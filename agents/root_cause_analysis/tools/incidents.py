@@ -0,0 +1,128 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Incident lookups, batched and cached.
+
+The parsed incidents are kept in an in-process LRU cache. The analysis of an
+incident invalidates it; the changes made by the incident detector, e.g. the
+end of an ongoing incident, are picked up when the entry expires.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, UTC
+from typing import Optional, Iterable
+
+from root_cause_analysis.models import Incident, MissedKPI
+from root_cause_analysis.settings import settings
+from root_cause_analysis.tools.storage import storage
+from telco_common.storage.backend import Record
+
+logger = logging.getLogger(__name__)
+
+
+class IncidentCache:
+    """
+    LRU cache of incidents by id, with a TTL for every entry. Incidents which
+    aren't found are not cached - the detector may create them any time.
+    """
+
+    def __init__(self, max_entries: int, ttl: timedelta):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl.total_seconds()
+        self._entries: OrderedDict[str, tuple[Incident, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, incident_id: str) -> Optional[Incident]:
+        with self._lock:
+            entry = self._entries.get(incident_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[incident_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(incident_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, incident: Incident) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[incident.id] = (
+                incident, time.monotonic() + self._ttl_seconds)
+            self._entries.move_to_end(incident.id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, incident_ids: Iterable[str]) -> None:
+        with self._lock:
+            for incident_id in incident_ids:
+                self._entries.pop(incident_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+incident_cache = IncidentCache(settings.incident_cache_max_entries,
+                               settings.incident_cache_ttl)
+
+
+def incident_from_row(row: Record) -> Incident:
+    return Incident(
+        id=row.incident_id,
+        enodeb_id=row.enodeb_id,
+        cell_id=row.cell_id,
+        start_time=row.start_ts,
+        end_time=row.end_ts,
+        status=row.status,
+        description=row.description,
+        kpi_missed=[MissedKPI(kpi=missed_kpi['kpi'], value=missed_kpi['value'])
+                    for missed_kpi in row.kpi_missed])
+
+
+def incident_window(incident: Incident) -> tuple[datetime, datetime]:
+    """
+    Start and end of the incident; an ongoing incident ends now.
+    """
+    return incident.start_time, incident.end_time or datetime.now(UTC)
+
+
+async def get_incidents_info(incident_ids: Iterable[str]) -> dict[
+    str, Incident]:
+    """
+    The incidents with the given ids, by id. The ids which aren't cached are
+    fetched with a single query; the ids which don't exist are left out.
+    """
+    incidents: dict[str, Incident] = {}
+    missing: list[str] = []
+    for incident_id in dict.fromkeys(incident_ids):
+        incident = incident_cache.get(incident_id)
+        if incident is None:
+            missing.append(incident_id)
+        else:
+            incidents[incident_id] = incident
+
+    if missing:
+        logger.debug("%d incidents cached, fetching %d", len(incidents),
+                     len(missing))
+        for row in await storage.get_incidents(missing):
+            incident = incident_from_row(row)
+            incident_cache.put(incident)
+            incidents[incident.id] = incident
+    return incidents
@@ -0,0 +1,268 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Prior incident search over an in-process index of the incidents' embeddings.
+
+The index is loaded from the incidents table on first use. After that, only
+the embeddings written since the previous sync are read, at most every
+similarity_search_index_sync_interval. The incidents analyzed by this process
+are added to the index as soon as they are updated.
+
+A quantized index (similarity_search_index_quantization) only finds the
+candidates. They are read with their full embeddings and re-ranked exactly,
+so the result has the same distances as the search of the full embeddings.
+
+The search can be restricted to the incidents similar to the current one in
+their KPIs, status, eNodeB and start, see incident_filter_for. The incidents
+which match are looked up in an inverted index of these attributes, and only
+their embeddings are compared. The attributes are indexed when the embeddings
+are, so the matches are checked again against the incidents as they are now.
+The status changes later and is only checked then: more of the closest
+incidents are read until top_k of them match.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, UTC
+from typing import Optional
+
+from root_cause_analysis.models import Incident
+from root_cause_analysis.settings import settings
+from root_cause_analysis.tools.embeddings import embeddings_model_version
+from root_cause_analysis.tools.storage import storage
+from telco_common.storage.backend import Record, StorageBackend
+from telco_common.storage.incident_filter import IncidentAttributeIndex, \
+    IncidentAttributes, IncidentFilter, incident_attributes
+from telco_common.vector_index import VectorIndex, Quantization, rerank
+
+logger = logging.getLogger(__name__)
+
+
+class PriorIncidentIndex:
+    """
+    The embeddings of the model and the incidents' attributes, by incident
+    id. The details of the matching incidents are looked up after the search.
+    """
+
+    def __init__(self, backend: StorageBackend, model: str,
+        sync_interval: timedelta, sync_overlap: timedelta,
+        dimensions: Optional[int] = None, quantization: Quantization = 'none',
+        rerank_candidates: int = 50):
+        self._backend = backend
+        self._model = model
+        self._rerank_candidates = rerank_candidates
+        self._sync_interval_seconds = sync_interval.total_seconds()
+        # The embeddings are written with the time of the write, but become
+        # visible when the write commits. The syncs overlap by that much.
+        self._sync_overlap = sync_overlap
+        self._index = VectorIndex(dimensions, quantization)
+        self._attributes = IncidentAttributeIndex()
+        self._synced_through: Optional[datetime] = None
+        self._next_sync = 0.
+        self._sync_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _sync_due(self) -> bool:
+        return time.monotonic() >= self._next_sync
+
+    async def sync(self, force: bool = False) -> None:
+        """
+        Adds the embeddings written since the previous sync, or all of them
+        the first time.
+        """
+        # Held across the await, so that concurrent searches wait for the
+        # running sync instead of starting their own.
+        await asyncio.to_thread(self._sync_lock.acquire)
+        try:
+            if not force and not self._sync_due():
+                return
+            started = datetime.now(UTC)
+            since = None if self._synced_through is None else (
+                self._synced_through - self._sync_overlap)
+            embeddings = await self._backend.get_incident_embeddings(
+                self._model, since, self._index.dimensions)
+            self._index.upsert(list(embeddings.incident_ids),
+                               embeddings.vectors)
+            self._attributes.upsert(list(embeddings.incident_ids),
+                                    embeddings.attributes)
+            if embeddings.skipped:
+                logger.warning(
+                    "%d incident embeddings of %s have another number of "
+                    "dimensions than %s and are not searched",
+                    embeddings.skipped, self._model, self._index.dimensions)
+            logger.info("Prior incident index synced: %d embeddings read, "
+                        "%d indexed", len(embeddings), len(self._index))
+            self._synced_through = started
+            self._next_sync = time.monotonic() + self._sync_interval_seconds
+        finally:
+            self._sync_lock.release()
+
+    def upsert(self, incident_id: str, embeddings: list[float],
+        attributes: IncidentAttributes) -> None:
+        try:
+            self._index.upsert([incident_id], [embeddings])
+            self._attributes.upsert([incident_id], [attributes])
+        except ValueError as ex:
+            logger.error("Failed to index the embeddings of incident %s: %s",
+                         incident_id, str(ex))
+
+    def remove(self, incident_ids: list[str]) -> None:
+        self._index.remove(incident_ids)
+        self._attributes.remove(incident_ids)
+
+    async def _details(self, incident_ids: list[str],
+        with_embeddings: bool = False) -> dict[str, Record]:
+        """
+        The current rows of the incidents, as copies - the storage may cache
+        its rows. The incidents deleted or embedded by another model since
+        they were indexed are removed from the index.
+        """
+        rows: dict[str, Record] = {}
+        for row in await self._backend.get_incident_details(
+            incident_ids, with_embeddings=with_embeddings):
+            row = Record(row.items())
+            if row.pop('events_embeddings_model') in (self._model, None):
+                rows[row.incident_id] = row
+        stale = [incident_id for incident_id in incident_ids
+                 if incident_id not in rows]
+        if stale:
+            logger.info("Removing %d deleted or re-embedded incidents from "
+                        "the prior incident index", len(stale))
+            self.remove(stale)
+        return rows
+
+    async def _closest(self, embeddings: list[float], count: int,
+        max_distance: float, incident_ids: Optional[set[str]],
+        incident_filter: Optional[IncidentFilter]) -> tuple[
+        bool, list[Record]]:
+        """
+        The current rows of at least the `count` closest incidents in the
+        index which still match the filter, and whether the index has no
+        more incidents within max_distance.
+        """
+        if self._index.quantization == 'none':
+            matches = self._index.search(embeddings, count, max_distance,
+                                         incident_ids)
+            exhausted = len(matches) < count
+            if not matches:
+                return exhausted, []
+            rows = await self._details(
+                [incident_id for incident_id, _ in matches])
+        else:
+            read = max(count, self._rerank_candidates)
+            candidates = self._index.candidates(embeddings, read,
+                                                incident_ids)
+            if not candidates:
+                return True, []
+            rows = await self._details(candidates, with_embeddings=True)
+            matches = rerank(embeddings, list(rows),
+                             [row.pop('events_embeddings') or [] for row in
+                              rows.values()], len(rows), max_distance)
+            # All the candidates read count, including the ones which no
+            # longer match the filter.
+            exhausted = len(candidates) < read or len(matches) < len(rows)
+        result = []
+        for incident_id, distance in matches:
+            row = rows.get(incident_id)
+            # Deleted, re-embedded or no longer matching the filter.
+            if row is None or (incident_filter is not None and
+                               not incident_filter.matches(
+                                   incident_attributes(row))):
+                continue
+            row['distance'] = distance
+            result.append(row)
+        return exhausted, result
+
+    async def search(self, embeddings: list[float], top_k: int,
+        max_distance: float,
+        incident_filter: Optional[IncidentFilter] = None) -> list[Record]:
+        """
+        Same as StorageBackend.find_similar_incidents.
+        """
+        if self._sync_due():
+            await self.sync()
+        incident_ids = None
+        if incident_filter is not None:
+            incident_ids = self._attributes.matching(incident_filter)
+            logger.debug("%d of %d incidents match %s", len(incident_ids),
+                         len(self._attributes), incident_filter)
+            if not incident_ids:
+                return []
+        count = top_k
+        while True:
+            exhausted, result = await self._closest(
+                embeddings, count, max_distance, incident_ids,
+                incident_filter)
+            if len(result) >= top_k or exhausted:
+                return result[:top_k]
+            count *= 4
+
+
+prior_incident_index = PriorIncidentIndex(
+    storage, embeddings_model_version,
+    settings.similarity_search_index_sync_interval,
+    settings.similarity_search_index_sync_overlap,
+    settings.embeddings_dimensions,
+    settings.similarity_search_index_quantization,
+    settings.similarity_search_index_rerank_candidates)
+
+
+def enodeb_neighbourhood(enodeb_id: str) -> frozenset[str]:
+    """
+    The eNodeB and its neighbours, listed either way round in
+    enodeb_neighbours.
+    """
+    neighbourhood = {enodeb_id, *settings.enodeb_neighbours.get(enodeb_id, [])}
+    for other_enodeb_id, neighbours in settings.enodeb_neighbours.items():
+        if enodeb_id in neighbours:
+            neighbourhood.add(other_enodeb_id)
+    return frozenset(neighbourhood)
+
+
+def incident_filter_for(incident: Incident) -> Optional[IncidentFilter]:
+    """
+    The prior incidents to compare the incident with, by the
+    similarity_search_filter_* settings. None compares it with all of them.
+    """
+    kpis = statuses = enodeb_ids = started_after = None
+    if settings.similarity_search_filter_kpis:
+        kpis = frozenset(missed_kpi.kpi for missed_kpi in incident.kpi_missed)
+    if settings.similarity_search_filter_statuses is not None:
+        statuses = frozenset(settings.similarity_search_filter_statuses)
+    if settings.similarity_search_filter_neighbourhood and incident.enodeb_id:
+        enodeb_ids = enodeb_neighbourhood(incident.enodeb_id)
+    if settings.similarity_search_filter_recency_window:
+        started_after = (incident.start_time -
+                         settings.similarity_search_filter_recency_window)
+    incident_filter = IncidentFilter(kpis, statuses, enodeb_ids,
+                                     started_after)
+    return None if incident_filter == IncidentFilter() else incident_filter
+
+
+async def find_prior_incidents(embeddings: list[float], top_k: int,
+    max_distance: float,
+    incident_filter: Optional[IncidentFilter] = None) -> list[Record]:
+    """
+    Incidents closest to the embeddings among the ones which match the
+    filter, from the index or, if similarity_search_index is off, searched
+    by the storage.
+    """
+    if settings.similarity_search_index:
+        return await prior_incident_index.search(embeddings, top_k,
+                                                 max_distance, incident_filter)
+    return await storage.find_similar_incidents(embeddings, top_k,
+                                                max_distance, incident_filter)
@@ -0,0 +1,45 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Storage backend of the root cause analysis agent, selected by the
+storage_backend setting.
+"""
+from root_cause_analysis.settings import settings
+from root_cause_analysis.tools.bigquery_util import query_runner, \
+    incidents_table, cell_traces_table, cell_trace_outcomes_table, \
+    incident_embeddings_staging_table, performance_kpi_tiers, load_rows
+from telco_common.lazy import Lazy
+from telco_common.storage.backend import StorageBackend
+from telco_common.storage.bigquery_backend import BigQueryStorage, \
+    BigQueryTables
+from telco_common.storage.sqlite_backend import SQLiteStorage
+
+
+def _create_storage() -> StorageBackend:
+    if settings.storage_backend == 'sqlite':
+        return SQLiteStorage(settings.sqlite_database,
+                             settings.sqlite_performance_csv,
+                             settings.sqlite_cell_traces_csv,
+                             settings.sqlite_incidents_jsonl,
+                             settings.sqlite_schema_directory)
+    return BigQueryStorage(query_runner, BigQueryTables(
+        incidents=incidents_table,
+        cell_traces=cell_traces_table,
+        cell_trace_outcomes=cell_trace_outcomes_table,
+        incident_embeddings_staging=incident_embeddings_staging_table,
+        kpi_tiers=performance_kpi_tiers), load_rows)
+
+
+# The SQLite backend loads its data when it is created.
+storage: Lazy[StorageBackend] = Lazy(_create_storage, 'storage')
@@ -0,0 +1,211 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Awaitable BigQuery queries.
+
+The BigQuery client is synchronous. Calling it from an async tool blocks the
+event loop, and with it every other session served by the process, for the
+whole duration of the query. AsyncQueryRunner runs the queries on a bounded
+pool of threads instead.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, datetime, UTC
+from typing import Any, Callable, Iterable, Optional
+
+import pyarrow as pa
+from google.cloud.bigquery.query import ScalarQueryParameter, \
+    ArrayQueryParameter
+from google.cloud.bigquery.table import RowIterator
+
+from telco_common.query_budget import QueryBudget, DryRunEstimate, \
+    QueryBudgetExceeded, is_bytes_billed_limit_exceeded
+from telco_common.query_cache import QueryResultCache, cache_key
+from telco_common.query_metrics import QueryMetricsRecorder, QueryMetrics, \
+    current_query_tags, add_result_statistics, add_job_statistics
+
+logger = logging.getLogger(__name__)
+
+QueryParameters = list[ScalarQueryParameter | ArrayQueryParameter]
+
+# Runs a query synchronously, limited to the given time and, optionally, to
+# the given number of bytes billed.
+QueryFunction = Callable[
+    [str, Optional[QueryParameters], timedelta, Optional[int]], RowIterator]
+
+# Estimates the bytes the query would scan, without running it.
+DryRunFunction = Callable[[str, Optional[QueryParameters]], DryRunEstimate]
+
+# Extra time given to the client to report a timed out job, before the caller
+# stops waiting for it.
+_TIMEOUT_GRACE_SECONDS = 5
+
+
+class AsyncQueryRunner:
+    """
+    Runs at most `max_concurrency` queries at a time. The other queries wait
+    for a free thread, and the time they wait counts towards their timeout.
+
+    The timeout is enforced by BigQuery (the job timeout) and by the caller,
+    which stops waiting a few seconds later. A cancelled call which hasn't
+    started yet is dropped; a running one finishes within its job timeout,
+    but nobody waits for it.
+
+    With a cache, the results of the calls which ask for it are reused until
+    they expire or one of their tags is invalidated.
+
+    Large results are better fetched with execute_arrow(), as columns rather
+    than as a Row object per row.
+
+    With a metrics recorder, every call is recorded with the tags of the
+    tool invocation which made it. The billed bytes and the BigQuery cache
+    hit are only reported by the job, which `get_job` looks up - an extra
+    API call per query.
+
+    With a budget, every query is limited to the bytes of the tool which
+    runs it. With a dry run as well, the query is estimated first, rejected
+    if the estimate is over the budget, and its pruning report is logged.
+    """
+
+    def __init__(self, run_query: QueryFunction, max_concurrency: int,
+        timeout: timedelta, cache: Optional[QueryResultCache] = None,
+        metrics: Optional[QueryMetricsRecorder] = None,
+        get_job: Optional[Callable[[RowIterator], Any]] = None,
+        budget: Optional[QueryBudget] = None,
+        dry_run: Optional[DryRunFunction] = None):
+        self._run_query = run_query
+        self._budget = budget
+        self._dry_run = dry_run
+        self._timeout = timeout
+        self.cache = cache
+        self.metrics = metrics
+        self._get_job = get_job
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix='bigquery')
+
+    def _execute(self, fetch: Callable[[RowIterator], Any], query: str,
+        query_parameters: Optional[QueryParameters], called: float,
+        deadline: float, metrics: QueryMetrics) -> Any:
+        started = time.monotonic()
+        metrics.queue_seconds = started - called
+        remaining = deadline - started
+        if remaining <= 0:
+            raise TimeoutError("Query timed out waiting to be started")
+        if self._dry_run is not None:
+            estimate = self._dry_run(query, query_parameters)
+            metrics.estimated_bytes = estimate.bytes_processed
+            logger.info("Pruning report of a query of %s: %s",
+                        metrics.tags.tool, estimate.pruning_report())
+            if self._budget is not None:
+                self._budget.check(metrics.tags.tool, estimate)
+        maximum_bytes_billed = self._budget.enforced_limit_for(
+            metrics.tags.tool) if self._budget is not None else None
+        try:
+            # The dry run counts towards the timeout.
+            result = self._run_query(
+                query, query_parameters,
+                timedelta(seconds=deadline - time.monotonic()),
+                maximum_bytes_billed)
+        except Exception as ex:
+            if maximum_bytes_billed is None or \
+                    not is_bytes_billed_limit_exceeded(ex):
+                raise
+            raise QueryBudgetExceeded(
+                metrics.tags.tool, metrics.estimated_bytes,
+                maximum_bytes_billed) from ex
+        # Paging through the result is blocking too - the rows are fetched
+        # on the worker thread, not on the event loop.
+        fetched = fetch(result)
+        add_result_statistics(metrics, result)
+        if self._get_job is not None and metrics.job_id:
+            try:
+                add_job_statistics(metrics, self._get_job(result))
+            except Exception as ex:
+                logger.warning("Failed to get the statistics of job %s: %s",
+                               metrics.job_id, str(ex))
+        return fetched
+
+    async def execute(self, query: str,
+        query_parameters: Optional[QueryParameters] = None,
+        timeout: Optional[timedelta] = None, cached: bool = False,
+        cache_tags: Iterable[str] = ()) -> list[Any]:
+        """
+        Never cache the queries which modify data.
+        """
+        if not cached or self.cache is None:
+            return await self._execute_async(list, query, query_parameters,
+                                             timeout)
+
+        key = cache_key(query, query_parameters)
+        rows = self.cache.get(key)
+        if rows is None:
+            rows = await self._execute_async(list, query, query_parameters,
+                                             timeout)
+            self.cache.put(key, rows, cache_tags)
+        elif self.metrics is not None:
+            self.metrics.record(QueryMetrics(
+                tags=current_query_tags(), started=datetime.now(UTC),
+                wall_seconds=0., queue_seconds=0., row_count=len(rows),
+                cache_hit=True))
+        return rows
+
+    async def execute_arrow(self, query: str,
+        query_parameters: Optional[QueryParameters] = None,
+        timeout: Optional[timedelta] = None) -> pa.Table:
+        """
+        The result as an Arrow table. Large results are downloaded in
+        parallel streams with the BigQuery Storage Read API. Never cached.
+        """
+        return await self._execute_async(
+            lambda result: result.to_arrow(create_bqstorage_client=True),
+            query, query_parameters, timeout)
+
+    def invalidate_cache(self, tags: Iterable[str]) -> None:
+        if self.cache is not None:
+            self.cache.invalidate(tags)
+
+    async def _execute_async(self, fetch: Callable[[RowIterator], Any],
+        query: str, query_parameters: Optional[QueryParameters],
+        timeout: Optional[timedelta]) -> Any:
+        timeout_seconds = (timeout or self._timeout).total_seconds()
+        called = time.monotonic()
+        deadline = called + timeout_seconds
+        # The tags are those of the calling task, the worker thread doesn't
+        # see them.
+        metrics = QueryMetrics(tags=current_query_tags(),
+                               started=datetime.now(UTC), wall_seconds=0.,
+                               queue_seconds=0., row_count=0)
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._execute, fetch, query, query_parameters,
+            called, deadline, metrics)
+        try:
+            result = await asyncio.wait_for(
+                future, timeout_seconds + _TIMEOUT_GRACE_SECONDS)
+            metrics.row_count = len(result)
+            return result
+        except Exception as ex:
+            if isinstance(ex, asyncio.TimeoutError):
+                logger.error("Query timed out after %s seconds",
+                             timeout_seconds)
+            metrics.error = type(ex).__name__
+            raise
+        finally:
+            metrics.wall_seconds = time.monotonic() - called
+            if self.metrics is not None:
+                self.metrics.record(metrics)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,248 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Cache of text embeddings, addressed by the content they embed.
+
+An entry is keyed by a hash of the model, the task type and the normalized
+text, so the same text is embedded once, whichever tool asks for it. The
+entries are kept in an in-memory LRU and, optionally, in a SQLite database
+which outlives the process. An embedding never changes for a given key, so
+the entries don't expire.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from telco_common.query_metrics import PrometheusTextFileWriter
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    The text with the Unicode normalized and without the whitespace at the
+    ends of the lines and of the text, which doesn't change its meaning.
+    """
+    text = unicodedata.normalize('NFC', text)
+    return '\n'.join(line.rstrip() for line in text.strip().splitlines())
+
+
+def embedding_key(model: str, task_type: str, text: str) -> str:
+    payload = json.dumps([model, task_type, normalize_text(text)])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# The embeddings are kept as 64-bit floats, exactly as the model returned
+# them.
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    task_type TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def _to_blob(embedding: list[float]) -> bytes:
+    return array('d', embedding).tobytes()
+
+
+def _from_blob(blob: bytes) -> list[float]:
+    embedding = array('d')
+    embedding.frombytes(blob)
+    return embedding.tolist()
+
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings in memory, in front of an optional SQLite
+    database. A database which can't be opened or written is logged and
+    skipped - the cache never fails an embedding.
+
+    The counters are written to the optional Prometheus text file in the
+    background, at most every few seconds.
+    """
+
+    _COUNTERS = [
+        ('lookups', 'Embedding cache lookups'),
+        ('memory_hits', 'Embeddings found in memory'),
+        ('disk_hits', 'Embeddings found in the database'),
+        ('misses', 'Embeddings computed'),
+        ('disk_errors', 'Failed reads and writes of the database'),
+    ]
+
+    def __init__(self, max_entries: int, database: Optional[str] = None,
+        prometheus_file: Optional[str] = None):
+        self._max_entries = max_entries
+        self._database = database
+        self._prometheus_writer = PrometheusTextFileWriter(
+            prometheus_file, self._prometheus_lines) \
+            if prometheus_file else None
+        self._entries: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Opened on first use.
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_failed = False
+        self._disk_lock = threading.Lock()
+        self.lookups = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_errors = 0
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        # Called with the disk lock held.
+        if self._connection is None and self._database and \
+                not self._connection_failed:
+            try:
+                connection = sqlite3.connect(self._database,
+                                             check_same_thread=False)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute(_CREATE_TABLE)
+                self._connection = connection
+            except sqlite3.Error as ex:
+                self._connection_failed = True
+                logger.error("Unable to open the embedding cache %s: %s",
+                             self._database, str(ex))
+        return self._connection
+
+    def _remember(self, key: str, embedding: list[float]) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[list[float]]:
+        with self._disk_lock:
+            connection = self._connect()
+            if connection is None:
+                return None
+            try:
+                row = connection.execute(
+                    'SELECT embedding FROM embeddings WHERE key = ?',
+                    (key,)).fetchone()
+            except sqlite3.Error as ex:
+                self.disk_errors += 1
+                logger.error("Failed to read the embedding cache: %s", str(ex))
+                return None
+        return _from_blob(row[0]) if row else None
+
+    def _write_disk(self, key: str, model: str, task_type: str,
+        embedding: list[float]) -> None:
+        with self._disk_lock:
+            connection = self._connect()
+            if connection is None:
+                return
+            try:
+                with connection:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)',
+                        (key, model, task_type, _to_blob(embedding),
+                         time.time()))
+            except sqlite3.Error as ex:
+                self.disk_errors += 1
+                logger.error("Failed to write the embedding cache: %s",
+                             str(ex))
+
+    def get(self, model: str, task_type: str, text: str) -> Optional[
+        list[float]]:
+        key = embedding_key(model, task_type, text)
+        with self._lock:
+            self.lookups += 1
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return list(embedding)
+
+        embedding = self._read_disk(key)
+        if embedding is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, embedding)
+            return list(embedding)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model: str, task_type: str, text: str,
+        embedding: list[float]) -> None:
+        key = embedding_key(model, task_type, text)
+        embedding = list(embedding)
+        self._remember(key, embedding)
+        self._write_disk(key, model, task_type, embedding)
+
+    def get_or_compute(self, model: str, task_type: str, text: str,
+        compute: Callable[[], Optional[list[float]]]) -> Optional[
+        list[float]]:
+        """
+        The cached embedding of the text, or the one computed by `compute`.
+        Failures (None) are not cached.
+        """
+        embedding = self.get(model, task_type, text)
+        if embedding is None:
+            embedding = compute()
+            if embedding is not None:
+                self.put(model, task_type, text, embedding)
+        self._report()
+        return embedding
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            return {
+                'entries': len(self._entries),
+                'lookups': self.lookups,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / self.lookups if self.lookups else None,
+                'disk_errors': self.disk_errors,
+            }
+
+    def _report(self) -> None:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Embedding cache: %s", json.dumps(self.stats()))
+        if self._prometheus_writer is not None:
+            self._prometheus_writer.changed()
+
+    def _prometheus_lines(self) -> list[str]:
+        stats = self.stats()
+        lines = []
+        for name, help_text in self._COUNTERS:
+            metric = f"telco_agent_embedding_cache_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}.")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {stats[name]}")
+        return lines
+
+    def clear(self) -> None:
+        """
+        Empties the memory tier. The database is kept.
+        """
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,220 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+KPIs checked by the incident detector and their thresholds.
+
+The detection query, the local engine, the KPI views of the embedded backend
+and the KPI rollups are all generated from this registry. BigQuery calculates
+the KPIs in the performance_kpi view and its rollups, created by terraform
+from bigquery-schema/kpi-expressions.json. To check a new KPI, add its
+definition to KPIS and regenerate that file, from the agents directory:
+
+    python -m telco_common.kpi_registry \
+        ../infrastructure/terraform/bigquery-schema/kpi-expressions.json
+
+With --check, the command fails if the file doesn't match the registry.
+"""
+import argparse
+import json
+import operator
+import re
+import sys
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Mapping, Optional
+
+import numpy as np
+
+Counters = Mapping[str, np.ndarray]
+
+QCI_RANGE = range(1, 10)
+
+ERAB_ATTEMPTS = tuple(f"ERAB_EstabInitAttNbr_QCI{qci}" for qci in QCI_RANGE)
+ERAB_SUCCESSES = tuple(f"ERAB_EstabInitSuccNbr_QCI{qci}" for qci in QCI_RANGE)
+ERAB_RELEASES = tuple(f"ERAB_RelActNbr_QCI{qci}" for qci in QCI_RANGE)
+SESSION_TIME = "ERAB_SessionTimeUE"
+
+_IDENTIFIER = re.compile(r"^[a-z][a-z0-9_]*$")
+
+
+class Comparator(Enum):
+    """
+    How the KPI value is compared with the threshold to detect a breach.
+    """
+    BELOW = ('<', operator.lt)
+    ABOVE = ('>', operator.gt)
+
+    def __init__(self, sql_operator: str,
+        evaluate: Callable[[np.ndarray, np.ndarray], np.ndarray]):
+        self.sql_operator = sql_operator
+        self.evaluate = evaluate
+
+
+def _sum_counters(counters: Counters, names: tuple[str, ...]) -> np.ndarray:
+    return np.sum([counters[name] for name in names], axis=0)
+
+
+def safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # Intervals without any attempts (or session time) have no KPI value.
+    # NaN never breaches a threshold, same as NULL in BigQuery.
+    result = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=result,
+              where=(denominator != 0) & ~np.isnan(denominator))
+    return result
+
+
+def _sql_sum(columns: tuple[str, ...]) -> str:
+    return '+'.join(columns)
+
+
+def _sql_string(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+@dataclass(frozen=True)
+class Ratio:
+    """
+    The sum of the numerator counters times the scale, divided by the sum of
+    the denominator counters. Both the SQL formula and the local calculation
+    are derived from it.
+    """
+    numerator: tuple[str, ...]
+    denominator: tuple[str, ...]
+    scale: float = 1.
+
+    def formula(self) -> str:
+        # The float scale keeps SQLite from dividing the integers without the
+        # fraction.
+        return (f"({_sql_sum(self.numerator)}) * {float(self.scale)!r} / "
+                f"({_sql_sum(self.denominator)})")
+
+    def compute(self, counters: Counters) -> np.ndarray:
+        return safe_divide(_sum_counters(counters, self.numerator) *
+                           float(self.scale),
+                           _sum_counters(counters, self.denominator))
+
+
+@dataclass(frozen=True)
+class KPIDefinition:
+    name: str
+    description: str
+    comparator: Comparator
+    threshold: float
+    # SQL expression over the columns of the performance_kpi view.
+    expression: str
+    # Calculated from the performance counters, as the `name` column of the
+    # performance_kpi view and the rollups, and locally.
+    calculation: Ratio
+    # Thresholds of individual cells, keyed by (enodeb_id, cell_id).
+    cell_thresholds: Mapping[tuple[str, str], float] = field(
+        default_factory=dict)
+
+    def __post_init__(self):
+        # The name is used to build column aliases in the detection query.
+        if not _IDENTIFIER.match(self.name):
+            raise ValueError(f"Invalid KPI name: {self.name}")
+
+    @property
+    def formula(self) -> str:
+        """
+        SQL expression over the performance counters. It gives the same
+        result in BigQuery and SQLite.
+        """
+        return self.calculation.formula()
+
+    @property
+    def counters(self) -> tuple[str, ...]:
+        """
+        Raw performance counters used to calculate the KPI.
+        """
+        return self.calculation.numerator + self.calculation.denominator
+
+    def compute(self, counters: Counters) -> np.ndarray:
+        return self.calculation.compute(counters)
+
+    def threshold_for(self, enodeb_id: str, cell_id: str) -> float:
+        return self.cell_thresholds.get((enodeb_id, cell_id), self.threshold)
+
+    def sql_threshold(self, enodeb_id_column: str, cell_id_column: str) -> str:
+        if not self.cell_thresholds:
+            return repr(float(self.threshold))
+        cases = '\n'.join(
+            f"WHEN {enodeb_id_column} = {_sql_string(enodeb_id)} AND "
+            f"{cell_id_column} = {_sql_string(cell_id)} THEN {float(threshold)!r}"
+            for (enodeb_id, cell_id), threshold in self.cell_thresholds.items())
+        return f"CASE\n{cases}\nELSE {float(self.threshold)!r} END"
+
+    def sql_breach_condition(self, enodeb_id_column: str,
+        cell_id_column: str) -> str:
+        return (f"({self.expression}) {self.comparator.sql_operator} "
+                f"{self.sql_threshold(enodeb_id_column, cell_id_column)}")
+
+
+KPIS: list[KPIDefinition] = [
+    KPIDefinition(
+        name='erab_success_rate',
+        description='ERAB success rate is below 97%',
+        comparator=Comparator.BELOW,
+        threshold=97,
+        expression='erab_success_rate',
+        calculation=Ratio(ERAB_SUCCESSES, ERAB_ATTEMPTS, scale=100)
+    ),
+    KPIDefinition(
+        name='retainability',
+        description='Retainability is above 3',
+        comparator=Comparator.ABOVE,
+        threshold=3,
+        expression='retainability',
+        # Releases per hour of session time.
+        calculation=Ratio(ERAB_RELEASES, (SESSION_TIME,), scale=3600)
+    ),
+]
+
+
+def counter_columns(kpis: list[KPIDefinition]) -> list[str]:
+    """
+    Distinct raw counters needed to calculate the KPIs, in definition order.
+    """
+    return list(dict.fromkeys(
+        counter for kpi in kpis for counter in kpi.counters))
+
+
+def kpi_formulas(kpis: list[KPIDefinition]) -> dict[str, str]:
+    """
+    The formula of every KPI by its name, in the kpi-expressions.json format.
+    """
+    return {kpi.name: kpi.formula for kpi in kpis}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Writes the KPI formulas of the registry to the file "
+                    "used by terraform, or checks that they match it.")
+    parser.add_argument('path')
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args(argv)
+
+    formulas = kpi_formulas(KPIS)
+    if args.check:
+        with open(args.path, mode='r', encoding='utf-8') as infile:
+            if json.load(infile) != formulas:
+                sys.exit(f"{args.path} doesn't match the KPI registry")
+        return
+    with open(args.path, mode='w', encoding='utf-8') as outfile:
+        json.dump(formulas, outfile, indent=2)
+        outfile.write('\n')
+
+
+if __name__ == '__main__':
+    main()
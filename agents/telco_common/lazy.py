@@ -0,0 +1,79 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Objects constructed on first use.
+
+Constructing the API clients and the storage at import slows down the start
+of the agents and fails without credentials even when they are not used. A
+Lazy stands in for such an object: it constructs it on the first attribute
+access, so the modules which use it don't change.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Seconds spent constructing every lazy object, by its name.
+_construction_times: dict[str, float] = {}
+
+
+def construction_times() -> dict[str, float]:
+    return dict(_construction_times)
+
+
+class Lazy(Generic[T]):
+    """
+    Constructs the object with the factory on first use, once, even if
+    several threads use it at the same time.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str):
+        self._factory = factory
+        self._name = name
+        self._lock = threading.Lock()
+        self._value: T
+        self._initialized = False
+
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
+    def get(self) -> T:
+        if self._initialized:
+            return self._value
+        with self._lock:
+            if not self._initialized:
+                start = time.perf_counter()
+                self._value = self._factory()
+                elapsed = time.perf_counter() - start
+                _construction_times[self._name] = elapsed
+                logger.info("Constructed %s in %.3f s", self._name, elapsed)
+                self._initialized = True
+        return self._value
+
+    def __getattr__(self, name: str):
+        # Only called for the attributes which the Lazy itself doesn't have.
+        # The private ones are not delegated, so that a Lazy which is not
+        # fully constructed (e.g. being copied) doesn't recurse.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        state = 'initialized' if self._initialized else 'not initialized'
+        return f"Lazy({self._name}, {state})"
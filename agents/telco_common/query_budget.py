@@ -0,0 +1,139 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Limits on the bytes scanned by the queries of every tool.
+
+A query over a partitioned table which doesn't filter on the partitioning
+column, e.g. because of a malformed time window, scans the whole table. The
+budget of the tool stops it: BigQuery fails the job if it would bill more
+than the budget, and an optional dry run rejects it before it even starts.
+The dry run also tells how much of every table the query reads.
+"""
+import functools
+import logging
+from dataclasses import dataclass, field
+from typing import Optional, Mapping, Literal, Any
+
+from google.cloud import bigquery
+from google.cloud.bigquery import QueryJobConfig
+
+logger = logging.getLogger(__name__)
+
+BudgetAction = Literal['reject', 'log']
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, tool: Optional[str], estimated_bytes: Optional[int],
+        budget_bytes: int):
+        scanned = f"would scan {estimated_bytes} bytes" \
+            if estimated_bytes is not None else "exceeded its budget"
+        super().__init__(f"Query of {tool or 'no tool'} {scanned}, "
+                         f"the budget is {budget_bytes} bytes")
+        self.tool = tool
+        self.estimated_bytes = estimated_bytes
+        self.budget_bytes = budget_bytes
+
+
+def is_bytes_billed_limit_exceeded(ex: Exception) -> bool:
+    """
+    Whether BigQuery failed the job because of its maximum bytes billed.
+    """
+    return any(error.get('reason') == 'bytesBilledLimitExceeded'
+               for error in getattr(ex, 'errors', None) or []
+               if isinstance(error, dict))
+
+
+@dataclass(frozen=True)
+class TableStats:
+    table_id: str
+    num_bytes: Optional[int]
+    partitioning_column: Optional[str]
+    clustering_columns: list[str]
+
+
+@dataclass(frozen=True)
+class DryRunEstimate:
+    bytes_processed: int
+    tables: list[TableStats] = field(default_factory=list)
+
+    def pruning_report(self) -> str:
+        """
+        Share of the referenced tables the query reads. The estimate doesn't
+        account for clustering, which can only reduce the bytes further.
+        """
+        table_bytes = sum(table.num_bytes or 0 for table in self.tables)
+        tables = '; '.join(
+            f"{table.table_id} ({table.num_bytes} bytes, partitioned by "
+            f"{table.partitioning_column or 'nothing'}, clustered by "
+            f"{', '.join(table.clustering_columns) or 'nothing'})"
+            for table in self.tables)
+        share = f"{self.bytes_processed / table_bytes:.1%}" \
+            if table_bytes else "n/a"
+        return (f"estimated {self.bytes_processed} bytes, {share} of "
+                f"the referenced tables: {tables}")
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    default_bytes: Optional[int] = None
+    tool_bytes: Mapping[str, int] = field(default_factory=dict)
+    # "log" only reports the queries over the budget.
+    action: BudgetAction = 'reject'
+
+    def limit_for(self, tool: Optional[str]) -> Optional[int]:
+        if tool and tool in self.tool_bytes:
+            return self.tool_bytes[tool]
+        return self.default_bytes
+
+    def enforced_limit_for(self, tool: Optional[str]) -> Optional[int]:
+        return self.limit_for(tool) if self.action == 'reject' else None
+
+    def check(self, tool: Optional[str], estimate: DryRunEstimate) -> None:
+        limit = self.limit_for(tool)
+        if limit is None or estimate.bytes_processed <= limit:
+            return
+        exceeded = QueryBudgetExceeded(tool, estimate.bytes_processed, limit)
+        if self.action == 'reject':
+            raise exceeded
+        logger.warning("%s", exceeded)
+
+
+@functools.lru_cache(maxsize=256)
+def _table_stats(client: bigquery.Client, table_id: str) -> TableStats:
+    # Only used for the report, the size of a table may be stale.
+    table = client.get_table(table_id)
+    return TableStats(
+        table_id=table_id,
+        num_bytes=table.num_bytes,
+        partitioning_column=table.time_partitioning.field
+        if table.time_partitioning else None,
+        clustering_columns=list(table.clustering_fields or []))
+
+
+def dry_run(client: bigquery.Client, project: str, location: str,
+    query: str, query_parameters: Optional[list[Any]] = None) -> DryRunEstimate:
+    job = client.query(query, project=project, location=location,
+                       job_config=QueryJobConfig(
+                           dry_run=True, use_query_cache=False,
+                           query_parameters=query_parameters or []))
+    tables = []
+    for reference in job.referenced_tables:
+        table_id = f"{reference.project}.{reference.dataset_id}.{reference.table_id}"
+        try:
+            tables.append(_table_stats(client, table_id))
+        except Exception as ex:
+            logger.warning("Failed to get the size of %s: %s", table_id,
+                           str(ex))
+    return DryRunEstimate(bytes_processed=job.total_bytes_processed or 0,
+                          tables=tables)
@@ -0,0 +1,165 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+In-process cache of query results.
+
+Only the queries which ask for it are cached. Every entry can be tagged, e.g.
+with the incident it reads, and the writers invalidate the tags they affect.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Iterable, Optional
+
+from google.cloud.bigquery.query import ScalarQueryParameter, \
+    ArrayQueryParameter
+
+logger = logging.getLogger(__name__)
+
+# String literals and quoted identifiers are kept as they are, the whitespace
+# between them is collapsed.
+_QUOTED_OR_WHITESPACE = re.compile(
+    r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)|\s+""", re.DOTALL)
+
+
+def normalize_sql(query: str) -> str:
+    return _QUOTED_OR_WHITESPACE.sub(
+        lambda match: match.group(1) or ' ', query).strip()
+
+
+def cache_key(query: str, query_parameters: Optional[
+    list[ScalarQueryParameter | ArrayQueryParameter]] = None) -> str:
+    parameters = [parameter.to_api_repr() for parameter in
+                  query_parameters or []]
+    payload = json.dumps([normalize_sql(query), parameters], sort_keys=True,
+                         default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Tag of the cached queries which read more than a single incident.
+INCIDENTS_TAG = 'incidents'
+
+
+def incident_tag(incident_id: str) -> str:
+    return f"incident:{incident_id}"
+
+
+_COUNTERS = [
+    ('hits', 'Lookups served by the result cache'),
+    ('misses', 'Lookups which ran the query'),
+    ('evictions', 'Results evicted to make room for others'),
+    ('invalidations', 'Results invalidated by the writers'),
+]
+
+
+@dataclass
+class _Entry:
+    rows: list[Any]
+    expires_at: float
+    tags: frozenset[str] = field(default_factory=frozenset)
+
+
+class QueryResultCache:
+    """
+    LRU cache of query results, with a TTL for every entry.
+    """
+
+    def __init__(self, max_entries: int, ttl: timedelta):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl.total_seconds()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[list[Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry.rows)
+
+    def put(self, key: str, rows: list[Any],
+        tags: Iterable[str] = ()) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = _Entry(
+                rows=list(rows),
+                expires_at=time.monotonic() + self._ttl_seconds,
+                tags=frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """
+        Removes the entries with any of the tags.
+        """
+        tags = set(tags)
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if
+                    entry.tags & tags]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        logger.debug("Invalidated %d cached query results tagged %s",
+                     len(keys), tags)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def report(self) -> None:
+        logger.info("Query result cache: %s", json.dumps(self.stats()))
+
+    def prometheus_lines(self,
+        prefix: str = 'telco_agent_query_result_cache') -> list[str]:
+        stats = self.stats()
+        lines = [f"# HELP {prefix}_entries Cached query results.",
+                 f"# TYPE {prefix}_entries gauge",
+                 f"{prefix}_entries {stats['entries']}"]
+        for name, help_text in _COUNTERS:
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}.")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {stats[name]}")
+        return lines
@@ -0,0 +1,341 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Cost and latency of every query, tagged with the tool invocation which ran it.
+
+The tags (tool, session, incident) are set by QueryMetricsPlugin around every
+tool call and picked up by the query runner. The metrics go to one or more
+sinks: a structured log, an in-memory aggregate, or a Prometheus text file
+for the node exporter's textfile collector. The text file is written in the
+background, at most every few seconds, never by the query which changed it.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, OrderedDict
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Literal, Iterable
+
+logger = logging.getLogger(__name__)
+
+SinkType = Literal['log', 'memory', 'prometheus']
+
+
+@dataclass(frozen=True)
+class QueryTags:
+    tool: Optional[str] = None
+    session_id: Optional[str] = None
+    incident_id: Optional[str] = None
+
+
+_query_tags: contextvars.ContextVar[QueryTags] = contextvars.ContextVar(
+    'query_tags', default=QueryTags())
+
+
+def current_query_tags() -> QueryTags:
+    return _query_tags.get()
+
+
+def set_query_tags(tags: QueryTags) -> None:
+    """
+    Tags the queries run by the current task from now on.
+    """
+    _query_tags.set(tags)
+
+
+@dataclass(slots=True)
+class QueryMetrics:
+    tags: QueryTags
+    started: datetime
+    # From the call until the result is available, and the part of it spent
+    # waiting for a free thread.
+    wall_seconds: float
+    queue_seconds: float
+    row_count: int
+    # Served by the result cache, the query didn't run.
+    cache_hit: bool = False
+    job_id: Optional[str] = None
+    bytes_processed: Optional[int] = None
+    slot_ms: Optional[int] = None
+    # Only known with the job statistics, see AsyncQueryRunner.
+    bytes_billed: Optional[int] = None
+    bigquery_cache_hit: Optional[bool] = None
+    # Estimated by the dry run, see telco_common.query_budget.
+    estimated_bytes: Optional[int] = None
+    error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        result = asdict(self)
+        result['started'] = self.started.isoformat()
+        return result
+
+
+def add_result_statistics(metrics: QueryMetrics, result: Any) -> None:
+    """
+    Statistics reported with the result of query_and_wait().
+    """
+    metrics.job_id = getattr(result, 'job_id', None)
+    metrics.bytes_processed = getattr(result, 'total_bytes_processed', None)
+    metrics.slot_ms = getattr(result, 'slot_millis', None)
+
+
+def add_job_statistics(metrics: QueryMetrics, job: Any) -> None:
+    metrics.bytes_billed = job.total_bytes_billed
+    metrics.bigquery_cache_hit = job.cache_hit
+
+
+class MetricsSink(ABC):
+    @abstractmethod
+    def record(self, metrics: QueryMetrics) -> None:
+        pass
+
+
+class LogSink(MetricsSink):
+    """
+    A log entry per query, with the metrics as JSON.
+    """
+
+    def record(self, metrics: QueryMetrics) -> None:
+        logger.info("Query metrics: %s", json.dumps(metrics.as_dict()))
+
+
+@dataclass
+class QueryTotals:
+    queries: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    wall_seconds: float = 0.
+    max_wall_seconds: float = 0.
+    queue_seconds: float = 0.
+    rows: int = 0
+    bytes_processed: int = 0
+    bytes_billed: int = 0
+    slot_ms: int = 0
+
+    def add(self, metrics: QueryMetrics) -> None:
+        self.queries += 1
+        self.errors += 1 if metrics.error else 0
+        self.cache_hits += 1 if metrics.cache_hit else 0
+        self.wall_seconds += metrics.wall_seconds
+        self.max_wall_seconds = max(self.max_wall_seconds,
+                                    metrics.wall_seconds)
+        self.queue_seconds += metrics.queue_seconds
+        self.rows += metrics.row_count
+        self.bytes_processed += metrics.bytes_processed or 0
+        self.bytes_billed += metrics.bytes_billed or 0
+        self.slot_ms += metrics.slot_ms or 0
+
+
+class InMemoryAggregator(MetricsSink):
+    """
+    Totals by tag. The tools of a session or of an incident can be ranked by
+    their cost with summary(). Only the `max_tags` most recently used tags
+    are kept, the totals of the older sessions and incidents are dropped.
+    """
+
+    def __init__(self, max_tags: int = 10000):
+        self._max_tags = max_tags
+        self._totals: OrderedDict[QueryTags, QueryTotals] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, metrics: QueryMetrics) -> None:
+        with self._lock:
+            totals = self._totals.get(metrics.tags)
+            if totals is None:
+                totals = self._totals[metrics.tags] = QueryTotals()
+            else:
+                self._totals.move_to_end(metrics.tags)
+            totals.add(metrics)
+            while len(self._totals) > self._max_tags:
+                self._totals.popitem(last=False)
+
+    def summary(self, session_id: Optional[str] = None,
+        incident_id: Optional[str] = None) -> dict[str, QueryTotals]:
+        """
+        Totals by tool, of the given session and incident if any.
+        """
+        result: dict[str, QueryTotals] = defaultdict(QueryTotals)
+        with self._lock:
+            for tags, totals in self._totals.items():
+                if session_id is not None and tags.session_id != session_id:
+                    continue
+                if incident_id is not None and tags.incident_id != incident_id:
+                    continue
+                merged = result[tags.tool or '']
+                for name, value in asdict(totals).items():
+                    if name == 'max_wall_seconds':
+                        merged.max_wall_seconds = max(
+                            merged.max_wall_seconds, value)
+                    else:
+                        setattr(merged, name, getattr(merged, name) + value)
+        return dict(result)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+
+def _prometheus_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n',
+                                                                   '\\n')
+
+
+def write_prometheus_text_file(path: str, lines: list[str]) -> None:
+    # Replaced atomically, the collector never reads a partial file.
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(mode='w', dir=directory, delete=False,
+                                     encoding='utf-8') as outfile:
+        outfile.write('\n'.join(lines) + '\n')
+    os.replace(outfile.name, path)
+
+
+class PrometheusTextFileWriter:
+    """
+    Writes the lines returned by `render` to the file on a background
+    thread: after every call to changed(), but at most every `interval`, and
+    once more when the process exits. The callers never wait for the file.
+    """
+
+    def __init__(self, path: str, render: Callable[[], list[str]],
+        interval: timedelta = timedelta(seconds=10)):
+        self._path = path
+        self._render = render
+        self._interval_seconds = interval.total_seconds()
+        self._changed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def changed(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name='prometheus-text-file',
+                        daemon=True)
+                    self._thread.start()
+                    atexit.register(self._write_if_changed)
+        self._changed.set()
+
+    def flush(self) -> None:
+        write_prometheus_text_file(self._path, self._render())
+
+    def _write_if_changed(self) -> None:
+        if not self._changed.is_set():
+            return
+        self._changed.clear()
+        try:
+            self.flush()
+        except OSError as ex:
+            logger.error("Failed to write the metrics to %s: %s", self._path,
+                         str(ex))
+
+    def _run(self) -> None:
+        while True:
+            self._changed.wait()
+            self._write_if_changed()
+            time.sleep(self._interval_seconds)
+
+
+class PrometheusTextFileSink(MetricsSink):
+    """
+    Counters by tool, written to the file by a PrometheusTextFileWriter,
+    with the lines of `extra_lines`, e.g. the counters of the result cache.
+    Sessions and incidents are not labels - every one of them would be a new
+    time series.
+    """
+    _COUNTERS = [
+        ('queries', 'Queries run'),
+        ('errors', 'Queries which failed'),
+        ('cache_hits', 'Queries served by the result cache'),
+        ('wall_seconds', 'Time until the result was available'),
+        ('queue_seconds', 'Time spent waiting for a free thread'),
+        ('rows', 'Rows returned'),
+        ('bytes_processed', 'Bytes processed'),
+        ('bytes_billed', 'Bytes billed'),
+        ('slot_ms', 'Slot milliseconds'),
+    ]
+
+    def __init__(self, path: str, prefix: str = 'telco_agent_query',
+        interval: timedelta = timedelta(seconds=10),
+        extra_lines: Optional[Callable[[], list[str]]] = None):
+        self._prefix = prefix
+        self._extra_lines = extra_lines
+        self._totals: dict[str, QueryTotals] = defaultdict(QueryTotals)
+        self._lock = threading.Lock()
+        self.writer = PrometheusTextFileWriter(path, self._lines, interval)
+
+    def record(self, metrics: QueryMetrics) -> None:
+        with self._lock:
+            self._totals[metrics.tags.tool or ''].add(metrics)
+        self.writer.changed()
+
+    def _lines(self) -> list[str]:
+        lines = []
+        with self._lock:
+            for name, help_text in self._COUNTERS:
+                metric = f"{self._prefix}_{name}_total"
+                lines.append(f"# HELP {metric} {help_text}.")
+                lines.append(f"# TYPE {metric} counter")
+                for tool, totals in sorted(self._totals.items()):
+                    lines.append(
+                        f'{metric}{{tool="{_prometheus_label(tool)}"}} '
+                        f'{getattr(totals, name)}')
+        if self._extra_lines is not None:
+            lines += self._extra_lines()
+        return lines
+
+
+@dataclass
+class QueryMetricsRecorder:
+    sinks: list[MetricsSink] = field(default_factory=list)
+
+    def record(self, metrics: QueryMetrics) -> None:
+        for sink in self.sinks:
+            try:
+                sink.record(metrics)
+            except Exception as ex:
+                # Metrics must never fail the query.
+                logger.error("Failed to record query metrics in %s: %s",
+                             type(sink).__name__, str(ex))
+
+    def aggregator(self) -> Optional[InMemoryAggregator]:
+        return next((sink for sink in self.sinks if
+                     isinstance(sink, InMemoryAggregator)), None)
+
+
+def create_recorder(sink_types: Iterable[SinkType],
+    prometheus_file: Optional[str] = None,
+    prometheus_extra_lines: Optional[Callable[[], list[str]]] = None) -> \
+        QueryMetricsRecorder:
+    sinks: list[MetricsSink] = []
+    for sink_type in sink_types:
+        if sink_type == 'log':
+            sinks.append(LogSink())
+        elif sink_type == 'memory':
+            sinks.append(InMemoryAggregator())
+        elif sink_type == 'prometheus':
+            if not prometheus_file:
+                raise ValueError("The Prometheus sink needs a file")
+            sinks.append(PrometheusTextFileSink(
+                prometheus_file, extra_lines=prometheus_extra_lines))
+        else:
+            raise ValueError(f"Unknown metrics sink: {sink_type}")
+    return QueryMetricsRecorder(sinks)
@@ -0,0 +1,95 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import json
+import logging
+from typing import Optional, Any
+
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.tools import BaseTool, ToolContext
+
+from telco_common.query_cache import QueryResultCache
+from telco_common.query_metrics import QueryMetricsRecorder, QueryTags, \
+    set_query_tags
+
+logger = logging.getLogger(__name__)
+
+
+class QueryMetricsPlugin(BasePlugin):
+    """
+    Tags the queries run by every tool call with the tool, the session and
+    the incident. The incident is the incident_id argument of the tool or,
+    failing that, the id of the incident kept in the session state under
+    `incident_state_key` (as JSON).
+
+    With an in-memory aggregator, the cost of every tool is logged at the end
+    of every run, and so are the totals of the result cache, if any.
+    """
+
+    def __init__(self, recorder: QueryMetricsRecorder,
+        incident_state_key: Optional[str] = None,
+        cache: Optional[QueryResultCache] = None):
+        super().__init__(name='query_metrics')
+        self._recorder = recorder
+        self._incident_state_key = incident_state_key
+        self._cache = cache
+
+    def _incident_id(self, tool_args: dict[str, Any],
+        tool_context: ToolContext) -> Optional[str]:
+        if isinstance(tool_args.get('incident_id'), str):
+            return tool_args['incident_id']
+        if not self._incident_state_key:
+            return None
+        incident = tool_context.state.get(self._incident_state_key)
+        if not incident:
+            return None
+        try:
+            return json.loads(incident).get('id')
+        except (ValueError, AttributeError):
+            return None
+
+    async def before_tool_callback(self, *, tool: BaseTool,
+        tool_args: dict[str, Any], tool_context: ToolContext) -> Optional[
+        dict]:
+        set_query_tags(QueryTags(
+            tool=tool.name,
+            session_id=tool_context.session.id,
+            incident_id=self._incident_id(tool_args, tool_context)))
+        return None
+
+    async def after_tool_callback(self, *, tool: BaseTool,
+        tool_args: dict[str, Any], tool_context: ToolContext,
+        result: dict) -> Optional[dict]:
+        set_query_tags(QueryTags())
+        return None
+
+    async def on_tool_error_callback(self, *, tool: BaseTool,
+        tool_args: dict[str, Any], tool_context: ToolContext,
+        error: Exception) -> Optional[dict]:
+        set_query_tags(QueryTags())
+        return None
+
+    async def after_run_callback(self, *,
+        invocation_context: InvocationContext) -> None:
+        if self._cache is not None:
+            self._cache.report()
+        aggregator = self._recorder.aggregator()
+        if aggregator is None:
+            return
+        summary = aggregator.summary(
+            session_id=invocation_context.session.id)
+        for tool, totals in sorted(summary.items(),
+                                   key=lambda item: -item[1].slot_ms):
+            logger.info("Queries of %s in session %s: %s", tool or 'no tool',
+                        invocation_context.session.id, totals)
@@ -0,0 +1,172 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Picks the coarsest KPI table which can answer a query.
+
+The KPIs are available at three resolutions: the 15 minute performance_kpi
+view and the hourly and daily rollups, which keep the min/max/avg and the
+number of intervals of every KPI per cell. A month-long lookback at hourly
+precision reads 4x fewer rows from the hourly rollup, and at daily precision
+96x fewer from the daily one.
+
+The telco_common directory intentionally has no __init__.py - ADK lists every
+package in the agents directory as an agent.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Any, Callable, Awaitable, Iterable
+
+from telco_common.kpi_registry import KPIS
+from telco_common.query_budget import QueryBudgetExceeded
+from telco_common.storage.backend import QueryParameter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class KPITier:
+    table: str
+    resolution: timedelta
+    # Column with the start (rollups) or the end (raw intervals) of the period.
+    time_column: str
+    aggregated: bool
+    # Partitioning column of the rollups, the start of the day of the period.
+    partition_column: Optional[str] = None
+
+
+# KPIs of the performance_kpi view and its rollups.
+ROLLUP_KPIS = [kpi.name for kpi in KPIS]
+
+# A planned query returns at most this many periods per cell by default.
+DEFAULT_MAX_PERIODS = 200
+
+
+def kpi_tiers(performance_kpi_table: str, hourly_table: str,
+    daily_table: str) -> list[KPITier]:
+    return [
+        KPITier(table=performance_kpi_table,
+                resolution=timedelta(minutes=15),
+                time_column='measurement_end', aggregated=False),
+        KPITier(table=hourly_table, resolution=timedelta(hours=1),
+                time_column='period_start', aggregated=True,
+                partition_column='period_day'),
+        KPITier(table=daily_table, resolution=timedelta(days=1),
+                time_column='period_start', aggregated=True,
+                partition_column='period_day'),
+    ]
+
+
+def plan_tier(tiers: list[KPITier], start: datetime, end: datetime,
+    precision: Optional[timedelta] = None) -> KPITier:
+    """
+    The coarsest tier whose resolution is within the requested precision and
+    not longer than the window. Without an explicit precision, the window is
+    split into at most DEFAULT_MAX_PERIODS periods.
+    """
+    window = end - start
+    if window <= timedelta(0):
+        raise ValueError(f"Invalid window: {start} - {end}")
+    if precision is None:
+        precision = window / DEFAULT_MAX_PERIODS
+
+    candidates = [tier for tier in tiers if
+                  tier.resolution <= precision and tier.resolution <= window]
+    if not candidates:
+        # Nothing is precise enough - use the finest tier available.
+        return min(tiers, key=lambda tier: tier.resolution)
+    return max(candidates, key=lambda tier: tier.resolution)
+
+
+def kpi_history_query(tier: KPITier, kpis: list[str]) -> str:
+    """
+    KPI statistics of a cell per period of the tier. The query expects the
+    @enodeb_id, @cell_id, @start and @end parameters.
+    """
+    if tier.aggregated:
+        statistics = ',\n'.join(
+            f"    {kpi}_min, {kpi}_max, {kpi}_avg" for kpi in kpis)
+        intervals = 'intervals'
+    else:
+        statistics = ',\n'.join(
+            f"    {kpi} AS {kpi}_min, {kpi} AS {kpi}_max, {kpi} AS {kpi}_avg"
+            for kpi in kpis)
+        intervals = '1 AS intervals'
+
+    # Rollup periods are kept if they start within the window.
+    partition_filter = ''
+    if tier.partition_column:
+        partition_filter = (
+            f"\n    AND {tier.partition_column} >= TIMESTAMP_TRUNC(@start, DAY)"
+            f" AND {tier.partition_column} < @end")
+    return f"""
+SELECT
+    {tier.time_column} AS period,
+    {intervals},
+{statistics}
+FROM `{tier.table}`
+WHERE enodeb_id = @enodeb_id AND cell_id = @cell_id
+    AND {tier.time_column} >= @start AND {tier.time_column} < @end{partition_filter}
+ORDER BY period
+"""
+
+
+def _kpi_history_parameters(enodeb_id: str, cell_id: str, start: datetime,
+    end: datetime) -> list[QueryParameter]:
+    return [
+        QueryParameter("enodeb_id", "STRING", enodeb_id),
+        QueryParameter("cell_id", "STRING", cell_id),
+        QueryParameter("start", "TIMESTAMP", start),
+        QueryParameter("end", "TIMESTAMP", end),
+    ]
+
+
+def _kpi_history_row(row: Any, kpis: list[str]) -> dict:
+    result = {'period': row.period.isoformat(), 'intervals': row.intervals}
+    for kpi in kpis:
+        result[kpi] = {'min': row[f"{kpi}_min"], 'max': row[f"{kpi}_max"],
+                       'avg': row[f"{kpi}_avg"]}
+    return result
+
+
+async def fetch_kpi_history(
+    execute_query: Callable[[str, list[QueryParameter]],
+                            Awaitable[Iterable]],
+    tiers: list[KPITier], enodeb_id: str, cell_id: str, start: datetime,
+    end: datetime, precision: Optional[timedelta] = None,
+    kpis: Optional[list[str]] = None) -> dict:
+    """
+    KPI statistics of a cell over the window, read from the coarsest tier
+    which satisfies the precision. A query over the byte budget is downgraded
+    to the next coarser tier, with a lower precision than requested.
+    """
+    kpis = kpis or ROLLUP_KPIS
+    tier = plan_tier(tiers, start, end, precision)
+    coarser = sorted((candidate for candidate in tiers
+                      if candidate.resolution > tier.resolution),
+                     key=lambda candidate: candidate.resolution)
+    while True:
+        try:
+            rows = await execute_query(
+                kpi_history_query(tier, kpis),
+                _kpi_history_parameters(enodeb_id, cell_id, start, end))
+            break
+        except QueryBudgetExceeded as ex:
+            if not coarser:
+                raise
+            logger.warning("Reading the KPI history from %s instead: %s",
+                           coarser[0].table, str(ex))
+            tier = coarser.pop(0)
+    return {'resolution': str(tier.resolution),
+            'periods': [_kpi_history_row(row, kpis) for row in rows]}
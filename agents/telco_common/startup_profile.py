@@ -0,0 +1,160 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Startup profile of an agent: the time spent importing every module and
+constructing every lazily created client.
+
+From the agents directory:
+
+    python -m telco_common.startup_profile root_cause_analysis --warm-up \
+        --budget 5 --output startup-profile.json
+
+The agent is imported in a fresh process, with Python's -X importtime. With
+--warm-up, the agent's warm_up() constructs the agent, the storage and the
+clients too. The command fails when the startup takes longer than --budget
+seconds, so that it can guard the startup time in a build.
+"""
+import argparse
+import json
+import logging
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_RESULT_PREFIX = 'startup-profile: '
+
+_PROFILED_STARTUP = """
+import importlib, json, time
+start = time.perf_counter()
+module = importlib.import_module({agent!r} + '.agent')
+imported = time.perf_counter()
+if {warm_up!r}:
+    module.warm_up()
+warmed_up = time.perf_counter()
+from telco_common.lazy import construction_times
+print({prefix!r} + json.dumps({{
+    'import_seconds': imported - start,
+    'warm_up_seconds': warmed_up - imported,
+    'constructors': construction_times(),
+}}))
+"""
+
+
+def parse_import_times(lines: list[str]) -> list[dict]:
+    """
+    The modules reported by -X importtime, in the order they finished
+    importing, with their own and cumulative import time in seconds.
+    """
+    modules = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|', 2)
+        if not own.strip().isdigit():
+            # The header.
+            continue
+        modules.append({
+            'module': name.strip(),
+            'self_seconds': int(own) / 1e6,
+            'cumulative_seconds': int(cumulative) / 1e6,
+        })
+    return modules
+
+
+def package_of(module: str) -> str:
+    """
+    The distribution a module most likely belongs to: its top level package,
+    or the first two or three levels of the google namespace packages.
+    """
+    parts = module.split('.')
+    if parts[:2] == ['google', 'cloud']:
+        return '.'.join(parts[:3])
+    if parts[0] == 'google':
+        return '.'.join(parts[:2])
+    return parts[0]
+
+
+def profile_startup(agent: str, warm_up: bool) -> dict:
+    code = _PROFILED_STARTUP.format(agent=agent, warm_up=warm_up,
+                                    prefix=_RESULT_PREFIX)
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=False)
+    results = [line[len(_RESULT_PREFIX):] for line in
+               completed.stdout.splitlines() if
+               line.startswith(_RESULT_PREFIX)]
+    if completed.returncode != 0 or not results:
+        errors = '\n'.join(line for line in completed.stderr.splitlines() if
+                           not line.startswith('import time:'))
+        raise RuntimeError(f"Starting {agent} failed:\n{errors}")
+
+    profile = json.loads(results[-1])
+    modules = parse_import_times(completed.stderr.splitlines())
+    packages = defaultdict(float)
+    for module in modules:
+        packages[package_of(module['module'])] += module['self_seconds']
+    profile.update(
+        agent=agent,
+        startup_seconds=profile['import_seconds'] + profile[
+            'warm_up_seconds'],
+        packages=dict(sorted(packages.items(), key=lambda item: -item[1])),
+        modules=modules)
+    return profile
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('agent',
+                        choices=['incident_detector', 'root_cause_analysis'])
+    parser.add_argument('--warm-up', action='store_true',
+                        help="construct the agent, the storage and the "
+                             "clients after the import")
+    parser.add_argument('--budget', type=float,
+                        help="maximum startup time in seconds")
+    parser.add_argument('--top', type=int, default=15,
+                        help="number of the slowest modules and packages "
+                             "to print")
+    parser.add_argument('--output', help="JSON file with the full profile")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    profile = profile_startup(args.agent, args.warm_up)
+    if args.output:
+        with open(args.output, mode='w', encoding='utf-8') as outfile:
+            json.dump(profile, outfile, indent=2)
+
+    print(f"{args.agent}: import {profile['import_seconds']:.3f} s, "
+          f"warm-up {profile['warm_up_seconds']:.3f} s")
+    for name, seconds in profile['constructors'].items():
+        print(f"  constructor {name:<40} {seconds:8.3f} s")
+    for name, seconds in list(profile['packages'].items())[:args.top]:
+        print(f"  package     {name:<40} {seconds:8.3f} s")
+    slowest = sorted(profile['modules'], key=lambda module: -module[
+        'self_seconds'])[:args.top]
+    for module in slowest:
+        print(f"  module      {module['module']:<40} "
+              f"{module['self_seconds']:8.3f} s "
+              f"(cumulative {module['cumulative_seconds']:.3f} s)")
+
+    if args.budget is not None and profile['startup_seconds'] > args.budget:
+        logger.error("Startup of %s took %.3f s, over the budget of %.3f s",
+                     args.agent, profile['startup_seconds'], args.budget)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Storage operations performed by the agents.
+
+The backends speak in table rows: the rows passed in and returned have the
+columns of the BigQuery tables (see infrastructure/terraform/bigquery-schema),
+with timestamps as timezone-aware datetimes. The breach scan, which can
+return millions of breaches, returns arrays instead.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, NamedTuple, Optional, Sequence
+
+from telco_common.storage.breaches import KPIBreaches
+from telco_common.storage.detection_query import KPI
+from telco_common.storage.embeddings import IncidentEmbeddings
+from telco_common.storage.incident_filter import IncidentFilter
+
+
+class Record(dict):
+    """
+    Row with access by column name both as a key and as an attribute, like a
+    BigQuery Row.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError as ex:
+            raise AttributeError(name) from ex
+
+
+class QueryParameter(NamedTuple):
+    """
+    Named scalar parameter of the queries shared by the backends, with its
+    BigQuery type. Only the BigQuery backend converts it to the client's
+    query parameter; the embedded one passes the value to SQLite.
+    """
+    name: str
+    type: str
+    value: Any
+
+
+def check_window(start: datetime, end: datetime) -> None:
+    """
+    Rejects the windows which would not limit a scan of the time partitioned
+    tables: missing or naive bounds, or the end not after the start.
+    """
+    for bound in (start, end):
+        if not isinstance(bound, datetime) or bound.tzinfo is None:
+            raise ValueError(f"Invalid window bound: {bound!r}")
+    if end <= start:
+        raise ValueError(f"Invalid window: {start} - {end}")
+
+
+class StorageBackend(ABC):
+    # Incident detection
+
+    @abstractmethod
+    async def load_detection_checkpoints(self) -> list[Record]:
+        """
+        All the rows of the detection_checkpoints table.
+        """
+
+    @abstractmethod
+    async def save_detection_checkpoints(self,
+        checkpoints: list[dict]) -> None:
+        """
+        Inserts or replaces the checkpoints, by enodeb_id, cell_id and kpi.
+        """
+
+    @abstractmethod
+    async def scan_kpi_breaches(self, kpis: Sequence[KPI],
+        scan_from: datetime) -> KPIBreaches:
+        """
+        The latest measurement and the breaches of every KPI of every cell
+        after its checkpoint. See telco_common.storage.detection_query.
+        """
+
+    @abstractmethod
+    async def get_open_incident_end_times(self, ended_after: datetime) -> dict[
+        str, Optional[datetime]]:
+        """
+        End times of the incidents which are neither closed nor resolved, and
+        are ongoing or ended after `ended_after`.
+        """
+
+    @abstractmethod
+    async def save_incidents(self, incidents: list[dict]) -> None:
+        """
+        Inserts the new incidents. The existing ones get the new end_ts and
+        kpi_missed.
+        """
+
+    # Root cause analysis
+
+    @abstractmethod
+    async def get_incidents(self, incident_ids: Sequence[str]) -> list[
+        Record]:
+        """
+        The incidents with the given ids, in a single lookup. The ids which
+        don't exist are left out.
+        """
+
+    @abstractmethod
+    async def update_incident_analysis(self, incident_id: str, status: str,
+        preliminary_analysis: str, severity: str, events: str,
+        events_embeddings: list[float], events_embeddings_model: str) -> None:
+        pass
+
+    @abstractmethod
+    def stream_incidents_to_embed(self, model: str,
+        after_incident_id: Optional[str], page_size: int) -> AsyncIterator[
+        list[Record]]:
+        """
+        Pages of the incidents with events but without embeddings of the
+        model (missing, or computed by another model), in incident_id order
+        from after_incident_id on. Every row has the incident_id and the
+        events.
+        """
+
+    @abstractmethod
+    async def stage_incident_embeddings(self, embeddings: list[dict]) -> None:
+        """
+        Adds the embeddings (incident_id, events_embeddings,
+        events_embeddings_model) to the incidents in bulk, with the time they
+        are written as events_embeddings_ts. They may only be visible after
+        apply_staged_incident_embeddings. The staged embeddings are kept if
+        the process stops before they are applied.
+        """
+
+    @abstractmethod
+    async def apply_staged_incident_embeddings(self,
+        timeout: Optional[timedelta] = None) -> None:
+        """
+        Writes the staged embeddings to the incidents, within the timeout
+        (the backend's default if None).
+        """
+
+    @abstractmethod
+    async def get_cell_trace_outcomes(self, enodeb_id: str, cell_id: str,
+        start: datetime, end: datetime) -> list[Record]:
+        """
+        Number of the cell traces within the window, by the outcome of the
+        S1 signalling connection setup: connection_outcome and
+        number_of_outcomes.
+        """
+
+    @abstractmethod
+    async def find_similar_incidents(self, embeddings: list[float],
+        top_k: int, max_distance: float,
+        incident_filter: Optional[IncidentFilter] = None) -> list[Record]:
+        """
+        Incidents closest to the embeddings, by the Euclidean distance of their
+        events_embeddings, among the ones which match the filter. Every row
+        has the incident's columns and the distance.
+        """
+
+    @abstractmethod
+    async def get_incident_embeddings(self, model: str,
+        updated_since: Optional[datetime],
+        dimensions: Optional[int] = None) -> IncidentEmbeddings:
+        """
+        The embeddings of the model written at or after updated_since, by
+        events_embeddings_ts, or all of them if None. All of them include
+        the embeddings written before their model was recorded. The
+        incidents' attributes are those at the time of the query.
+        """
+
+    @abstractmethod
+    async def get_incident_details(self, incident_ids: Sequence[str],
+        with_embeddings: bool = False) -> list[Record]:
+        """
+        The incidents with the given ids, with all the columns of
+        find_similar_incidents except the distance, the
+        events_embeddings_model, and with_embeddings also the
+        events_embeddings.
+        """
+
+    @abstractmethod
+    async def get_kpi_history(self, enodeb_id: str, cell_id: str,
+        start: datetime, end: datetime,
+        precision: Optional[timedelta] = None) -> dict:
+        """
+        See telco_common.rollups.fetch_kpi_history.
+        """
+
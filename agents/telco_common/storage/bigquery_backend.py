@@ -0,0 +1,474 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, UTC
+from typing import Any, AsyncIterator, Callable, Optional, Sequence
+
+from google.cloud.bigquery import SchemaField
+from google.cloud.bigquery.query import ArrayQueryParameter, \
+    StructQueryParameter, ScalarQueryParameter
+
+from telco_common.async_query import AsyncQueryRunner
+from telco_common.query_cache import INCIDENTS_TAG, incident_tag
+from telco_common.rollups import KPITier, fetch_kpi_history
+from telco_common.storage.backend import StorageBackend, Record, \
+    QueryParameter, check_window
+from telco_common.storage.breaches import KPIBreaches
+from telco_common.storage.detection_query import KPI, build_detection_query
+from telco_common.storage.embeddings import IncidentEmbeddings
+from telco_common.storage.incident_filter import IncidentFilter
+from telco_common.storage.trace_outcomes import fetch_cell_trace_outcomes
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BigQueryTables:
+    """
+    Fully qualified names of the tables. An agent only needs the tables of
+    the operations it performs.
+    """
+    incidents: str
+    performance_kpi: Optional[str] = None
+    detection_checkpoints: Optional[str] = None
+    cell_traces: Optional[str] = None
+    # Without the rollup, the cell trace outcomes are counted from the traces.
+    cell_trace_outcomes: Optional[str] = None
+    # Embeddings loaded by the backfill, until they are merged into the
+    # incidents. Created by the first load and dropped after the merge.
+    incident_embeddings_staging: Optional[str] = None
+    kpi_tiers: list[KPITier] = field(default_factory=list)
+
+
+# Above this many, the updated embeddings are not looked up by incident_id.
+_MAX_UPDATED_INCIDENT_IDS = 10000
+
+
+def _incident_filter_conditions(
+    incident_filter: Optional[IncidentFilter]) -> tuple[list[str], list]:
+    """
+    Conditions on the columns of the incidents table, and their parameters.
+    """
+    conditions = []
+    parameters = []
+    if incident_filter is None:
+        return conditions, parameters
+    if incident_filter.kpis is not None:
+        conditions.append(
+            "EXISTS(SELECT 1 FROM UNNEST(kpi_missed) AS missed WHERE missed.kpi IN UNNEST(@filter_kpis))")
+        parameters.append(ArrayQueryParameter(
+            "filter_kpis", "STRING", sorted(incident_filter.kpis)))
+    if incident_filter.statuses is not None:
+        conditions.append("status IN UNNEST(@filter_statuses)")
+        parameters.append(ArrayQueryParameter(
+            "filter_statuses", "STRING", sorted(incident_filter.statuses)))
+    if incident_filter.enodeb_ids is not None:
+        conditions.append("enodeb_id IN UNNEST(@filter_enodeb_ids)")
+        parameters.append(ArrayQueryParameter(
+            "filter_enodeb_ids", "STRING",
+            sorted(incident_filter.enodeb_ids)))
+    if incident_filter.started_after is not None:
+        conditions.append("start_ts >= @filter_started_after")
+        parameters.append(ScalarQueryParameter(
+            "filter_started_after", "TIMESTAMP",
+            incident_filter.started_after))
+    return conditions, parameters
+
+
+# Appends the rows to the table with a load job, creating it if needed, and
+# waits for the job.
+LoadRowsFunction = Callable[[str, list[dict], list[SchemaField]], None]
+
+_INCIDENT_EMBEDDINGS_STAGING_SCHEMA = [
+    SchemaField('incident_id', 'STRING', mode='REQUIRED'),
+    SchemaField('events_embeddings', 'FLOAT64', mode='REPEATED'),
+    SchemaField('events_embeddings_model', 'STRING', mode='REQUIRED'),
+    SchemaField('staged_ts', 'TIMESTAMP', mode='REQUIRED'),
+]
+
+
+def _checkpoint_as_struct(checkpoint: dict) -> StructQueryParameter:
+    return StructQueryParameter(
+        None,
+        ScalarQueryParameter("enodeb_id", "STRING", checkpoint['enodeb_id']),
+        ScalarQueryParameter("cell_id", "STRING", checkpoint['cell_id']),
+        ScalarQueryParameter("kpi", "STRING", checkpoint['kpi']),
+        ScalarQueryParameter("watermark_ts", "TIMESTAMP",
+                             checkpoint['watermark_ts']),
+        ScalarQueryParameter("open_incident_id", "STRING",
+                             checkpoint['open_incident_id']),
+        ScalarQueryParameter("open_start_ts", "TIMESTAMP",
+                             checkpoint['open_start_ts']),
+        ScalarQueryParameter("open_end_ts", "TIMESTAMP",
+                             checkpoint['open_end_ts']),
+        ScalarQueryParameter("open_kpi_sum", "FLOAT64",
+                             checkpoint['open_kpi_sum']),
+        ScalarQueryParameter("open_kpi_count", "INT64",
+                             checkpoint['open_kpi_count']),
+    )
+
+
+def _missed_kpi_as_struct(missed_kpi: dict) -> StructQueryParameter:
+    return StructQueryParameter(
+        None,
+        ScalarQueryParameter("kpi", "STRING", missed_kpi['kpi']),
+        ScalarQueryParameter("value", "FLOAT64", missed_kpi['value']))
+
+
+def _incident_as_struct(incident: dict) -> StructQueryParameter:
+    return StructQueryParameter(
+        None,
+        ScalarQueryParameter("incident_id", "STRING", incident['incident_id']),
+        ScalarQueryParameter("enodeb_id", "STRING", incident['enodeb_id']),
+        ScalarQueryParameter("cell_id", "STRING", incident['cell_id']),
+        ScalarQueryParameter("start_ts", "TIMESTAMP", incident['start_ts']),
+        ScalarQueryParameter("end_ts", "TIMESTAMP", incident['end_ts']),
+        ScalarQueryParameter("status", "STRING", incident['status']),
+        ScalarQueryParameter("description", "STRING",
+                             incident['description']),
+        ArrayQueryParameter("kpi_missed", "STRUCT",
+                            [_missed_kpi_as_struct(missed_kpi) for missed_kpi
+                             in incident['kpi_missed']]),
+    )
+
+
+class BigQueryStorage(StorageBackend):
+    """
+    The storage backend of the deployed agents. Every query is parameterized
+    and runs on the query runner; the read-only RCA queries are cached.
+    """
+
+    def __init__(self, runner: AsyncQueryRunner, tables: BigQueryTables,
+        load_rows: Optional[LoadRowsFunction] = None):
+        self._runner = runner
+        self._tables = tables
+        self._load_rows = load_rows
+
+    async def _execute_cached(self, query: str,
+        query_parameters: list[QueryParameter]) -> list[Any]:
+        """
+        Runs a cached query built by the helpers shared with the embedded
+        backend.
+        """
+        return await self._runner.execute(query, [
+            ScalarQueryParameter(parameter.name, parameter.type,
+                                 parameter.value)
+            for parameter in query_parameters], cached=True)
+
+    async def load_detection_checkpoints(self) -> list[Record]:
+        return await self._runner.execute(f"""
+        SELECT enodeb_id, cell_id, kpi, watermark_ts,
+            open_incident_id, open_start_ts, open_end_ts, open_kpi_sum, open_kpi_count
+        FROM `{self._tables.detection_checkpoints}`
+        """)
+
+    async def save_detection_checkpoints(self,
+        checkpoints: list[dict]) -> None:
+        if not checkpoints:
+            return
+
+        query = f"""
+        MERGE `{self._tables.detection_checkpoints}` t
+        USING UNNEST(@checkpoints) s
+        ON t.enodeb_id = s.enodeb_id AND t.cell_id = s.cell_id AND t.kpi = s.kpi
+        WHEN MATCHED THEN UPDATE SET
+            watermark_ts = s.watermark_ts,
+            open_incident_id = s.open_incident_id,
+            open_start_ts = s.open_start_ts,
+            open_end_ts = s.open_end_ts,
+            open_kpi_sum = s.open_kpi_sum,
+            open_kpi_count = s.open_kpi_count,
+            updated_ts = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (
+            enodeb_id, cell_id, kpi, watermark_ts,
+            open_incident_id, open_start_ts, open_end_ts, open_kpi_sum, open_kpi_count,
+            updated_ts)
+        VALUES (
+            s.enodeb_id, s.cell_id, s.kpi, s.watermark_ts,
+            s.open_incident_id, s.open_start_ts, s.open_end_ts, s.open_kpi_sum, s.open_kpi_count,
+            CURRENT_TIMESTAMP())
+        """
+        await self._runner.execute(query, [ArrayQueryParameter(
+            "checkpoints", "STRUCT",
+            [_checkpoint_as_struct(checkpoint) for checkpoint in
+             checkpoints])])
+
+    async def scan_kpi_breaches(self, kpis: Sequence[KPI],
+        scan_from: datetime) -> KPIBreaches:
+        query = build_detection_query(self._tables.performance_kpi,
+                                      self._tables.detection_checkpoints, kpis)
+        logger.info("About to check for incidents since %s: %s", scan_from,
+                    query)
+        table = await self._runner.execute_arrow(query, [
+            ScalarQueryParameter("scan_from", "TIMESTAMP", scan_from)])
+        return KPIBreaches.from_arrow(table, kpis)
+
+    async def get_open_incident_end_times(self, ended_after: datetime) -> dict[
+        str, Optional[datetime]]:
+        rows = await self._runner.execute(f"""
+        SELECT incident_id, end_ts FROM `{self._tables.incidents}`
+        WHERE status NOT IN ('CLOSED', 'RESOLVED')
+            AND (end_ts IS NULL OR end_ts >= @ended_after)
+        """, [ScalarQueryParameter("ended_after", "TIMESTAMP", ended_after)])
+        return {row.incident_id: row.end_ts for row in rows}
+
+    async def save_incidents(self, incidents: list[dict]) -> None:
+        if not incidents:
+            return
+
+        query = f"""
+           MERGE `{self._tables.incidents}` t
+           USING UNNEST(@incidents) s
+           ON t.incident_id = s.incident_id
+           WHEN MATCHED THEN UPDATE SET
+                end_ts = s.end_ts,
+                kpi_missed = s.kpi_missed
+           WHEN NOT MATCHED THEN INSERT (
+            incident_id,
+            EnodeB_id,
+            cell_id,
+            start_ts,
+            end_ts,
+            status,
+            description,
+            kpi_missed
+            )
+            VALUES (
+                s.incident_id,
+                s.enodeb_id,
+                s.cell_id,
+                s.start_ts,
+                s.end_ts,
+                s.status,
+                s.description,
+                s.kpi_missed
+            )"""
+        await self._runner.execute(query, [ArrayQueryParameter(
+            "incidents", "STRUCT",
+            [_incident_as_struct(incident) for incident in incidents])])
+        self._runner.invalidate_cache(
+            [incident_tag(incident['incident_id']) for incident in
+             incidents] + [INCIDENTS_TAG])
+
+    async def get_incidents(self, incident_ids: Sequence[str]) -> list[
+        Record]:
+        if not incident_ids:
+            return []
+        # Not cached, the callers cache the incidents themselves.
+        query = f"""
+        SELECT incident_id, enodeb_id, cell_id, start_ts, end_ts, status, description, kpi_missed
+        FROM `{self._tables.incidents}` WHERE incident_id IN UNNEST(@incident_ids)
+        """
+        logger.info("About to look up %d incidents", len(incident_ids))
+        rows = await self._runner.execute(query, [
+            ArrayQueryParameter("incident_ids", "STRING", list(incident_ids))])
+        if len({row.incident_id for row in rows}) < len(rows):
+            raise ValueError(
+                f'Retrieved more than one row for an incident of {incident_ids}')
+        return rows
+
+    async def update_incident_analysis(self, incident_id: str, status: str,
+        preliminary_analysis: str, severity: str, events: str,
+        events_embeddings: list[float], events_embeddings_model: str) -> None:
+        query = f"""
+        UPDATE `{self._tables.incidents}` SET
+            status = @status,
+            preliminary_analysis = @preliminary_analysis,
+            severity = @severity,
+            events = @events,
+            events_embeddings = @events_embeddings,
+            events_embeddings_model = @events_embeddings_model,
+            events_embeddings_ts = CURRENT_TIMESTAMP()
+        WHERE incident_id = @incident_id
+        """
+        await self._runner.execute(query, [
+            ScalarQueryParameter("status", "STRING", status),
+            ScalarQueryParameter("preliminary_analysis", "STRING",
+                                 preliminary_analysis),
+            ScalarQueryParameter("severity", "STRING", severity),
+            ScalarQueryParameter("events", "STRING", events),
+            ArrayQueryParameter("events_embeddings", "FLOAT64",
+                                events_embeddings),
+            ScalarQueryParameter("events_embeddings_model", "STRING",
+                                 events_embeddings_model),
+            ScalarQueryParameter("incident_id", "STRING", incident_id),
+        ])
+        self._runner.invalidate_cache([incident_tag(incident_id),
+                                       INCIDENTS_TAG])
+
+    async def stream_incidents_to_embed(self, model: str,
+        after_incident_id: Optional[str], page_size: int) -> AsyncIterator[
+        list[Record]]:
+        # Every page is a query; the table is clustered on incident_id, so it
+        # only reads the blocks after the previous page.
+        query = f"""
+        SELECT incident_id, events FROM `{self._tables.incidents}`
+        WHERE incident_id > @after_incident_id
+            AND events IS NOT NULL AND events != ''
+            AND (events_embeddings_model IS NULL OR events_embeddings_model != @model)
+        ORDER BY incident_id
+        LIMIT {int(page_size)}
+        """
+        after_incident_id = after_incident_id or ''
+        while True:
+            rows = await self._runner.execute(query, [
+                ScalarQueryParameter("after_incident_id", "STRING",
+                                     after_incident_id),
+                ScalarQueryParameter("model", "STRING", model)])
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            after_incident_id = rows[-1].incident_id
+
+    async def stage_incident_embeddings(self, embeddings: list[dict]) -> None:
+        # A DML statement bills the whole incidents table and its parameters
+        # are limited to a few MB, so the embeddings are loaded into the
+        # staging table and merged once.
+        if not embeddings:
+            return
+        if self._load_rows is None or \
+                self._tables.incident_embeddings_staging is None:
+            raise ValueError("Staging the embeddings needs a staging table "
+                             "and a load function")
+        staged_ts = datetime.now(UTC).isoformat()
+        rows = [{
+            'incident_id': embedding['incident_id'],
+            'events_embeddings': list(embedding['events_embeddings']),
+            'events_embeddings_model': embedding['events_embeddings_model'],
+            'staged_ts': staged_ts,
+        } for embedding in embeddings]
+        await asyncio.to_thread(self._load_rows,
+                                self._tables.incident_embeddings_staging,
+                                rows, _INCIDENT_EMBEDDINGS_STAGING_SCHEMA)
+        logger.info("Staged the embeddings of %d incidents", len(rows))
+
+    async def apply_staged_incident_embeddings(self,
+        timeout: Optional[timedelta] = None) -> None:
+        staging_table = self._tables.incident_embeddings_staging
+        await self._runner.execute(f"""
+        MERGE `{self._tables.incidents}` t
+        USING (
+            SELECT incident_id, events_embeddings, events_embeddings_model
+            FROM `{staging_table}`
+            WHERE TRUE
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY incident_id ORDER BY staged_ts DESC) = 1
+        ) s
+        ON t.incident_id = s.incident_id
+        WHEN MATCHED THEN UPDATE SET
+            events_embeddings = s.events_embeddings,
+            events_embeddings_model = s.events_embeddings_model,
+            events_embeddings_ts = CURRENT_TIMESTAMP()
+        """, timeout=timeout)
+        await self._runner.execute(f"DROP TABLE `{staging_table}`")
+        self._runner.invalidate_cache([INCIDENTS_TAG])
+        logger.info("Merged the staged embeddings into %s",
+                    self._tables.incidents)
+
+    async def get_cell_trace_outcomes(self, enodeb_id: str, cell_id: str,
+        start: datetime, end: datetime) -> list[Record]:
+        check_window(start, end)
+        return await fetch_cell_trace_outcomes(
+            self._execute_cached,
+            self._tables.cell_traces, self._tables.cell_trace_outcomes,
+            enodeb_id, cell_id, start, end)
+
+    async def find_similar_incidents(self, embeddings: list[float],
+        top_k: int, max_distance: float,
+        incident_filter: Optional[IncidentFilter] = None) -> list[Record]:
+        # The filter is applied before the distances are computed.
+        conditions, filter_parameters = _incident_filter_conditions(
+            incident_filter)
+        filter_condition = ''.join(
+            f" AND {condition}" for condition in conditions)
+        query = f"""
+        SELECT distance, base.incident_id, base.start_ts, base.end_ts, base.status, base.description,
+            base.events, base.kpi_missed, base.enodeb_id, base.cell_id, base.cause, base.severity,
+            base.final_analysis, base.preliminary_analysis, base.resolution
+            FROM VECTOR_SEARCH(
+            (SELECT * FROM `{self._tables.incidents}`
+             WHERE ARRAY_LENGTH(events_embeddings) = ARRAY_LENGTH(@embeddings){filter_condition}), 'events_embeddings',
+            (SELECT @embeddings as embeddings), 'embeddings',
+            top_k => {int(top_k)})
+            WHERE distance <= @max_distance
+        """
+        logger.info("About to do vector search: %s", query)
+        return await self._runner.execute(query, [
+            ArrayQueryParameter("embeddings", "FLOAT64", embeddings),
+            ScalarQueryParameter("max_distance", "FLOAT64", max_distance),
+            *filter_parameters,
+        ], cached=True, cache_tags=[INCIDENTS_TAG])
+
+    async def get_incident_embeddings(self, model: str,
+        updated_since: Optional[datetime],
+        dimensions: Optional[int] = None) -> IncidentEmbeddings:
+        # The incidents table isn't partitioned, every query reads the whole
+        # columns it references. The embeddings are the bulk of the table, so
+        # an update first looks up the incidents with new embeddings, and then
+        # reads only their blocks - the table is clustered on incident_id.
+        condition = "ARRAY_LENGTH(events_embeddings) > 0 AND " \
+                    "(events_embeddings_model = @model OR events_embeddings_model IS NULL)"
+        model_parameter = ScalarQueryParameter("model", "STRING", model)
+        parameters = [model_parameter]
+        if updated_since is not None:
+            updated_since_parameter = ScalarQueryParameter(
+                "updated_since", "TIMESTAMP", updated_since)
+            rows = await self._runner.execute(f"""
+            SELECT incident_id FROM `{self._tables.incidents}`
+            WHERE events_embeddings_ts >= @updated_since AND events_embeddings_model = @model
+            """, [model_parameter, updated_since_parameter])
+            if not rows:
+                return IncidentEmbeddings.empty()
+            if len(rows) <= _MAX_UPDATED_INCIDENT_IDS:
+                condition += " AND incident_id IN UNNEST(@incident_ids)"
+                parameters.append(ArrayQueryParameter(
+                    "incident_ids", "STRING",
+                    [row.incident_id for row in rows]))
+            else:
+                # E.g. after a backfill, reading everything is cheaper.
+                condition += " AND events_embeddings_ts >= @updated_since"
+                parameters.append(updated_since_parameter)
+        table = await self._runner.execute_arrow(f"""
+        SELECT incident_id, events_embeddings,
+            ARRAY(SELECT kpi FROM UNNEST(kpi_missed)) AS kpis, status, enodeb_id, start_ts
+        FROM `{self._tables.incidents}`
+        WHERE {condition}
+        """, parameters)
+        return IncidentEmbeddings.from_arrow(table, dimensions)
+
+    async def get_incident_details(self, incident_ids: Sequence[str],
+        with_embeddings: bool = False) -> list[Record]:
+        if not incident_ids:
+            return []
+        embeddings_column = ", events_embeddings" if with_embeddings else ""
+        query = f"""
+        SELECT incident_id, start_ts, end_ts, status, description, events, kpi_missed,
+            enodeb_id, cell_id, cause, severity, final_analysis, preliminary_analysis, resolution,
+            events_embeddings_model{embeddings_column}
+        FROM `{self._tables.incidents}` WHERE incident_id IN UNNEST(@incident_ids)
+        """
+        return await self._runner.execute(query, [
+            ArrayQueryParameter("incident_ids", "STRING", list(incident_ids))
+        ], cached=True, cache_tags=[incident_tag(incident_id) for incident_id
+                                    in incident_ids])
+
+    async def get_kpi_history(self, enodeb_id: str, cell_id: str,
+        start: datetime, end: datetime,
+        precision: Optional[timedelta] = None) -> dict:
+        check_window(start, end)
+        return await fetch_kpi_history(
+            self._execute_cached,
+            self._tables.kpi_tiers, enodeb_id, cell_id, start, end, precision)
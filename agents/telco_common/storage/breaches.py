@@ -0,0 +1,147 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Result of the KPI breach scan as parallel arrays.
+
+A detection run over a large network returns millions of breaches. They go
+straight from the query result (Arrow record batches for BigQuery) into the
+arrays below and from there into the episode segmentation, without creating
+an object per row or per breach.
+"""
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from telco_common.storage.detection_query import KPI, last_seen_column, \
+    breaches_column
+
+_MICROS_PER_SECOND = 1_000_000
+
+
+def _seconds(timestamps: pa.Array) -> np.ndarray:
+    # Timestamps are on interval boundaries, the fraction of a second is
+    # dropped.
+    micros = pc.cast(timestamps, pa.timestamp('us', tz='UTC')).cast(
+        pa.int64())
+    return micros.to_numpy(zero_copy_only=False) // _MICROS_PER_SECOND
+
+
+def _strings(values: pa.Array) -> np.ndarray:
+    return np.array(values.to_pylist(), dtype=object)
+
+
+@dataclass(frozen=True)
+class KPIBreaches:
+    """
+    A key is a cell and a KPI with new measurements since its checkpoint. The
+    keys are ordered by KPI and cell, the breaches by key and time.
+    Timestamps are in seconds since epoch.
+    """
+    enodeb_id: np.ndarray
+    cell_id: np.ndarray
+    kpi: np.ndarray
+    # The latest scanned measurement of the key, the new watermark.
+    last_seen: np.ndarray
+    # Index of the breach's key.
+    breach_key: np.ndarray
+    breach_timestamp: np.ndarray
+    breach_value: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.kpi)
+
+    @classmethod
+    def empty(cls) -> 'KPIBreaches':
+        return cls.concatenate([])
+
+    @classmethod
+    def concatenate(cls, parts: Sequence['KPIBreaches']) -> 'KPIBreaches':
+        offsets = np.cumsum([0] + [len(part) for part in parts[:-1]])
+        return cls(
+            enodeb_id=np.concatenate(
+                [np.empty(0, dtype=object)] + [part.enodeb_id for part in
+                                               parts]),
+            cell_id=np.concatenate(
+                [np.empty(0, dtype=object)] + [part.cell_id for part in
+                                               parts]),
+            kpi=np.concatenate(
+                [np.empty(0, dtype=object)] + [part.kpi for part in parts]),
+            last_seen=np.concatenate(
+                [np.empty(0, dtype=np.int64)] + [part.last_seen for part in
+                                                 parts]),
+            breach_key=np.concatenate(
+                [np.empty(0, dtype=np.int64)] + [part.breach_key + offset for
+                                                 part, offset in
+                                                 zip(parts, offsets)]),
+            breach_timestamp=np.concatenate(
+                [np.empty(0, dtype=np.int64)] + [part.breach_timestamp for
+                                                 part in parts]),
+            breach_value=np.concatenate(
+                [np.empty(0, dtype=np.float64)] + [part.breach_value for part
+                                                   in parts]))
+
+    @classmethod
+    def from_intervals(cls, kpi: str, cells: np.ndarray,
+        cell_index: np.ndarray, timestamps: np.ndarray, values: np.ndarray,
+        scanned: np.ndarray, missed: np.ndarray) -> 'KPIBreaches':
+        """
+        Breaches of a single KPI from its value in every interval. The cells
+        are (enodeb_id, cell_id) pairs and the intervals are ordered by the
+        index of their cell and by time. Only the scanned intervals count.
+        """
+        no_data = np.iinfo(np.int64).min
+        last_seen = np.full(len(cells), no_data)
+        np.maximum.at(last_seen, cell_index[scanned], timestamps[scanned])
+        seen = last_seen != no_data
+        key_of_cell = np.cumsum(seen) - 1
+
+        breached = scanned & missed
+        return cls(
+            enodeb_id=np.asarray(cells[seen, 0], dtype=object),
+            cell_id=np.asarray(cells[seen, 1], dtype=object),
+            kpi=np.full(int(seen.sum()), kpi, dtype=object),
+            last_seen=last_seen[seen],
+            breach_key=key_of_cell[cell_index[breached]].astype(np.int64),
+            breach_timestamp=timestamps[breached].astype(np.int64),
+            breach_value=values[breached].astype(np.float64))
+
+    @classmethod
+    def from_arrow(cls, table: pa.Table,
+        kpis: Sequence[KPI]) -> 'KPIBreaches':
+        """
+        From the result of the detection query, one row per cell.
+        """
+        parts = []
+        for kpi in kpis:
+            last_seen = table.column(last_seen_column(kpi)).combine_chunks()
+            breaches = table.column(breaches_column(kpi)).combine_chunks()
+            seen = last_seen.is_valid().to_numpy(zero_copy_only=False)
+            key_of_row = np.cumsum(seen) - 1
+
+            breach_rows = pc.list_parent_indices(breaches).to_numpy(
+                zero_copy_only=False)
+            flat = pc.list_flatten(breaches)
+            parts.append(cls(
+                enodeb_id=_strings(table.column('enodeb_id').filter(seen)),
+                cell_id=_strings(table.column('cell_id').filter(seen)),
+                kpi=np.full(int(seen.sum()), kpi.name, dtype=object),
+                last_seen=_seconds(last_seen.filter(seen)),
+                breach_key=key_of_row[breach_rows].astype(np.int64),
+                breach_timestamp=_seconds(flat.field('measurement_end')),
+                breach_value=flat.field('kpi_value').to_numpy(
+                    zero_copy_only=False).astype(np.float64)))
+        return cls.concatenate(parts)
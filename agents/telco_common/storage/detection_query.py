@@ -0,0 +1,113 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from typing import Protocol, Sequence
+
+
+class KPI(Protocol):
+    """
+    KPI checked by the breach scan, see telco_common.kpi_registry.
+    """
+    name: str
+    # SQL expression over the columns of the performance_kpi view.
+    expression: str
+
+    def sql_breach_condition(self, enodeb_id_column: str,
+        cell_id_column: str) -> str: ...
+
+
+def last_seen_column(kpi: KPI) -> str:
+    return f"{kpi.name}_last_seen"
+
+
+def breaches_column(kpi: KPI) -> str:
+    return f"{kpi.name}_breaches"
+
+
+def build_kpi_values_query(performance_kpi_table: str,
+    detection_checkpoints_table: str, kpis: Sequence[KPI]) -> str:
+    """
+    The checkpoints of every cell, and the value of every KPI in every
+    interval after the cell's earliest watermark: whether the interval is
+    after the KPI's watermark (scanned) and whether it breaches the KPI
+    (missed). The query expects the @scan_from parameter - the earliest
+    watermark, used to prune the measurement_end partitions.
+
+    Only portable SQL is used, so that the embedded backend runs the same
+    query.
+    """
+    kpi_names = ', '.join(f"'{kpi.name}'" for kpi in kpis)
+    watermarks = ',\n'.join(
+        f"    MAX(CASE WHEN kpi = '{kpi.name}' THEN watermark_ts END) AS {kpi.name}_watermark"
+        for kpi in kpis)
+    values = ',\n'.join(
+        f"""    ({kpi.expression}) AS {kpi.name}_value,
+    p.measurement_end > COALESCE(c.{kpi.name}_watermark, @scan_from) AS {kpi.name}_scanned,
+    {kpi.sql_breach_condition('p.enodeb_id', 'p.cell_id')} AS {kpi.name}_missed"""
+        for kpi in kpis)
+
+    return f"""
+WITH checkpoints AS (
+  SELECT
+    enodeb_id,
+    cell_id,
+    -- Cells which haven't been checked for all the KPIs yet are scanned from @scan_from.
+    CASE WHEN COUNT(DISTINCT kpi) = {len(kpis)} THEN MIN(watermark_ts) END AS watermark_ts,
+{watermarks}
+  FROM `{detection_checkpoints_table}`
+  WHERE kpi IN ({kpi_names})
+  GROUP BY enodeb_id, cell_id
+),
+kpi_values AS (
+  SELECT
+    p.enodeb_id,
+    p.cell_id,
+    p.measurement_end,
+{values}
+  FROM `{performance_kpi_table}` p
+  LEFT JOIN checkpoints c
+    ON c.enodeb_id = p.enodeb_id AND c.cell_id = p.cell_id
+  WHERE p.measurement_end > @scan_from
+    AND (c.watermark_ts IS NULL OR p.measurement_end > c.watermark_ts)
+)"""
+
+
+def build_detection_query(performance_kpi_table: str,
+    detection_checkpoints_table: str, kpis: Sequence[KPI]) -> str:
+    """
+    Builds the query which checks all the KPIs in a single scan of the
+    performance_kpi view. Every KPI adds columns, not rows - the scanned data
+    is not multiplied by the number of KPIs.
+
+    The result has one row per cell. For every KPI there is the latest scanned
+    measurement (the new watermark) and the breaches after the KPI's watermark
+    in time order. The query expects the @scan_from parameter.
+    """
+    aggregates = ',\n'.join(
+        f"""  MAX(IF({kpi.name}_scanned, measurement_end, NULL)) AS {last_seen_column(kpi)},
+  ARRAY_AGG(
+    IF({kpi.name}_scanned AND {kpi.name}_missed,
+      STRUCT(measurement_end, {kpi.name}_value AS kpi_value), NULL) IGNORE NULLS
+    ORDER BY measurement_end) AS {breaches_column(kpi)}"""
+        for kpi in kpis)
+
+    return f"""{build_kpi_values_query(performance_kpi_table,
+                                     detection_checkpoints_table, kpis)}
+SELECT
+  enodeb_id,
+  cell_id,
+{aggregates}
+FROM kpi_values
+GROUP BY enodeb_id, cell_id
+ORDER BY enodeb_id, cell_id
+"""
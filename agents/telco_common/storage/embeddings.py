@@ -0,0 +1,108 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Embeddings of the incidents' events as a matrix.
+
+The embeddings of all the incidents are loaded at once into the prior
+incident index. They go from the query result (Arrow for BigQuery) straight
+into a float32 matrix, one row per incident, together with the attributes the
+search can be filtered by.
+"""
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from telco_common.storage.incident_filter import IncidentAttributes
+
+
+def _most_common(lengths: np.ndarray) -> Optional[int]:
+    if not len(lengths):
+        return None
+    values, counts = np.unique(lengths, return_counts=True)
+    return int(values[np.argmax(counts)])
+
+
+@dataclass(frozen=True)
+class IncidentEmbeddings:
+    incident_ids: np.ndarray
+    vectors: np.ndarray
+    # Embeddings of another width than the rest, left out.
+    skipped: int = 0
+    # Of every incident, if the rows had them.
+    attributes: list[IncidentAttributes] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.incident_ids)
+
+    @classmethod
+    def empty(cls) -> 'IncidentEmbeddings':
+        return cls(np.empty(0, dtype=object),
+                   np.empty((0, 0), dtype=np.float32))
+
+    @classmethod
+    def from_lists(cls, incident_ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        dimensions: Optional[int] = None,
+        attributes: Optional[
+            Sequence[IncidentAttributes]] = None) -> 'IncidentEmbeddings':
+        """
+        Only the embeddings with the given number of dimensions are kept, by
+        default the most common one.
+        """
+        lengths = np.array([len(embedding) for embedding in embeddings],
+                           dtype=np.int64)
+        dimensions = dimensions or _most_common(lengths)
+        if dimensions is None:
+            return cls.empty()
+        keep = lengths == dimensions
+        vectors = np.array(
+            [embedding for embedding, kept in zip(embeddings, keep) if kept],
+            dtype=np.float32).reshape(-1, dimensions)
+        return cls(np.array(incident_ids, dtype=object)[keep], vectors,
+                   int((~keep).sum()),
+                   [incident_attributes for incident_attributes, kept in
+                    zip(attributes, keep) if kept] if attributes else [])
+
+    @classmethod
+    def from_arrow(cls, table: pa.Table,
+        dimensions: Optional[int] = None) -> 'IncidentEmbeddings':
+        """
+        From a result with the incident_id and events_embeddings columns, and
+        optionally the attributes: kpis (the names of the missed KPIs),
+        status, enodeb_id and start_ts.
+        """
+        embeddings = table.column('events_embeddings').combine_chunks()
+        lengths = pc.list_value_length(embeddings).to_numpy(
+            zero_copy_only=False)
+        dimensions = dimensions or _most_common(lengths)
+        if dimensions is None:
+            return cls.empty()
+        keep = lengths == dimensions
+        vectors = pc.list_flatten(embeddings.filter(keep)).to_numpy(
+            zero_copy_only=False).astype(np.float32).reshape(-1, dimensions)
+        incident_ids = np.array(
+            table.column('incident_id').filter(keep).to_pylist(),
+            dtype=object)
+        attributes = []
+        if 'status' in table.column_names:
+            columns = [table.column(name).filter(keep).to_pylist() for name in
+                       ('kpis', 'status', 'enodeb_id', 'start_ts')]
+            attributes = [IncidentAttributes(tuple(kpis or ()), status,
+                                             enodeb_id, start_ts)
+                          for kpis, status, enodeb_id, start_ts in
+                          zip(*columns)]
+        return cls(incident_ids, vectors, int((~keep).sum()), attributes)
@@ -0,0 +1,151 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Filters of the prior incident search by the incidents' attributes.
+
+Only the incidents which match the filter are compared with the embeddings:
+the ones which missed one of the KPIs, with one of the statuses, on one of the
+eNodeBs and started after a time. The storage applies the filter in its
+query; the prior incident index looks the incidents up in an inverted index
+of their attributes, except the status, which changes after the incident is
+indexed.
+"""
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, Mapping, NamedTuple, Optional, Sequence
+
+
+class IncidentAttributes(NamedTuple):
+    kpis: tuple[str, ...]
+    status: Optional[str]
+    enodeb_id: Optional[str]
+    start_ts: Optional[datetime]
+
+
+def incident_attributes(row: Mapping[str, Any]) -> IncidentAttributes:
+    """
+    The attributes of a row of the incidents table.
+    """
+    return IncidentAttributes(
+        tuple(missed_kpi['kpi'] for missed_kpi in row.get('kpi_missed') or []),
+        row.get('status'), row.get('enodeb_id'), row.get('start_ts'))
+
+
+@dataclass(frozen=True)
+class IncidentFilter:
+    # None doesn't filter on the attribute.
+    kpis: Optional[frozenset[str]] = None
+    statuses: Optional[frozenset[str]] = None
+    enodeb_ids: Optional[frozenset[str]] = None
+    started_after: Optional[datetime] = None
+
+    def matches(self, attributes: IncidentAttributes) -> bool:
+        if self.kpis is not None and self.kpis.isdisjoint(attributes.kpis):
+            return False
+        if self.statuses is not None and attributes.status not in self.statuses:
+            return False
+        if self.enodeb_ids is not None and \
+            attributes.enodeb_id not in self.enodeb_ids:
+            return False
+        if self.started_after is not None and (
+            attributes.start_ts is None or
+            attributes.start_ts < self.started_after):
+            return False
+        return True
+
+
+class IncidentAttributeIndex:
+    """
+    The incident ids by every KPI and eNodeB, and the start of every
+    incident. The status is not indexed: it changes after the incident's
+    embeddings are written, and only those writes are synced. Safe to use
+    from several threads.
+    """
+
+    def __init__(self):
+        self._attributes: dict[str, IncidentAttributes] = {}
+        self._by_kpi: defaultdict[str, set[str]] = defaultdict(set)
+        self._by_enodeb_id: defaultdict[str, set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._attributes)
+
+    def _postings(self, attributes: IncidentAttributes) -> list[
+        tuple[defaultdict[str, set[str]], str]]:
+        postings = [(self._by_kpi, kpi) for kpi in attributes.kpis]
+        if attributes.enodeb_id is not None:
+            postings.append((self._by_enodeb_id, attributes.enodeb_id))
+        return postings
+
+    def _remove(self, incident_id: str) -> None:
+        attributes = self._attributes.pop(incident_id, None)
+        if attributes is None:
+            return
+        for index, value in self._postings(attributes):
+            incident_ids = index[value]
+            incident_ids.discard(incident_id)
+            if not incident_ids:
+                del index[value]
+
+    def upsert(self, incident_ids: Sequence[str],
+        attributes: Sequence[IncidentAttributes]) -> None:
+        with self._lock:
+            for incident_id, incident_attributes in zip(incident_ids,
+                                                        attributes):
+                self._remove(incident_id)
+                self._attributes[incident_id] = incident_attributes
+                for index, value in self._postings(incident_attributes):
+                    index[value].add(incident_id)
+
+    def remove(self, incident_ids: Iterable[str]) -> None:
+        with self._lock:
+            for incident_id in incident_ids:
+                self._remove(incident_id)
+
+    @staticmethod
+    def _union(index: defaultdict[str, set[str]],
+        values: frozenset[str]) -> set[str]:
+        incident_ids: set[str] = set()
+        for value in values:
+            incident_ids.update(index.get(value, ()))
+        return incident_ids
+
+    def matching(self, incident_filter: IncidentFilter) -> set[str]:
+        """
+        Ids of the incidents which match the filter, apart from its statuses.
+        """
+        with self._lock:
+            candidates = [
+                self._union(index, values) for index, values in (
+                    (self._by_kpi, incident_filter.kpis),
+                    (self._by_enodeb_id, incident_filter.enodeb_ids))
+                if values is not None]
+            if candidates:
+                # The smallest set first, the intersection is no larger.
+                candidates.sort(key=len)
+                incident_ids = candidates[0].intersection(*candidates[1:])
+            else:
+                incident_ids = set(self._attributes)
+            started_after = incident_filter.started_after
+            if started_after is None:
+                return incident_ids
+            recent = set()
+            for incident_id in incident_ids:
+                start_ts = self._attributes[incident_id].start_ts
+                if start_ts is not None and start_ts >= started_after:
+                    recent.add(incident_id)
+            return recent
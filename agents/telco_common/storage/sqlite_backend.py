@@ -0,0 +1,640 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Embedded storage backend on SQLite, for running the agents without BigQuery.
+
+The database is a single local file. On first use, the performance and cell
+traces tables are loaded from the CSV files in the data directory, and the
+incidents table optionally from a JSONL export of the BigQuery table. The
+table schemas in infrastructure/terraform/bigquery-schema name the columns
+which the CSV headers leave out. The
+KPI views and rollups are regular (not materialized) views with the same
+formulas as the BigQuery ones. The cell trace outcome rollup is a table,
+refreshed incrementally with the traces added since the last refresh.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, UTC, timedelta
+from typing import Any, AsyncIterator, Optional, Sequence, Iterable
+
+import numpy as np
+
+from telco_common.kpi_registry import KPIS
+from telco_common.rollups import KPITier, fetch_kpi_history, ROLLUP_KPIS
+from telco_common.storage.backend import StorageBackend, Record, \
+    QueryParameter, check_window
+from telco_common.storage.breaches import KPIBreaches
+from telco_common.storage.detection_query import KPI, build_kpi_values_query
+from telco_common.storage.embeddings import IncidentEmbeddings
+from telco_common.storage.incident_filter import IncidentFilter, \
+    incident_attributes
+from telco_common.storage.trace_outcomes import TRACE_BUCKET, \
+    fetch_cell_trace_outcomes
+
+logger = logging.getLogger(__name__)
+
+# Fixed width, so that the text order is the time order.
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Columns converted to datetime when read.
+_TIMESTAMP_COLUMNS = {'measurement_end', 'starttime', 'endtime', 'start_ts',
+                      'end_ts', 'created_ts', 'updated_ts', 'watermark_ts',
+                      'open_start_ts', 'open_end_ts', 'period',
+                      'start_bucket', 'end_bucket', 'events_embeddings_ts'}
+_JSON_COLUMNS = {'kpi_missed', 'events_embeddings'}
+
+# The CSV files use the "MM/DD/YYYY HH24:MI:SS" format.
+_CSV_TIMESTAMP = re.compile(
+    r"^(\d{2})/(\d{2})/(\d{4}) (\d{2}):(\d{2}):(\d{2})$")
+
+# Well under the limit of the number of parameters of a statement.
+_MAX_PARAMETERS = 500
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS incidents (
+        incident_id TEXT PRIMARY KEY,
+        start_ts TEXT NOT NULL,
+        end_ts TEXT,
+        status TEXT NOT NULL,
+        description TEXT NOT NULL,
+        kpi_missed TEXT NOT NULL,
+        enodeb_id TEXT,
+        cell_id TEXT,
+        severity TEXT,
+        preliminary_analysis TEXT,
+        final_analysis TEXT,
+        events TEXT,
+        events_embeddings TEXT,
+        cause TEXT,
+        resolution TEXT,
+        created_ts TEXT NOT NULL,
+        events_embeddings_model TEXT,
+        events_embeddings_ts TEXT
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS detection_checkpoints (
+        enodeb_id TEXT NOT NULL,
+        cell_id TEXT NOT NULL,
+        kpi TEXT NOT NULL,
+        watermark_ts TEXT NOT NULL,
+        open_incident_id TEXT,
+        open_start_ts TEXT,
+        open_end_ts TEXT,
+        open_kpi_sum REAL,
+        open_kpi_count INTEGER,
+        updated_ts TEXT,
+        PRIMARY KEY (enodeb_id, cell_id, kpi)
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS cell_trace_outcomes (
+        enodeb_id TEXT,
+        cell_id TEXT,
+        start_day TEXT,
+        start_bucket TEXT,
+        end_bucket TEXT,
+        connection_outcome TEXT,
+        number_of_outcomes INTEGER NOT NULL,
+        UNIQUE (enodeb_id, cell_id, start_bucket, end_bucket,
+                connection_outcome)
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS rollup_watermarks (
+        rollup TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL
+    )""",
+]
+
+# Columns added to the tables after they were first created, with their
+# definitions.
+_ADDED_COLUMNS = {
+    'incidents': {'events_embeddings_model': 'TEXT',
+                  'events_embeddings_ts': 'TEXT'},
+}
+
+_BUCKET_MICROS = int(TRACE_BUCKET.total_seconds()) * 1000000
+
+
+def _micros(column: str) -> str:
+    return (f"(CAST(strftime('%s', {column}) AS INTEGER) * 1000000 + "
+            f"CAST(substr({column}, 21, 6) AS INTEGER))")
+
+
+# Same buckets as the BigQuery materialized view: the start rounded down, the
+# end rounded up.
+_REFRESH_CELL_TRACE_OUTCOMES = f"""
+    INSERT INTO cell_trace_outcomes
+    SELECT start_enodeb_id, start_cell_id,
+        strftime('%Y-%m-%d 00:00:00.000000', starttime) AS start_day,
+        strftime('%Y-%m-%d %H:%M:%S.000000',
+            {_micros('starttime')} / {_BUCKET_MICROS} * {_BUCKET_MICROS // 1000000},
+            'unixepoch') AS start_bucket,
+        strftime('%Y-%m-%d %H:%M:%S.000000',
+            ({_micros('endtime')} + {_BUCKET_MICROS - 1}) / {_BUCKET_MICROS}
+            * {_BUCKET_MICROS // 1000000}, 'unixepoch') AS end_bucket,
+        s1_sig_conn_setup_sig_conn_result,
+        COUNT(*)
+    FROM cell_traces
+    WHERE rowid > ? AND rowid <= ?
+    GROUP BY 1, 2, 3, 4, 5, 6
+    ON CONFLICT (enodeb_id, cell_id, start_bucket, end_bucket,
+        connection_outcome)
+    DO UPDATE SET
+        number_of_outcomes = number_of_outcomes + excluded.number_of_outcomes
+"""
+
+
+def _kpi_views() -> list[str]:
+    # Column names are case-insensitive, the formulas use the BigQuery ones.
+    kpis = ',\n'.join(f"    {kpi.formula} AS {kpi.name}" for kpi in KPIS)
+    views = [f"""
+    CREATE VIEW IF NOT EXISTS performance_kpi AS
+    SELECT enodeb_id, cell_id, measurement_end,
+    {kpis}
+    FROM performance"""]
+    for name, period_format in [('hourly', '%Y-%m-%d %H:00:00.000000'),
+                                ('daily', '%Y-%m-%d 00:00:00.000000')]:
+        statistics = ',\n'.join(
+            f"    MIN({kpi}) AS {kpi}_min, MAX({kpi}) AS {kpi}_max, "
+            f"AVG({kpi}) AS {kpi}_avg" for kpi in ROLLUP_KPIS)
+        views.append(f"""
+    CREATE VIEW IF NOT EXISTS performance_kpi_{name} AS
+    SELECT enodeb_id, cell_id,
+        strftime('{period_format}', measurement_end) AS period_start,
+        COUNT(*) AS intervals,
+    {statistics}
+    FROM performance_kpi
+    GROUP BY enodeb_id, cell_id, period_start""")
+    return views
+
+
+_KPI_TIERS = [
+    KPITier(table='performance_kpi', resolution=timedelta(minutes=15),
+            time_column='measurement_end', aggregated=False),
+    KPITier(table='performance_kpi_hourly', resolution=timedelta(hours=1),
+            time_column='period_start', aggregated=True),
+    KPITier(table='performance_kpi_daily', resolution=timedelta(days=1),
+            time_column='period_start', aggregated=True),
+]
+
+
+def to_sql_timestamp(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC)
+    return value.strftime(_TIMESTAMP_FORMAT)
+
+
+def from_sql_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return datetime.strptime(value, _TIMESTAMP_FORMAT).replace(tzinfo=UTC)
+
+
+def _parse_exported_timestamp(value: Optional[str]) -> Optional[str]:
+    # BigQuery exports timestamps as e.g. "2025-11-24 15:00:00 UTC".
+    if not value:
+        return None
+    return to_sql_timestamp(
+        datetime.fromisoformat(value.replace(' UTC', '+00:00')))
+
+
+def _csv_value(value: str) -> Optional[str]:
+    if value == '':
+        return None
+    match = _CSV_TIMESTAMP.match(value)
+    if match:
+        month, day, year, hour, minute, second = match.groups()
+        return f"{year}-{month}-{day} {hour}:{minute}:{second}.000000"
+    return value
+
+
+def _parameter_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return to_sql_timestamp(value)
+    return value
+
+
+def _as_record(cursor: sqlite3.Cursor, row: tuple) -> Record:
+    record = Record()
+    for description, value in zip(cursor.description, row):
+        column = description[0]
+        if column in _TIMESTAMP_COLUMNS:
+            value = from_sql_timestamp(value)
+        elif column in _JSON_COLUMNS and value is not None:
+            value = json.loads(value)
+        record[column] = value
+    return record
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    All the operations run on a single connection, one at a time, on a
+    worker thread.
+    """
+
+    def __init__(self, database: str, performance_csv: Optional[str] = None,
+        cell_traces_csv: Optional[str] = None,
+        incidents_jsonl: Optional[str] = None,
+        schema_directory: Optional[str] = None):
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._initialize(performance_csv, cell_traces_csv,
+                             incidents_jsonl, schema_directory)
+
+    def _table_exists(self, table: str) -> bool:
+        return self._connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table,)).fetchone() is not None
+
+    def _load_csv(self, table: str, path: str, index: list[str],
+        schema: Optional[str]) -> None:
+        with open(path, mode='r', newline='', encoding='utf-8') as infile:
+            reader = csv.reader(infile)
+            # Column names are case-insensitive, as in BigQuery.
+            columns = [column.lower() for column in next(reader)]
+            rows = list(reader)
+            width = max((len(row) for row in rows), default=len(columns))
+            if schema and width > len(columns):
+                # The header names only the leading columns of the table, the
+                # rest of the values follow in the order of the schema.
+                with open(schema, mode='r', encoding='utf-8') as schema_file:
+                    schema_columns = [column['name'] for column in
+                                      json.load(schema_file)]
+                if schema_columns[:len(columns)] == columns:
+                    columns = schema_columns[:width]
+            # No column types - the values keep the type they are loaded with.
+            self._connection.execute(
+                f"CREATE TABLE {table} ({', '.join(columns)})")
+            placeholders = ', '.join('?' for _ in columns)
+            self._connection.executemany(
+                f"INSERT INTO {table} VALUES ({placeholders})",
+                ([_csv_value(value) for value in row[:len(columns)]] +
+                 [None] * (len(columns) - len(row)) for row in rows))
+        self._connection.execute(
+            f"CREATE INDEX {table}_cell ON {table} ({', '.join(index)})")
+        logger.info("Loaded %s into the %s table", path, table)
+
+    def _load_incidents(self, path: str) -> None:
+        with open(path, mode='r', encoding='utf-8') as infile:
+            for line in infile:
+                if not line.strip():
+                    continue
+                incident = json.loads(line)
+                self._connection.execute(
+                    """INSERT OR REPLACE INTO incidents VALUES (
+                        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (incident['incident_id'],
+                     _parse_exported_timestamp(incident['start_ts']),
+                     _parse_exported_timestamp(incident.get('end_ts')),
+                     incident['status'],
+                     incident['description'],
+                     json.dumps(incident.get('kpi_missed') or []),
+                     incident.get('enodeb_id'),
+                     incident.get('cell_id'),
+                     incident.get('severity'),
+                     incident.get('preliminary_analysis'),
+                     incident.get('final_analysis'),
+                     incident.get('events'),
+                     json.dumps(incident['events_embeddings']) if incident.get(
+                         'events_embeddings') else None,
+                     incident.get('cause'),
+                     incident.get('resolution'),
+                     _parse_exported_timestamp(incident.get('created_ts'))
+                     or to_sql_timestamp(datetime.now(UTC)),
+                     incident.get('events_embeddings_model'),
+                     _parse_exported_timestamp(
+                         incident.get('events_embeddings_ts'))))
+        logger.info("Loaded %s into the incidents table", path)
+
+    def _initialize(self, performance_csv: Optional[str],
+        cell_traces_csv: Optional[str], incidents_jsonl: Optional[str],
+        schema_directory: Optional[str]) -> None:
+        def schema(table: str) -> Optional[str]:
+            if not schema_directory:
+                return None
+            return os.path.join(schema_directory, f"{table}.json")
+
+        for statement in _SCHEMA:
+            self._connection.execute(statement)
+        for table, added_columns in _ADDED_COLUMNS.items():
+            columns = {row[1] for row in self._connection.execute(
+                f"PRAGMA table_info({table})")}
+            for column, definition in added_columns.items():
+                if column not in columns:
+                    self._connection.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        if performance_csv and not self._table_exists('performance'):
+            self._load_csv('performance', performance_csv,
+                           ['enodeb_id', 'cell_id', 'measurement_end'],
+                           schema('performance'))
+        if cell_traces_csv and not self._table_exists('cell_traces'):
+            self._load_csv('cell_traces', cell_traces_csv,
+                           ['start_enodeb_id', 'start_cell_id', 'starttime'],
+                           schema('cell-traces'))
+        if incidents_jsonl and not self._connection.execute(
+            "SELECT 1 FROM incidents LIMIT 1").fetchone():
+            self._load_incidents(incidents_jsonl)
+        if self._table_exists('performance'):
+            for statement in _kpi_views():
+                self._connection.execute(statement)
+        self._refresh_cell_trace_outcomes()
+
+    def _refresh_cell_trace_outcomes(self) -> None:
+        """
+        Adds the traces appended since the last refresh to the rollup. The
+        traces are never updated, so the rowid is the watermark.
+        """
+        if not self._table_exists('cell_traces'):
+            return
+        watermark = self._connection.execute(
+            "SELECT last_rowid FROM rollup_watermarks "
+            "WHERE rollup = 'cell_trace_outcomes'").fetchone()
+        last_rowid = watermark[0] if watermark else 0
+        latest_rowid = self._connection.execute(
+            "SELECT MAX(rowid) FROM cell_traces").fetchone()[0]
+        if latest_rowid is None or latest_rowid <= last_rowid:
+            return
+        self._connection.execute(_REFRESH_CELL_TRACE_OUTCOMES,
+                                 (last_rowid, latest_rowid))
+        self._connection.execute(
+            "INSERT OR REPLACE INTO rollup_watermarks VALUES (?, ?)",
+            ('cell_trace_outcomes', latest_rowid))
+        logger.info("Added the cell traces up to row %s to the rollup",
+                    latest_rowid)
+
+    def _refresh_cell_trace_outcomes_sync(self) -> None:
+        with self._lock, self._connection:
+            self._refresh_cell_trace_outcomes()
+
+    def _execute_sync(self, query: str, parameters: Any = ()) -> list[Record]:
+        with self._lock, self._connection:
+            cursor = self._connection.execute(query, parameters)
+            return [_as_record(cursor, row) for row in cursor.fetchall()]
+
+    def _execute_many_sync(self, query: str,
+        parameters: Iterable[Any]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(query, parameters)
+
+    async def _execute(self, query: str, parameters: Any = ()) -> list[Record]:
+        return await asyncio.to_thread(self._execute_sync, query, parameters)
+
+    async def _execute_with_query_parameters(self, query: str,
+        query_parameters: list[QueryParameter]) -> list[Record]:
+        # Same parameters as for BigQuery, SQLite supports the @name syntax.
+        return await self._execute(query, {
+            parameter.name: _parameter_value(parameter.value) for parameter in
+            query_parameters})
+
+    async def load_detection_checkpoints(self) -> list[Record]:
+        return await self._execute("""
+        SELECT enodeb_id, cell_id, kpi, watermark_ts,
+            open_incident_id, open_start_ts, open_end_ts, open_kpi_sum, open_kpi_count
+        FROM detection_checkpoints
+        """)
+
+    async def save_detection_checkpoints(self,
+        checkpoints: list[dict]) -> None:
+        updated = to_sql_timestamp(datetime.now(UTC))
+        await asyncio.to_thread(self._execute_many_sync, """
+        INSERT OR REPLACE INTO detection_checkpoints VALUES (
+            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(checkpoint['enodeb_id'], checkpoint['cell_id'],
+               checkpoint['kpi'],
+               to_sql_timestamp(checkpoint['watermark_ts']),
+               checkpoint['open_incident_id'],
+               to_sql_timestamp(checkpoint['open_start_ts']),
+               to_sql_timestamp(checkpoint['open_end_ts']),
+               checkpoint['open_kpi_sum'], checkpoint['open_kpi_count'],
+               updated) for checkpoint in checkpoints])
+
+    def _fetch_tuples_sync(self, query: str, parameters: Any) -> list[tuple]:
+        with self._lock, self._connection:
+            return self._connection.execute(query, parameters).fetchall()
+
+    async def scan_kpi_breaches(self, kpis: Sequence[KPI],
+        scan_from: datetime) -> KPIBreaches:
+        # The same intervals as the BigQuery detection query, turned into
+        # arrays here rather than aggregated by the query.
+        columns = ',\n'.join(
+            f"{kpi.name}_scanned, {kpi.name}_missed, {kpi.name}_value"
+            for kpi in kpis)
+        rows = await asyncio.to_thread(
+            self._fetch_tuples_sync,
+            build_kpi_values_query('performance_kpi', 'detection_checkpoints',
+                                   kpis) + f"""
+SELECT enodeb_id, cell_id,
+    CAST(strftime('%s', measurement_end) AS INTEGER) AS measurement_end,
+{columns}
+FROM kpi_values
+ORDER BY enodeb_id, cell_id, measurement_end""",
+            {'scan_from': to_sql_timestamp(scan_from)})
+        if not rows:
+            return KPIBreaches.empty()
+
+        values = list(zip(*rows))
+        enodeb_id = np.array(values[0], dtype=object)
+        cell_id = np.array(values[1], dtype=object)
+        new_cell = np.ones(len(rows), dtype=bool)
+        new_cell[1:] = (enodeb_id[1:] != enodeb_id[:-1]) | (
+            cell_id[1:] != cell_id[:-1])
+        cell_index = np.cumsum(new_cell) - 1
+        cells = np.stack([enodeb_id[new_cell], cell_id[new_cell]], axis=1)
+        timestamps = np.array(values[2], dtype=np.int64)
+
+        parts = []
+        for position, kpi in enumerate(kpis):
+            scanned, missed, kpi_values = values[3 + 3 * position:
+                                                 6 + 3 * position]
+            # NULL (no KPI value) is never a breach.
+            parts.append(KPIBreaches.from_intervals(
+                kpi.name, cells, cell_index, timestamps,
+                np.array(kpi_values, dtype=np.float64),
+                np.array(scanned, dtype=np.float64) == 1,
+                np.array(missed, dtype=np.float64) == 1))
+        return KPIBreaches.concatenate(parts)
+
+    async def get_open_incident_end_times(self, ended_after: datetime) -> dict[
+        str, Optional[datetime]]:
+        rows = await self._execute("""
+        SELECT incident_id, end_ts FROM incidents
+        WHERE status NOT IN ('CLOSED', 'RESOLVED')
+            AND (end_ts IS NULL OR end_ts >= ?)
+        """, (to_sql_timestamp(ended_after),))
+        return {row.incident_id: row.end_ts for row in rows}
+
+    async def save_incidents(self, incidents: list[dict]) -> None:
+        created = to_sql_timestamp(datetime.now(UTC))
+        await asyncio.to_thread(self._execute_many_sync, """
+        INSERT INTO incidents (incident_id, enodeb_id, cell_id, start_ts,
+            end_ts, status, description, kpi_missed, created_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (incident_id) DO UPDATE SET
+            end_ts = excluded.end_ts,
+            kpi_missed = excluded.kpi_missed
+        """, [(incident['incident_id'], incident['enodeb_id'],
+               incident['cell_id'], to_sql_timestamp(incident['start_ts']),
+               to_sql_timestamp(incident['end_ts']), incident['status'],
+               incident['description'], json.dumps(incident['kpi_missed']),
+               created) for incident in incidents])
+
+    async def get_incidents(self, incident_ids: Sequence[str]) -> list[
+        Record]:
+        rows = []
+        # SQLite limits the number of the parameters of a statement.
+        for offset in range(0, len(incident_ids), _MAX_PARAMETERS):
+            batch = incident_ids[offset:offset + _MAX_PARAMETERS]
+            rows += await self._execute(f"""
+            SELECT incident_id, enodeb_id, cell_id, start_ts, end_ts, status, description, kpi_missed
+            FROM incidents WHERE incident_id IN ({', '.join('?' for _ in batch)})
+            """, tuple(batch))
+        return rows
+
+    async def update_incident_analysis(self, incident_id: str, status: str,
+        preliminary_analysis: str, severity: str, events: str,
+        events_embeddings: list[float], events_embeddings_model: str) -> None:
+        await self._execute("""
+        UPDATE incidents SET
+            status = ?,
+            preliminary_analysis = ?,
+            severity = ?,
+            events = ?,
+            events_embeddings = ?,
+            events_embeddings_model = ?,
+            events_embeddings_ts = ?
+        WHERE incident_id = ?
+        """, (status, preliminary_analysis, severity, events,
+              json.dumps(list(events_embeddings)), events_embeddings_model,
+              to_sql_timestamp(datetime.now(UTC)), incident_id))
+
+    async def stream_incidents_to_embed(self, model: str,
+        after_incident_id: Optional[str], page_size: int) -> AsyncIterator[
+        list[Record]]:
+        after_incident_id = after_incident_id or ''
+        while True:
+            rows = await self._execute("""
+            SELECT incident_id, events FROM incidents
+            WHERE incident_id > ? AND events IS NOT NULL AND events != ''
+                AND (events_embeddings_model IS NULL OR events_embeddings_model != ?)
+            ORDER BY incident_id
+            LIMIT ?
+            """, (after_incident_id, model, page_size))
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            after_incident_id = rows[-1].incident_id
+
+    async def stage_incident_embeddings(self, embeddings: list[dict]) -> None:
+        # Written right away, there is nothing to merge.
+        now = to_sql_timestamp(datetime.now(UTC))
+        await asyncio.to_thread(self._execute_many_sync, """
+        UPDATE incidents SET events_embeddings = ?, events_embeddings_model = ?,
+            events_embeddings_ts = ?
+        WHERE incident_id = ?
+        """, [(json.dumps(list(embedding['events_embeddings'])),
+               embedding['events_embeddings_model'], now,
+               embedding['incident_id']) for embedding in embeddings])
+
+    async def apply_staged_incident_embeddings(self,
+        timeout: Optional[timedelta] = None) -> None:
+        pass
+
+    async def get_cell_trace_outcomes(self, enodeb_id: str, cell_id: str,
+        start: datetime, end: datetime) -> list[Record]:
+        check_window(start, end)
+        await asyncio.to_thread(self._refresh_cell_trace_outcomes_sync)
+        return await fetch_cell_trace_outcomes(
+            self._execute_with_query_parameters, 'cell_traces',
+            'cell_trace_outcomes', enodeb_id, cell_id, start, end)
+
+    async def find_similar_incidents(self, embeddings: list[float],
+        top_k: int, max_distance: float,
+        incident_filter: Optional[IncidentFilter] = None) -> list[Record]:
+        rows = await self._execute("""
+        SELECT incident_id, start_ts, end_ts, status, description, events,
+            kpi_missed, enodeb_id, cell_id, cause, severity, final_analysis,
+            preliminary_analysis, resolution, events_embeddings
+        FROM incidents WHERE events_embeddings IS NOT NULL
+        """)
+        # Exact search - the number of incidents is small.
+        rows = [row for row in rows if
+                len(row.events_embeddings) == len(embeddings) and (
+                    incident_filter is None or incident_filter.matches(
+                        incident_attributes(row)))]
+        if not rows:
+            return []
+        distances = np.linalg.norm(
+            np.array([row.events_embeddings for row in rows]) - np.array(
+                embeddings), axis=1)
+        result = []
+        for position in np.argsort(distances, kind='stable')[:top_k]:
+            if distances[position] > max_distance:
+                break
+            row = rows[position]
+            del row['events_embeddings']
+            row['distance'] = float(distances[position])
+            result.append(row)
+        return result
+
+    async def get_incident_embeddings(self, model: str,
+        updated_since: Optional[datetime],
+        dimensions: Optional[int] = None) -> IncidentEmbeddings:
+        rows = await self._execute("""
+        SELECT incident_id, events_embeddings, kpi_missed, status, enodeb_id,
+            start_ts
+        FROM incidents
+        WHERE events_embeddings IS NOT NULL
+            AND (events_embeddings_model = ? OR events_embeddings_model IS NULL)
+            AND (? IS NULL OR events_embeddings_ts >= ?)
+        """, (model, to_sql_timestamp(updated_since),
+              to_sql_timestamp(updated_since)))
+        return IncidentEmbeddings.from_lists(
+            [row.incident_id for row in rows],
+            [row.events_embeddings for row in rows], dimensions,
+            [incident_attributes(row) for row in rows])
+
+    async def get_incident_details(self, incident_ids: Sequence[str],
+        with_embeddings: bool = False) -> list[Record]:
+        embeddings_column = ", events_embeddings" if with_embeddings else ""
+        rows = []
+        for offset in range(0, len(incident_ids), _MAX_PARAMETERS):
+            batch = incident_ids[offset:offset + _MAX_PARAMETERS]
+            rows += await self._execute(f"""
+            SELECT incident_id, start_ts, end_ts, status, description, events,
+                kpi_missed, enodeb_id, cell_id, cause, severity, final_analysis,
+                preliminary_analysis, resolution, events_embeddings_model{embeddings_column}
+            FROM incidents WHERE incident_id IN ({', '.join('?' for _ in batch)})
+            """, tuple(batch))
+        return rows
+
+    async def get_kpi_history(self, enodeb_id: str, cell_id: str,
+        start: datetime, end: datetime,
+        precision: Optional[timedelta] = None) -> dict:
+        check_window(start, end)
+        return await fetch_kpi_history(self._execute_with_query_parameters,
+                                       _KPI_TIERS, enodeb_id, cell_id, start,
+                                       end, precision)
+
+    def close(self) -> None:
+        self._connection.close()
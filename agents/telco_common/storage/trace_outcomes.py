@@ -0,0 +1,179 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Cell trace outcome counts, answered from the 15 minute rollup of the traces.
+
+The cell_trace_outcomes rollup counts the traces of every cell by the bucket
+of their start (rounded down), the bucket of their end (rounded up) and the
+outcome of the S1 signalling connection setup. For a window which starts and
+ends on bucket boundaries the rollup gives the exact counts, as
+
+    starttime >= start  <=>  start_bucket >= start
+    starttime < end     <=>  start_bucket < end
+    endtime <= end      <=>  end_bucket <= end
+
+For any other window, the rollup answers its aligned part and the raw traces
+only the partial buckets at its edges. The cost of a lookup then depends on
+the number of buckets in the window, not on the number of traces.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Optional, Callable, Awaitable, Iterable
+
+from telco_common.storage.backend import QueryParameter, Record
+
+# Must match the bucket of the cell_trace_outcomes materialized view in
+# infrastructure/terraform/bigquery-schema/cell_trace_outcomes.sql.tftpl.
+TRACE_BUCKET = timedelta(minutes=15)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def floor_bucket(value: datetime) -> datetime:
+    return value - (value - _EPOCH) % TRACE_BUCKET
+
+
+def ceil_bucket(value: datetime) -> datetime:
+    floor = floor_bucket(value)
+    return floor if floor == value else floor + TRACE_BUCKET
+
+
+@dataclass(frozen=True)
+class TraceRange:
+    """
+    Traces read from the raw table: those which start within the range and,
+    if set, end after `ended_after`.
+    """
+    start: datetime
+    end: datetime
+    ended_after: Optional[datetime] = None
+
+
+def rollup_outcomes_query(rollup_table: str) -> str:
+    """
+    Counts of the cell's traces which start within the aligned part of the
+    window, by their start and end buckets. The query expects the @enodeb_id,
+    @cell_id, @rollup_start, @rollup_start_day, @rollup_end and @end_limit
+    parameters.
+    """
+    return f"""
+SELECT start_bucket, end_bucket, connection_outcome,
+    SUM(number_of_outcomes) AS number_of_outcomes
+FROM `{rollup_table}`
+WHERE enodeb_id = @enodeb_id AND cell_id = @cell_id
+    AND start_day >= @rollup_start_day AND start_day < @rollup_end
+    AND start_bucket >= @rollup_start AND start_bucket < @rollup_end
+    AND end_bucket <= @end_limit
+GROUP BY start_bucket, end_bucket, connection_outcome
+"""
+
+
+def trace_outcomes_query(cell_traces_table: str,
+    ranges: list[TraceRange]) -> str:
+    """
+    Counts of the cell's traces within the ranges which end by @end. Every
+    range is a separate scan, filtered on starttime, so that each of them
+    prunes the partitions of the table.
+    """
+    scans = []
+    for index, trace_range in enumerate(ranges):
+        ended_after = f" AND endtime > @range{index}_ended_after" \
+            if trace_range.ended_after else ''
+        scans.append(f"""
+    SELECT s1_sig_conn_setup_sig_conn_result
+    FROM `{cell_traces_table}`
+    WHERE start_enodeb_id = @enodeb_id AND start_cell_id = @cell_id
+        AND starttime >= @range{index}_start AND starttime < @range{index}_end
+        AND endtime <= @end{ended_after}""")
+    union = '\n    UNION ALL'.join(scans)
+    return f"""
+SELECT s1_sig_conn_setup_sig_conn_result connection_outcome, COUNT(*) number_of_outcomes
+FROM ({union}
+) AS traces
+GROUP BY s1_sig_conn_setup_sig_conn_result
+"""
+
+
+def _range_parameters(ranges: list[TraceRange]) -> list[QueryParameter]:
+    parameters = []
+    for index, trace_range in enumerate(ranges):
+        parameters += [
+            QueryParameter(f"range{index}_start", "TIMESTAMP",
+                           trace_range.start),
+            QueryParameter(f"range{index}_end", "TIMESTAMP",
+                           trace_range.end)]
+        if trace_range.ended_after:
+            parameters.append(QueryParameter(
+                f"range{index}_ended_after", "TIMESTAMP",
+                trace_range.ended_after))
+    return parameters
+
+
+async def fetch_cell_trace_outcomes(
+    execute_query: Callable[[str, list[QueryParameter]],
+                            Awaitable[Iterable]],
+    cell_traces_table: str, rollup_table: Optional[str], enodeb_id: str,
+    cell_id: str, start: datetime, end: datetime) -> list[Record]:
+    """
+    Number of the cell's traces which start within [start, end) and end by
+    `end`, by connection_outcome. Without a rollup table, all the traces are
+    read from the raw table.
+    """
+    cell_parameters = [
+        QueryParameter("enodeb_id", "STRING", enodeb_id),
+        QueryParameter("cell_id", "STRING", cell_id)]
+    counts: Counter = Counter()
+    rollup_start = ceil_bucket(start)
+    rollup_end = floor_bucket(end)
+    if rollup_table is None or rollup_start >= rollup_end:
+        ranges = [TraceRange(start, end)]
+    else:
+        # The traces which end in the partial bucket after the aligned part
+        # are counted from the raw traces of their start buckets.
+        end_limit = rollup_end + TRACE_BUCKET if end > rollup_end \
+            else rollup_end
+        rows = await execute_query(
+            rollup_outcomes_query(rollup_table), cell_parameters + [
+                QueryParameter("rollup_start", "TIMESTAMP", rollup_start),
+                QueryParameter("rollup_start_day", "TIMESTAMP",
+                               rollup_start.astimezone(UTC).replace(
+                                   hour=0, minute=0, second=0,
+                                   microsecond=0)),
+                QueryParameter("rollup_end", "TIMESTAMP", rollup_end),
+                QueryParameter("end_limit", "TIMESTAMP", end_limit)])
+        ending_late = set()
+        for row in rows:
+            if row.end_bucket <= rollup_end:
+                counts[row.connection_outcome] += row.number_of_outcomes
+            else:
+                ending_late.add(row.start_bucket)
+
+        ranges = [TraceRange(start, rollup_start)] \
+            if start < rollup_start else []
+        ranges += [TraceRange(bucket, bucket + TRACE_BUCKET,
+                              ended_after=rollup_end)
+                   for bucket in sorted(ending_late)]
+        if rollup_end < end:
+            ranges.append(TraceRange(rollup_end, end))
+
+    if ranges:
+        rows = await execute_query(
+            trace_outcomes_query(cell_traces_table, ranges),
+            cell_parameters + _range_parameters(ranges) + [
+                QueryParameter("end", "TIMESTAMP", end)])
+        for row in rows:
+            counts[row.connection_outcome] += row.number_of_outcomes
+    return [Record(connection_outcome=outcome, number_of_outcomes=count)
+            for outcome, count in counts.items()]
@@ -0,0 +1,71 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Incident timestamps as timezone-aware datetimes in UTC.
+
+The models keep datetimes. They are passed as they are to the queries, and
+written as ISO 8601 in UTC, e.g. "2025-11-24T15:00:00Z", to the session state
+and for the LLM. ISO 8601 is parsed more than an order of magnitude faster
+than the locale dependent "%c" format, and doesn't lose the timezone.
+"""
+from datetime import datetime, UTC
+from typing import Annotated, Any, Sequence
+
+import numpy as np
+from pydantic import PlainSerializer, WrapValidator, \
+    ValidatorFunctionWrapHandler
+
+# Format of the timestamps in the session state of the earlier versions.
+LEGACY_FORMAT = "%c"
+
+
+def to_utc(value: datetime) -> datetime:
+    # Naive datetimes are in UTC, as all the timestamps of the data are.
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def format_timestamp(value: datetime) -> str:
+    return to_utc(value).replace(tzinfo=None).isoformat() + 'Z'
+
+
+def parse_timestamp(value: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = datetime.strptime(value, LEGACY_FORMAT)
+    return to_utc(parsed)
+
+
+def datetimes_from_seconds(seconds: np.ndarray | Sequence[int]) -> list[
+    datetime]:
+    """
+    UTC datetimes of a whole batch of epoch seconds, e.g. a column of the
+    breach scan.
+    """
+    return [datetime.fromtimestamp(value, UTC) for value in
+            np.asarray(seconds, dtype=np.int64).tolist()]
+
+
+def _validate(value: Any, handler: ValidatorFunctionWrapHandler) -> datetime:
+    if isinstance(value, str):
+        return parse_timestamp(value)
+    return to_utc(handler(value))
+
+
+# A datetime field which is always in UTC and always serialized as a string.
+UtcDatetime = Annotated[
+    datetime, WrapValidator(_validate),
+    PlainSerializer(format_timestamp, return_type=str)]
@@ -0,0 +1,298 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+In-process nearest neighbour search over embeddings.
+
+Every query is compared with every vector, as a single matrix-vector product.
+For tens of thousands of vectors of a few thousand dimensions, this takes
+milliseconds and needs no index structure to build or tune.
+
+The vectors can be kept quantized: as int8 with a scale per vector (4 times
+smaller than float32) or as the signs of their components (32 times smaller).
+A quantized index only ranks the candidates approximately. The closest ones
+are then compared exactly, with the full precision vectors kept elsewhere,
+see rerank.
+"""
+import logging
+import threading
+from typing import Iterable, Literal, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Quantization = Literal['none', 'int8', 'binary']
+
+_MIN_CAPACITY = 1024
+# The distances from the matrix product lose precision to cancellation. The
+# closest candidates are compared again, exactly, and more of them than
+# asked for, so that the order of the result is the exact one.
+_EXTRA_CANDIDATES = 16
+# The int8 vectors are converted to float32 for the product in chunks of
+# about this size, small enough to stay in the CPU's L2 cache. Larger chunks
+# make the int8 search slower than the float32 one.
+_INT8_CHUNK_BYTES = 512 * 1024
+
+
+def _encode(vectors: np.ndarray, quantization: Quantization) -> tuple[
+    np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The codes of the float32 vectors, their scales and the squared norms of
+    the vectors the codes stand for.
+    """
+    if quantization == 'binary':
+        codes = np.packbits(vectors > 0, axis=1)
+        return codes, np.ones(len(vectors), dtype=np.float32), np.zeros(
+            len(vectors), dtype=np.float32)
+    if quantization == 'int8':
+        scales = np.abs(vectors).max(axis=1, initial=0.) / 127
+        scales[scales == 0] = 1.
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(
+            np.int8)
+        squared_norms = np.einsum('ij,ij->i', codes.astype(np.float32),
+                                  codes.astype(np.float32)) * scales ** 2
+        return codes, scales.astype(np.float32), squared_norms.astype(
+            np.float32)
+    return vectors, np.ones(len(vectors), dtype=np.float32), np.einsum(
+        'ij,ij->i', vectors, vectors)
+
+
+def _code_layout(dimensions: int, quantization: Quantization) -> tuple[
+    int, type]:
+    if quantization == 'binary':
+        return (dimensions + 7) // 8, np.uint8
+    if quantization == 'int8':
+        return dimensions, np.int8
+    return dimensions, np.float32
+
+
+def rerank(vector: Sequence[float], ids: Sequence[str],
+    vectors: Sequence[Sequence[float]], top_k: int,
+    max_distance: Optional[float] = None) -> list[tuple[str, float]]:
+    """
+    The `top_k` of the candidates closest to the vector by the exact
+    Euclidean distance, closest first, without the ones further than
+    `max_distance`. The candidates of another number of dimensions are left
+    out.
+    """
+    query = np.asarray(vector, dtype=np.float64)
+    kept = [position for position, candidate in enumerate(vectors)
+            if len(candidate) == len(query)]
+    if not kept or top_k <= 0:
+        return []
+    distances = np.linalg.norm(
+        np.array([vectors[position] for position in kept],
+                 dtype=np.float64) - query, axis=1)
+    result = []
+    for index in np.argsort(distances, kind='stable')[:top_k]:
+        distance = float(distances[index])
+        if max_distance is not None and distance > max_distance:
+            break
+        result.append((ids[kept[index]], distance))
+    return result
+
+
+class VectorIndex:
+    """
+    Vectors by id, searched by the Euclidean distance, like the BigQuery
+    VECTOR_SEARCH. Safe to use from several threads.
+    """
+
+    def __init__(self, dimensions: Optional[int] = None,
+        quantization: Quantization = 'none'):
+        self._dimensions = dimensions
+        self._quantization = quantization
+        self._codes = np.empty((0, 0), dtype=np.float32)
+        self._scales = np.empty(0, dtype=np.float32)
+        self._squared_norms = np.empty(0, dtype=np.float32)
+        self._ids: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return self._dimensions
+
+    @property
+    def quantization(self) -> Quantization:
+        return self._quantization
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory taken by the vectors in the index, without the ids.
+        """
+        size = len(self._ids)
+        per_vector = self._codes.itemsize * self._codes.shape[1]
+        if self._quantization != 'binary':
+            # The scale and the squared norm.
+            per_vector += 8
+        return size * per_vector
+
+    def _reserve(self, used: int, size: int) -> None:
+        if size <= len(self._codes):
+            return
+        capacity = max(_MIN_CAPACITY, len(self._codes) * 2, size)
+        width, dtype = _code_layout(self._dimensions, self._quantization)
+        codes = np.empty((capacity, width), dtype=dtype)
+        scales = np.empty(capacity, dtype=np.float32)
+        squared_norms = np.empty(capacity, dtype=np.float32)
+        if used:
+            codes[:used] = self._codes[:used]
+            scales[:used] = self._scales[:used]
+            squared_norms[:used] = self._squared_norms[:used]
+        self._codes = codes
+        self._scales = scales
+        self._squared_norms = squared_norms
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        """
+        Adds the vectors, or replaces the ones with the same ids. The first
+        vectors added set the number of dimensions.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(ids):
+            return
+        if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+            raise ValueError(f"Expected {len(ids)} vectors, got an array of "
+                             f"the shape {vectors.shape}")
+        # The last vector of an id wins.
+        latest = {vector_id: row for row, vector_id in enumerate(ids)}
+        codes, scales, squared_norms = _encode(vectors[list(latest.values())],
+                                               self._quantization)
+        with self._lock:
+            if self._dimensions is None:
+                self._dimensions = vectors.shape[1]
+            if vectors.shape[1] != self._dimensions:
+                raise ValueError(f"Expected vectors of {self._dimensions} "
+                                 f"dimensions, got {vectors.shape[1]}")
+            used = len(self._ids)
+            positions = []
+            for vector_id in latest:
+                position = self._positions.get(vector_id)
+                if position is None:
+                    position = len(self._ids)
+                    self._positions[vector_id] = position
+                    self._ids.append(vector_id)
+                positions.append(position)
+            self._reserve(used, len(self._ids))
+            self._codes[positions] = codes
+            self._scales[positions] = scales
+            self._squared_norms[positions] = squared_norms
+
+    def remove(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            for vector_id in ids:
+                position = self._positions.pop(vector_id, None)
+                if position is None:
+                    continue
+                # The last vector takes the place of the removed one.
+                last = len(self._ids) - 1
+                if position != last:
+                    moved_id = self._ids[last]
+                    self._ids[position] = moved_id
+                    self._positions[moved_id] = position
+                    self._codes[position] = self._codes[last]
+                    self._scales[position] = self._scales[last]
+                    self._squared_norms[position] = self._squared_norms[last]
+                self._ids.pop()
+
+    def _approximate_distances(self, query: np.ndarray,
+        rows: np.ndarray | slice) -> np.ndarray:
+        """
+        Ranks the vectors in the rows like the squared distances to the
+        query, less the squared norm of the query. The Hamming distance of
+        the signs for a binary index.
+        """
+        codes = self._codes[rows]
+        if self._quantization == 'binary':
+            return np.bitwise_count(
+                codes ^ np.packbits(query > 0)).sum(axis=1, dtype=np.int64)
+        if self._quantization == 'int8':
+            products = np.empty(len(codes), dtype=np.float32)
+            chunk_rows = max(1, _INT8_CHUNK_BYTES // (4 * codes.shape[1]))
+            for offset in range(0, len(codes), chunk_rows):
+                products[offset:offset + chunk_rows] = codes[
+                    offset:offset + chunk_rows].astype(np.float32) @ query
+            return self._squared_norms[rows] - 2 * self._scales[
+                rows] * products
+        return self._squared_norms[rows] - 2 * (codes @ query)
+
+    def _closest(self, query: np.ndarray, count: int,
+        ids: Optional[Iterable[str]]) -> np.ndarray:
+        """
+        Positions of the `count` vectors closest to the query by the
+        approximate distance, closest first. Only the vectors of the ids are
+        compared, if given.
+        """
+        if ids is None:
+            rows = np.arange(len(self._ids))
+        else:
+            rows = np.array(sorted(
+                position for position in map(self._positions.get, ids)
+                if position is not None), dtype=np.int64)
+        if not len(rows):
+            return rows
+        # All the vectors are a view, a subset is a copy.
+        approximate = self._approximate_distances(
+            query, slice(0, len(self._ids)) if ids is None else rows)
+        if count < len(rows):
+            closest = np.argpartition(approximate, count - 1)[:count]
+        else:
+            closest = np.arange(len(rows))
+        return rows[closest[np.argsort(approximate[closest], kind='stable')]]
+
+    def _matches(self, query: np.ndarray) -> bool:
+        return bool(self._ids) and query.shape == (self._dimensions,)
+
+    def candidates(self, vector: Sequence[float], count: int,
+        ids: Optional[Iterable[str]] = None) -> list[str]:
+        """
+        The ids of the `count` vectors closest to the given one by the
+        approximate distance, to be re-ranked with the full precision vectors.
+        With `ids`, only their vectors are compared; the unknown ids are
+        ignored. A vector of another number of dimensions matches nothing.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if not self._matches(query) or count <= 0:
+                return []
+            return [self._ids[position] for position in
+                    self._closest(query, count, ids)]
+
+    def search(self, vector: Sequence[float], top_k: int,
+        max_distance: Optional[float] = None,
+        ids: Optional[Iterable[str]] = None) -> list[tuple[str, float]]:
+        """
+        The ids of the `top_k` vectors closest to the given one and their
+        distances, closest first, without the ones further than
+        `max_distance`. With `ids`, only their vectors are compared. A
+        vector of another number of dimensions matches nothing. Only an
+        index of full precision vectors can compute the exact distances, a
+        quantized one finds the candidates.
+        """
+        if self._quantization != 'none':
+            raise ValueError(f"An index of {self._quantization} vectors "
+                             f"only finds candidates")
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if not self._matches(query) or top_k <= 0:
+                return []
+            positions = self._closest(query, top_k + _EXTRA_CANDIDATES, ids)
+            found = [self._ids[position] for position in positions]
+            vectors = self._codes[positions]
+        return rerank(vector, found, vectors, top_k, max_distance)
@@ -0,0 +1,47 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+"""
+Settings for importing the agents' modules without a deployment. The tests
+use the SQLite storage backend and never connect to BigQuery.
+"""
+import os
+
+_ENVIRONMENT = {
+    'STORAGE_BACKEND': 'sqlite',
+    'GOOGLE_CLOUD_PROJECT': 'test-project',
+    'GOOGLE_CLOUD_LOCATION': 'global',
+    'GOOGLE_GENAI_USE_VERTEXAI': 'true',
+    'PROJECT_ID': 'test-project',
+    'BIGQUERY_RUN_PROJECT_ID': 'test-project',
+    'BIGQUERY_DATA_PROJECT_ID': 'test-project',
+    'BIGQUERY_DATA_LOCATION': 'US',
+    'BIGQUERY_DATASET': 'telco',
+    'BIGQUERY_TABLE_PERFORMANCE': 'performance',
+    'BIGQUERY_TABLE_PERFORMANCE_KPI': 'performance_kpi',
+    'BIGQUERY_TABLE_PERFORMANCE_KPI_HOURLY': 'performance_kpi_hourly',
+    'BIGQUERY_TABLE_PERFORMANCE_KPI_DAILY': 'performance_kpi_daily',
+    'BIGQUERY_TABLE_INCIDENTS': 'incidents',
+    'BIGQUERY_TABLE_CELL_TRACES': 'cell_traces',
+    'BIGQUERY_TABLE_DETECTION_CHECKPOINTS': 'detection_checkpoints',
+    'AGENT_DATA_LOG_PROJECT_ID': 'test-project',
+    'AGENT_DATA_LOG_DATASET': 'agent_logs',
+    'AGENT_DATA_LOG_TABLE': 'agent_events',
+    'INTERNAL_DOCS_DATASTORE_ID': 'internal-docs',
+    'VERTEX_AI_SEARCH_ENGINE_RCA_RULES': 'rca-rules',
+    'VERTEX_AI_SEARCH_ENGINE_RCA_RULES_LOCATION': 'global',
+}
+
+# Set before the test modules import the settings.
+for name, value in _ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,200 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+import csv
+from datetime import datetime, timedelta, UTC
+from types import SimpleNamespace
+
+import pytest
+
+from incident_detector import checkpoints as checkpoint_store
+from incident_detector import tools
+from incident_detector.checkpoints import Checkpoint, EPOCH, \
+    load_checkpoints, save_checkpoints, scan_start
+from incident_detector.detection import build_incidents
+from incident_detector.models import Incident
+from incident_detector.segmentation import MEASUREMENT_INTERVAL
+from telco_common.kpi_registry import ERAB_ATTEMPTS, ERAB_RELEASES, \
+    ERAB_SUCCESSES, KPIS, SESSION_TIME
+from telco_common.storage.sqlite_backend import SQLiteStorage, \
+    to_sql_timestamp
+
+GAP_TOLERANCE = timedelta(minutes=30)
+MIN_DURATION = timedelta(minutes=30)
+START = datetime(2025, 11, 20, 10, 0, tzinfo=UTC)
+_COUNTERS = ERAB_ATTEMPTS + ERAB_SUCCESSES + ERAB_RELEASES + (SESSION_TIME,)
+
+
+def _intervals(start: datetime, count: int, enodeb_id: str = '1',
+    cell_id: str = '11', breached: frozenset[int] = frozenset()) -> list[
+    list]:
+    """
+    Rows of the performance table, every 15 minutes from `start`. The ERAB
+    success rate of the intervals at the `breached` positions is 90%.
+    """
+    rows = []
+    for position in range(count):
+        values = {counter: 0 for counter in _COUNTERS}
+        values[ERAB_ATTEMPTS[0]] = 100
+        values[ERAB_SUCCESSES[0]] = 90 if position in breached else 100
+        values[ERAB_RELEASES[0]] = 1
+        values[SESSION_TIME] = 3600
+        rows.append([enodeb_id, cell_id, start + position * MEASUREMENT_INTERVAL]
+                    + [values[counter] for counter in _COUNTERS])
+    return rows
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch) -> SQLiteStorage:
+    performance_csv = tmp_path / 'performance.csv'
+    with open(performance_csv, mode='w', newline='',
+              encoding='utf-8') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['EnodeB_id', 'cell_id', 'measurement_end', *_COUNTERS])
+        # Cell 11 breaches from the 5th interval to the last one.
+        for row in _intervals(START, 8, breached=frozenset(range(4, 8))) + \
+                   _intervals(START, 8, cell_id='12'):
+            row[2] = row[2].strftime("%m/%d/%Y %H:%M:%S")
+            writer.writerow(row)
+    storage = SQLiteStorage(str(tmp_path / 'detection.sqlite'),
+                            str(performance_csv))
+    monkeypatch.setattr(checkpoint_store, 'storage', storage)
+    yield storage
+    storage.close()
+
+
+def _add_intervals(storage: SQLiteStorage, rows: list[list]) -> None:
+    placeholders = ', '.join('?' for _ in rows[0])
+    columns = ', '.join(['enodeb_id', 'cell_id', 'measurement_end',
+                         *_COUNTERS])
+    storage._execute_many_sync(
+        f"INSERT INTO performance ({columns}) VALUES ({placeholders})",
+        ([*row[:2], to_sql_timestamp(row[2]), *row[3:]] for row in rows))
+
+
+async def _detect(storage: SQLiteStorage,
+    reported: dict[str, datetime]) -> list[Incident]:
+    """
+    One detection run. `reported` stands for the incidents table: the end of
+    every incident by its id.
+    """
+    checkpoints = await load_checkpoints()
+    breaches = await storage.scan_kpi_breaches(
+        KPIS, scan_start(checkpoints, KPIS))
+    incidents, new_checkpoints = build_incidents(
+        breaches, checkpoints, KPIS, GAP_TOLERANCE, MIN_DURATION,
+        lambda incident_id, ended: reported.get(incident_id) != ended)
+    await save_checkpoints(new_checkpoints)
+    reported.update((incident.id, incident.end_time) for incident in incidents)
+    return incidents
+
+
+def test_open_incident_is_extended_by_the_next_run(storage):
+    async def detect_twice():
+        reported = {}
+        first = await _detect(storage, reported)
+        # The breach goes on for two more intervals, then the cell recovers.
+        _add_intervals(storage, _intervals(START + 8 * MEASUREMENT_INTERVAL,
+                                           5, breached=frozenset({0, 1})))
+        second = await _detect(storage, reported)
+        third = await _detect(storage, reported)
+        return first, second, third, await load_checkpoints()
+
+    first, second, third, checkpoints = asyncio.run(detect_twice())
+
+    assert [(incident.cell_id, incident.start_time, incident.end_time)
+            for incident in first] == [
+               ('11', START + 4 * MEASUREMENT_INTERVAL,
+                START + 7 * MEASUREMENT_INTERVAL)]
+    # Same incident, with the new end and the mean over all its breaches.
+    assert [(incident.id, incident.start_time, incident.end_time)
+            for incident in second] == [
+               (first[0].id, START + 4 * MEASUREMENT_INTERVAL,
+                START + 9 * MEASUREMENT_INTERVAL)]
+    assert second[0].kpi_missed[0].value == pytest.approx(90)
+    # Nothing new to scan.
+    assert third == []
+
+    last = START + 12 * MEASUREMENT_INTERVAL
+    assert {key: checkpoint.watermark for key, checkpoint in
+            checkpoints.items()} == {
+               ('1', '11', 'erab_success_rate'): last,
+               ('1', '11', 'retainability'): last,
+               ('1', '12', 'erab_success_rate'): START + 7 * MEASUREMENT_INTERVAL,
+               ('1', '12', 'retainability'): START + 7 * MEASUREMENT_INTERVAL}
+    # The cell recovered for longer than the gap tolerance.
+    assert all(checkpoint.open_episode is None
+               for checkpoint in checkpoints.values())
+
+
+def test_rerun_over_the_same_data_reports_nothing_new(storage):
+    async def detect_from_scratch():
+        first = await _detect(storage, {})
+        storage._execute_sync("DELETE FROM detection_checkpoints")
+        reported = {incident.id: incident.end_time for incident in first}
+        return first, await _detect(storage, reported)
+
+    first, second = asyncio.run(detect_from_scratch())
+
+    assert len(first) == 1
+    assert second == []
+
+
+def test_checkpoint_compact_record_round_trip():
+    checkpoint = Checkpoint('1', '11', 'erab_success_rate', START)
+    assert Checkpoint.from_compact_record(
+        checkpoint.as_compact_record()) == checkpoint
+
+
+def test_scan_start():
+    checkpoints = {}
+    for kpi in KPIS:
+        for cell_id, watermark in [('11', START),
+                                   ('12', START - timedelta(days=40))]:
+            checkpoint = Checkpoint('1', cell_id, kpi.name, watermark)
+            checkpoints[checkpoint.key()] = checkpoint
+
+    assert scan_start({}, KPIS) == EPOCH
+    assert scan_start(checkpoints, KPIS) == START - timedelta(days=40)
+    assert scan_start(checkpoints, KPIS, timedelta(days=30)) == \
+           START - timedelta(days=30)
+    del checkpoints[('1', '12', KPIS[0].name)]
+    del checkpoints[('1', '11', KPIS[0].name)]
+    # A KPI without checkpoints is scanned over all the data.
+    assert scan_start(checkpoints, KPIS) == EPOCH
+
+
+def test_checkpoints_wait_for_undecided_incidents():
+    incident = Incident(
+        id='incident-1', description='ERAB success rate is below 97%',
+        kpi_missed=[{'kpi': 'erab_success_rate', 'value': 90.}],
+        enodeb_id='1', cell_id='11', status='NEW', start_time=START,
+        end_time=START + timedelta(hours=1))
+    checkpoints = {('1', '12', 'erab_success_rate'): Checkpoint(
+        '1', '12', 'erab_success_rate', START - timedelta(hours=1))}
+    new_checkpoints = [
+        Checkpoint('1', '11', 'erab_success_rate', START + timedelta(hours=1)),
+        Checkpoint('1', '12', 'erab_success_rate', START + timedelta(hours=1))]
+    tool_context = SimpleNamespace(state={})
+
+    ready = tools._defer_checkpoints(tool_context, [incident], checkpoints,
+                                     new_checkpoints)
+
+    # The cell without a checkpoint is rewound to just before the incident,
+    # the other one keeps its new watermark.
+    assert [(checkpoint.cell_id, checkpoint.watermark) for checkpoint in
+            ready] == [('11', START - MEASUREMENT_INTERVAL),
+                       ('12', START + timedelta(hours=1))]
+    assert [pending_ids for _, pending_ids in tool_context.state[
+        tools.PENDING_CHECKPOINTS_ATTR]] == [['incident-1']]
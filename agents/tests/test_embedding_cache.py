@@ -0,0 +1,37 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from telco_common.embedding_cache import EmbeddingCache
+
+
+def test_get_or_compute_computes_once(tmp_path):
+    path = tmp_path / 'embedding-cache.prom'
+    cache = EmbeddingCache(10, str(tmp_path / 'embeddings.sqlite'), str(path))
+    computed = []
+
+    def compute() -> list[float]:
+        computed.append(1)
+        return [.1, .2]
+
+    for text in ['Cell 1 outage', 'Cell 1 outage  ', 'Cell 1 outage\n']:
+        assert cache.get_or_compute('model', 'task', text, compute) == [.1, .2]
+    cache.clear()
+    assert cache.get_or_compute('model', 'task', 'Cell 1 outage',
+                                compute) == [.1, .2]
+    cache._prometheus_writer.flush()
+
+    assert len(computed) == 1
+    assert cache.stats()['disk_hits'] == 1
+    lines = path.read_text().splitlines()
+    assert 'telco_agent_embedding_cache_lookups_total 4' in lines
+    assert 'telco_agent_embedding_cache_misses_total 1' in lines
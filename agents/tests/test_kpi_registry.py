@@ -0,0 +1,59 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from telco_common.kpi_registry import KPIS, KPIDefinition, kpi_formulas
+from telco_common.storage.sqlite_backend import SQLiteStorage
+
+_ROOT = Path(__file__).parents[2]
+
+
+@pytest.fixture(scope='module')
+def storage(tmp_path_factory) -> SQLiteStorage:
+    storage = SQLiteStorage(
+        str(tmp_path_factory.mktemp('kpis') / 'performance.sqlite'),
+        str(_ROOT / 'data' / 'performance.csv'),
+        schema_directory=str(
+            _ROOT / 'infrastructure' / 'terraform' / 'bigquery-schema'))
+    yield storage
+    storage.close()
+
+
+@pytest.mark.parametrize('kpi', KPIS, ids=lambda kpi: kpi.name)
+def test_compute_matches_formula(storage, kpi: KPIDefinition):
+    rows = storage._execute_sync(f"""
+    SELECT {kpi.formula} AS value, {', '.join(kpi.counters)}
+    FROM performance ORDER BY rowid
+    """)
+    # The columns are loaded with lower case names.
+    counters = {counter: np.array([row[counter.lower()] for row in rows],
+                                  dtype=np.float64)
+                for counter in kpi.counters}
+    expected = np.array([row.value for row in rows], dtype=np.float64)
+
+    computed = kpi.compute(counters)
+
+    assert len(rows) > 0
+    # The division by zero is NULL in SQL and NaN locally.
+    np.testing.assert_allclose(computed, expected, rtol=1e-12)
+
+
+def test_kpi_expressions_match_registry():
+    path = _ROOT / 'infrastructure' / 'terraform' / 'bigquery-schema' / \
+        'kpi-expressions.json'
+    assert json.loads(path.read_text()) == kpi_formulas(KPIS)
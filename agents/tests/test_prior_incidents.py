@@ -0,0 +1,130 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+import numpy as np
+import pytest
+
+from root_cause_analysis.tools.prior_incidents import PriorIncidentIndex
+from telco_common.storage.incident_filter import IncidentFilter
+from telco_common.storage.sqlite_backend import SQLiteStorage
+
+MODEL = 'test-embeddings'
+DIMENSIONS = 64
+QUERY = [0.] * DIMENSIONS
+START = datetime(2025, 1, 1, tzinfo=UTC)
+KPIS = ['erab_success_rate', 'retainability']
+
+
+def _embeddings(count: int) -> list[list[float]]:
+    """
+    Random embeddings, the closer to the query the lower the position.
+    """
+    vectors = np.random.default_rng(7).normal(size=(count, DIMENSIONS))
+    return vectors[np.argsort(np.linalg.norm(vectors, axis=1))].tolist()
+
+
+async def _create_incidents(storage: SQLiteStorage, count: int,
+    closed: int) -> None:
+    """
+    `count` incidents, of which the `closed` closest to the query are
+    closed. The eNodeB, the KPI and the start day cycle with the position.
+    """
+    await storage.save_incidents([dict(
+        incident_id=f"incident-{position:04}",
+        enodeb_id=f"enodeb-{position % 3}", cell_id='1',
+        start_ts=START + timedelta(days=position % 10), end_ts=None,
+        status='NEW', description='Test incident',
+        kpi_missed=[{'kpi': KPIS[position % 2], 'value': 90.}])
+        for position in range(count)])
+    for position, embeddings in enumerate(_embeddings(count)):
+        await storage.update_incident_analysis(
+            f"incident-{position:04}",
+            'CLOSED' if position < closed else 'ANALYZED', 'Analysis', 'LOW',
+            'Events', embeddings, MODEL)
+
+
+@pytest.fixture
+def storage(tmp_path) -> SQLiteStorage:
+    storage = SQLiteStorage(str(tmp_path / 'incidents.sqlite'))
+    yield storage
+    storage.close()
+
+
+@pytest.mark.parametrize('quantization', ['none', 'int8'])
+@pytest.mark.parametrize('incident_filter, max_distance', [
+    (None, 20.),
+    (IncidentFilter(statuses=frozenset({'ANALYZED'})), 20.),
+    # Some and none of the incidents within max_distance are not closed.
+    (IncidentFilter(statuses=frozenset({'ANALYZED'})), 7.75),
+    (IncidentFilter(statuses=frozenset({'ANALYZED'})), 7.7),
+    (IncidentFilter(kpis=frozenset({'retainability'}),
+                    enodeb_ids=frozenset({'enodeb-1', 'enodeb-2'})), 20.),
+    (IncidentFilter(statuses=frozenset({'ANALYZED'}),
+                    started_after=START + timedelta(days=8)), 20.),
+    (IncidentFilter(enodeb_ids=frozenset({'unknown'})), 20.),
+])
+def test_search_matches_storage(storage, quantization, incident_filter,
+    max_distance):
+    async def search():
+        await _create_incidents(storage, 500, 200)
+        index = PriorIncidentIndex(storage, MODEL, timedelta(hours=1),
+                                   timedelta(minutes=5), DIMENSIONS,
+                                   quantization, rerank_candidates=50)
+        await index.sync()
+        return (await index.search(QUERY, 5, max_distance, incident_filter),
+                await storage.find_similar_incidents(
+                    QUERY, 5, max_distance, incident_filter))
+
+    result, expected = asyncio.run(search())
+    assert [row.incident_id for row in result] == [
+        row.incident_id for row in expected]
+    assert [row.distance for row in result] == pytest.approx(
+        [row.distance for row in expected])
+
+
+def test_search_checks_current_status(storage):
+    async def search():
+        await _create_incidents(storage, 100, 0)
+        index = PriorIncidentIndex(storage, MODEL, timedelta(hours=1),
+                                   timedelta(minutes=5), DIMENSIONS)
+        await index.sync()
+        # Closed after the index was synced.
+        for position, embeddings in enumerate(_embeddings(100)[:3]):
+            await storage.update_incident_analysis(
+                f"incident-{position:04}", 'CLOSED', 'Analysis', 'LOW',
+                'Events', embeddings, MODEL)
+        return await index.search(
+            QUERY, 2, 20., IncidentFilter(statuses=frozenset({'ANALYZED'})))
+
+    assert [row.incident_id for row in asyncio.run(search())] == [
+        'incident-0003', 'incident-0004']
+
+
+def test_search_drops_deleted_incidents(storage):
+    async def search():
+        await _create_incidents(storage, 10, 0)
+        index = PriorIncidentIndex(storage, MODEL, timedelta(hours=1),
+                                   timedelta(minutes=5), DIMENSIONS, 'int8',
+                                   rerank_candidates=4)
+        await index.sync()
+        await storage._execute(
+            "DELETE FROM incidents WHERE incident_id = 'incident-0000'")
+        return await index.search(QUERY, 3, 20.), len(index)
+
+    result, indexed = asyncio.run(search())
+    assert [row.incident_id for row in result] == [
+        'incident-0001', 'incident-0002', 'incident-0003']
+    assert indexed == 9
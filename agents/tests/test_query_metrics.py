@@ -0,0 +1,46 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+from datetime import datetime, UTC
+
+from telco_common.query_metrics import InMemoryAggregator, QueryMetrics, \
+    QueryTags, PrometheusTextFileSink
+
+
+def _metrics(tool: str, session_id: str) -> QueryMetrics:
+    return QueryMetrics(tags=QueryTags(tool, session_id),
+                        started=datetime.now(UTC), wall_seconds=.5,
+                        queue_seconds=0., row_count=10)
+
+
+def test_aggregator_keeps_the_latest_tags():
+    aggregator = InMemoryAggregator(max_tags=2)
+    for session_id in ['1', '2', '1', '3']:
+        aggregator.record(_metrics('get_incident', session_id))
+
+    assert aggregator.summary(session_id='1')['get_incident'].queries == 2
+    assert aggregator.summary(session_id='2') == {}
+    assert aggregator.summary()['get_incident'].queries == 3
+
+
+def test_prometheus_sink_totals_by_tool(tmp_path):
+    path = tmp_path / 'query-metrics.prom'
+    sink = PrometheusTextFileSink(str(path))
+    for session_id in range(3):
+        sink.record(_metrics('get_incident', str(session_id)))
+    sink.record(_metrics('get_kpi_history', '1'))
+    sink.writer.flush()
+
+    lines = path.read_text().splitlines()
+    assert 'telco_agent_query_queries_total{tool="get_incident"} 3' in lines
+    assert 'telco_agent_query_rows_total{tool="get_kpi_history"} 10' in lines
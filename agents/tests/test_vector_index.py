@@ -0,0 +1,123 @@
+#  Copyright 2025 Google LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import numpy as np
+import pytest
+
+from telco_common import vector_index
+from telco_common.vector_index import rerank, VectorIndex
+
+DIMENSIONS = 32
+_random = np.random.default_rng(7)
+VECTORS = _random.normal(size=(200, DIMENSIONS)).astype(np.float32)
+IDS = [f'vector-{position}' for position in range(len(VECTORS))]
+QUERY = _random.normal(size=DIMENSIONS).astype(np.float32)
+
+
+def _exact(top_k: int, ids: list[str] = IDS,
+    max_distance: float = None) -> list[tuple[str, float]]:
+    return rerank(QUERY, ids, [VECTORS[IDS.index(vector_id)] for vector_id in
+                               ids], top_k, max_distance)
+
+
+def test_search_finds_the_closest_vectors():
+    index = VectorIndex()
+    index.upsert(IDS, VECTORS)
+
+    found = index.search(QUERY, 10)
+
+    assert len(index) == len(IDS)
+    assert index.dimensions == DIMENSIONS
+    assert [vector_id for vector_id, _ in found] == \
+           [vector_id for vector_id, _ in _exact(10)]
+    assert [distance for _, distance in found] == pytest.approx(
+        [distance for _, distance in _exact(10)])
+
+
+def test_search_filters():
+    index = VectorIndex(DIMENSIONS)
+    index.upsert(IDS, VECTORS)
+    ids = IDS[::3]
+    max_distance = _exact(20)[9][1]
+
+    assert index.search(QUERY, 5, ids=ids + ['unknown']) == pytest.approx(
+        _exact(5, ids))
+    assert index.search(QUERY, 20, max_distance=max_distance) == \
+           pytest.approx(_exact(20, max_distance=max_distance))
+    assert len(index.search(QUERY, 20, max_distance=max_distance)) == 10
+    assert index.search(QUERY[:-1], 5) == []
+    assert index.search(QUERY, 0) == []
+
+
+def test_upsert_replaces_and_remove_deletes():
+    index = VectorIndex()
+    index.upsert(IDS, VECTORS)
+    closest_id = _exact(1)[0][0]
+
+    index.upsert([closest_id], -QUERY[None, :] * 10)
+    assert closest_id not in [vector_id for vector_id, _ in
+                              index.search(QUERY, 10)]
+    index.upsert([closest_id], QUERY[None, :])
+    assert index.search(QUERY, 1) == [(closest_id, pytest.approx(0.))]
+
+    index.remove([closest_id, 'unknown'])
+    assert len(index) == len(IDS) - 1
+    remaining = [vector_id for vector_id in IDS if vector_id != closest_id]
+    assert index.search(QUERY, 10) == pytest.approx(_exact(10, remaining))
+
+
+def test_upsert_checks_the_dimensions():
+    index = VectorIndex(DIMENSIONS)
+    with pytest.raises(ValueError):
+        index.upsert(IDS[:1], VECTORS[:1, :-1])
+    with pytest.raises(ValueError):
+        index.upsert(IDS[:2], VECTORS[:1])
+
+
+@pytest.mark.parametrize('quantization, size', [
+    ('none', DIMENSIONS * 4 + 8),
+    ('int8', DIMENSIONS + 8),
+    ('binary', DIMENSIONS // 8)])
+def test_nbytes(quantization, size):
+    index = VectorIndex(quantization=quantization)
+    index.upsert(IDS, VECTORS)
+    assert index.nbytes == len(IDS) * size
+
+
+@pytest.mark.parametrize('chunk_bytes', [512 * 1024, DIMENSIONS * 4 * 3])
+def test_int8_candidates_reranked_match_the_exact_search(monkeypatch,
+    chunk_bytes):
+    # A small chunk converts the vectors three at a time.
+    monkeypatch.setattr(vector_index, '_INT8_CHUNK_BYTES', chunk_bytes)
+    index = VectorIndex(quantization='int8')
+    index.upsert(IDS, VECTORS)
+
+    candidates = index.candidates(QUERY, 40)
+    reranked = rerank(QUERY, candidates,
+                      [VECTORS[IDS.index(vector_id)] for vector_id in
+                       candidates], 10)
+
+    assert len(candidates) == 40
+    assert reranked == pytest.approx(_exact(10))
+    with pytest.raises(ValueError):
+        index.search(QUERY, 10)
+
+
+def test_binary_candidates():
+    index = VectorIndex(quantization='binary')
+    index.upsert(IDS, VECTORS)
+
+    # The vector itself has all the signs in common with the query.
+    assert index.candidates(VECTORS[5], 1) == [IDS[5]]
+    assert set(index.candidates(QUERY, 10, ids=IDS[:10])) == set(IDS[:10])
+    assert index.candidates(QUERY, 10, ids=['unknown']) == []
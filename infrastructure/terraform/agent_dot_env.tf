@@ -31,9 +31,12 @@ BIGQUERY_DATASET=${google_bigquery_dataset.telco-dataset.dataset_id}
 BIGQUERY_RUN_PROJECT_ID=${var.project_id}
 
 BIGQUERY_TABLE_CELL_TRACES=${google_bigquery_table.cell_traces.table_id}
+BIGQUERY_TABLE_CELL_TRACE_OUTCOMES=${google_bigquery_table.cell_trace_outcomes.table_id}
 BIGQUERY_TABLE_INCIDENTS=${google_bigquery_table.incidents.table_id}
 BIGQUERY_TABLE_PERFORMANCE=${google_bigquery_table.performance.table_id}
 BIGQUERY_TABLE_PERFORMANCE_KPI=${google_bigquery_table.performance_kpi.table_id}
+BIGQUERY_TABLE_PERFORMANCE_KPI_HOURLY=${google_bigquery_table.performance_kpi_hourly.table_id}
+BIGQUERY_TABLE_PERFORMANCE_KPI_DAILY=${google_bigquery_table.performance_kpi_daily.table_id}
 
 INTERNAL_DOCS_DATASTORE_ID=${google_discovery_engine_data_store.rca_rules.id}
 
@@ -62,6 +65,9 @@ BIGQUERY_RUN_PROJECT_ID=${var.project_id}
 BIGQUERY_TABLE_INCIDENTS=${google_bigquery_table.incidents.table_id}
 BIGQUERY_TABLE_PERFORMANCE=${google_bigquery_table.performance.table_id}
 BIGQUERY_TABLE_PERFORMANCE_KPI=${google_bigquery_table.performance_kpi.table_id}
+BIGQUERY_TABLE_PERFORMANCE_KPI_HOURLY=${google_bigquery_table.performance_kpi_hourly.table_id}
+BIGQUERY_TABLE_PERFORMANCE_KPI_DAILY=${google_bigquery_table.performance_kpi_daily.table_id}
+BIGQUERY_TABLE_DETECTION_CHECKPOINTS=${google_bigquery_table.detection_checkpoints.table_id}
 
 EOF
 }
\ No newline at end of file
@@ -43,15 +43,64 @@ locals {
   performance_fqn = "${google_bigquery_dataset.telco-dataset.project}.${google_bigquery_dataset.telco-dataset.dataset_id}.${google_bigquery_table.performance.table_id}"
 }
 
+locals {
+  # KPI formulas shared by the performance_kpi view and its rollups. The
+  # rollups are built from the performance table directly, as BigQuery doesn't
+  # support materialized views over materialized views. The file is generated
+  # from the KPI registry of the agents, see agents/telco_common/kpi_registry.py.
+  kpi_expressions = jsondecode(file("${path.module}/bigquery-schema/kpi-expressions.json"))
+}
+
 resource "google_bigquery_table" "performance_kpi" {
   deletion_protection = false
   depends_on = [google_bigquery_table.performance]
   dataset_id          = local.dataset_id
   table_id            = "performance_kpi"
   description         = "Calculated performance KPIs"
+  # Same partitioning as the performance table, so that the @scan_from filter
+  # of the incident detector prunes the view's partitions.
+  clustering          = ["enodeb_id", "cell_id"]
+  time_partitioning {
+    type = "DAY"
+    field = "measurement_end"
+  }
   materialized_view {
     query = templatefile("${path.module}/bigquery-schema/performance_kpi.sql.tftpl",
-      { base_table = local.performance_fqn})
+      { base_table = local.performance_fqn, kpi_expressions = local.kpi_expressions })
+  }
+}
+
+resource "google_bigquery_table" "performance_kpi_hourly" {
+  deletion_protection = false
+  depends_on = [google_bigquery_table.performance]
+  dataset_id          = local.dataset_id
+  table_id            = "performance_kpi_hourly"
+  description         = "Hourly min/max/avg of the performance KPIs"
+  clustering          = ["enodeb_id", "cell_id"]
+  time_partitioning {
+    type = "DAY"
+    field = "period_day"
+  }
+  materialized_view {
+    query = templatefile("${path.module}/bigquery-schema/performance_kpi_rollup.sql.tftpl",
+      { base_table = local.performance_fqn, kpi_expressions = local.kpi_expressions, granularity = "HOUR" })
+  }
+}
+
+resource "google_bigquery_table" "performance_kpi_daily" {
+  deletion_protection = false
+  depends_on = [google_bigquery_table.performance]
+  dataset_id          = local.dataset_id
+  table_id            = "performance_kpi_daily"
+  description         = "Daily min/max/avg of the performance KPIs"
+  clustering          = ["enodeb_id", "cell_id"]
+  time_partitioning {
+    type = "DAY"
+    field = "period_day"
+  }
+  materialized_view {
+    query = templatefile("${path.module}/bigquery-schema/performance_kpi_rollup.sql.tftpl",
+      { base_table = local.performance_fqn, kpi_expressions = local.kpi_expressions, granularity = "DAY" })
   }
 }
 
@@ -68,10 +117,43 @@ resource "google_bigquery_table" "cell_traces" {
   }
 }
 
+locals {
+  cell_traces_fqn = "${google_bigquery_dataset.telco-dataset.project}.${google_bigquery_dataset.telco-dataset.dataset_id}.${google_bigquery_table.cell_traces.table_id}"
+}
+
+resource "google_bigquery_table" "cell_trace_outcomes" {
+  deletion_protection = false
+  depends_on = [google_bigquery_table.cell_traces]
+  dataset_id          = local.dataset_id
+  table_id            = "cell_trace_outcomes"
+  description         = "Number of cell traces per cell, 15 minute start and end bucket and S1 signalling connection outcome"
+  clustering          = ["enodeb_id", "cell_id"]
+  time_partitioning {
+    type = "DAY"
+    field = "start_day"
+  }
+  materialized_view {
+    # Buckets start at the start rounded down and end at the end rounded up.
+    # The bucket must match TRACE_BUCKET in agents/telco_common/storage/trace_outcomes.py.
+    query = templatefile("${path.module}/bigquery-schema/cell_trace_outcomes.sql.tftpl",
+      { base_table = local.cell_traces_fqn, bucket_micros = 15 * 60 * 1000000 })
+  }
+}
+
 resource "google_bigquery_table" "incidents" {
   deletion_protection = false
   dataset_id          = local.dataset_id
   table_id            = "incidents"
   description         = "Incidents generated based on the KPI levels dropping below thresholds"
   schema              = file("${path.module}/bigquery-schema/incidents.json")
+  clustering          = ["incident_id"]
+}
+
+resource "google_bigquery_table" "detection_checkpoints" {
+  deletion_protection = false
+  dataset_id          = local.dataset_id
+  table_id            = "detection_checkpoints"
+  description         = "Last processed measurement and the open incident for every cell and KPI"
+  schema              = file("${path.module}/bigquery-schema/detection-checkpoints.json")
+  clustering          = ["enodeb_id", "cell_id"]
 }